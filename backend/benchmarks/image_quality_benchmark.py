@@ -0,0 +1,66 @@
+"""
+Measure the per-image cost of the local quality gate run before crop-health calls.
+
+Run from the backend directory:
+    python -m benchmarks.image_quality_benchmark
+
+Synthetic leaf-like photos at common phone sizes are encoded once, then each is
+decoded and assessed ROUNDS times. Reports the median of the shared decode
+(`prepare_image`, paid once per upload whether or not the gate is on), the
+median and p95 of the gate on the decoded image, and of the numpy measurements
+alone (downscaling to the analysis size is the rest).
+"""
+
+import io
+import time
+from statistics import median
+import numpy as np
+from PIL import Image
+from src.services.image_pipeline import prepare_image, rendition
+from src.services.image_quality import QUALITY_ANALYSIS_SIDE, assess_image, measure
+
+ROUNDS = 30
+SIZES = [(4032, 3024), (1600, 1200), (640, 480)]
+
+
+def leaf_photo(width: int, height: int, fmt: str) -> bytes:
+    rng = np.random.default_rng(0)
+    base = np.array([60, 130, 45], dtype=np.int16)
+    noise = rng.integers(-35, 35, size=(height, width, 1), dtype=np.int16)
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def timed_ms(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def p95(samples):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))]
+
+
+def main():
+    for width, height in SIZES:
+        for fmt in ("JPEG", "PNG"):
+            data = leaf_photo(width, height, fmt)
+            prepared = prepare_image(data)  # warm-up: plugin loading, allocations
+            assess_image(prepared)
+            decode = [timed_ms(prepare_image, data) for _ in range(ROUNDS)]
+            gate = [timed_ms(assess_image, prepared) for _ in range(ROUNDS)]
+            rgb = np.asarray(rendition(prepared.image, QUALITY_ANALYSIS_SIDE))
+            numpy_only = [timed_ms(measure, rgb) for _ in range(ROUNDS)]
+            label = f"{width}x{height} {fmt} ({len(data) // 1024} KB)"
+            print(
+                f"{label:<28} decode median={median(decode):.1f}ms"
+                f"  gate median={median(gate):.1f}ms p95={p95(gate):.1f}ms"
+                f"  measure median={median(numpy_only):.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Compare the local intent classifier with the LLM-based detect_intent path.
+
+Run from the backend directory:
+    python -m benchmarks.intent_benchmark
+
+The LLM path is only measured when GOOGLE_API_KEY is set.
+"""
+
+import os
+import time
+import asyncio
+from statistics import mean, median
+from src.services.intent_classifier import (
+    INTENT_CONFIDENCE_THRESHOLD,
+    intent_classifier,
+)
+
+# Held-out messages, not part of services/data/intent_examples.json
+EVAL_SET = [
+    ("Which crop should I put in the ground this month?", "crop_recommendation"),
+    ("What can I farm on red soil near Hawassa?", "crop_recommendation"),
+    ("Recommend something to plant before the long rains", "crop_recommendation"),
+    ("Is barley a good idea for my highland plot?", "crop_recommendation"),
+    ("What grows fast in hot weather?", "crop_recommendation"),
+    ("Suggest the best crop for my experience level", "crop_recommendation"),
+    ("The maize leaves have long grey lesions", "diagnosis"),
+    ("My tomatoes have dark rings on the leaves", "diagnosis"),
+    ("Bugs are destroying my kale", "diagnosis"),
+    ("Why are my bean plants turning brown and dying?", "diagnosis"),
+    ("The coffee berries are falling off and rotting", "diagnosis"),
+    ("There is a white fungus growing on the stems", "diagnosis"),
+    ("How much DAP should I put at planting?", "fertilizer_recommendation"),
+    ("Which fertilizer is good for cabbage?", "fertilizer_recommendation"),
+    ("When do I apply nitrogen to wheat?", "fertilizer_recommendation"),
+    ("How many kilograms of urea per acre?", "fertilizer_recommendation"),
+    ("Can I use cow dung as fertilizer?", "fertilizer_recommendation"),
+    ("What nutrients should I add for potatoes?", "fertilizer_recommendation"),
+    ("Thanks a lot", "general"),
+    ("How do I irrigate with little water?", "general"),
+    ("What is the price of teff at the market?", "general"),
+    ("Will it be windy tomorrow?", "general"),
+    ("How should I store potatoes after harvest?", "general"),
+    ("Can you tell me about conservation agriculture?", "general"),
+]
+
+
+def _summarize(name, latencies_ms, correct):
+    print(
+        f"{name:<18} accuracy={correct / len(EVAL_SET):.2%} "
+        f"mean={mean(latencies_ms):.3f}ms median={median(latencies_ms):.3f}ms "
+        f"max={max(latencies_ms):.3f}ms"
+    )
+
+
+def bench_local():
+    latencies, correct, low_confidence = [], 0, 0
+    for text, label in EVAL_SET:
+        start = time.perf_counter()
+        intent, confidence = intent_classifier.predict(text)
+        latencies.append((time.perf_counter() - start) * 1000)
+        correct += intent == label
+        low_confidence += confidence < INTENT_CONFIDENCE_THRESHOLD
+    _summarize("local classifier", latencies, correct)
+    print(
+        f"{'':<18} would fall back to the LLM for "
+        f"{low_confidence}/{len(EVAL_SET)} messages"
+    )
+
+
+async def bench_llm():
+    from src.routes.chat import detect_intent_llm
+
+    latencies, correct = [], 0
+    for text, label in EVAL_SET:
+        start = time.perf_counter()
+        intent = await detect_intent_llm(text)
+        latencies.append((time.perf_counter() - start) * 1000)
+        correct += intent == label
+    _summarize("llm", latencies, correct)
+
+
+if __name__ == "__main__":
+    bench_local()
+    if os.getenv("GOOGLE_API_KEY"):
+        asyncio.run(bench_llm())
+    else:
+        print("GOOGLE_API_KEY not set; skipping the LLM path")
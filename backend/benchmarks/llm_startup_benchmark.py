@@ -0,0 +1,87 @@
+"""
+Measure what a shared, pre-warmed LLM client saves over building one per request.
+
+Run from the backend directory with GOOGLE_API_KEY set:
+    python -m benchmarks.llm_startup_benchmark
+
+Reports, for the same small prompt:
+- per-request client: construct LLMService then send (old recommend_crops_flow)
+- shared cold client: first call on an already-built registry client, no warm-up
+- shared warm client: first call after LLMClientRegistry.startup()
+- shared later call: a second call on a client that has already served one,
+  which is what every request after the first pays with the shared client
+Client construction is only inside the timed window for the per-request case.
+"""
+
+import os
+import time
+import asyncio
+from statistics import median
+
+PROMPT = "Reply with the single word: ok"
+ROUNDS = 5
+
+
+async def timed(coro_fn):
+    start = time.perf_counter()
+    result = await coro_fn()
+    elapsed = (time.perf_counter() - start) * 1000
+    if not result.get("response"):
+        print(f"  call failed: {result.get('error')}")
+    return elapsed
+
+
+async def main():
+    from src.services.llm_service import LLMClientRegistry, LLMService
+
+    cases = {
+        "per-request client": [],
+        "shared cold client": [],
+        "shared warm client": [],
+        "shared later call": [],
+    }
+    for i in range(ROUNDS):
+        # Unique prompts so neither the response cache nor coalescing kicks in
+        prompt = f"{PROMPT} (round {i})"
+
+        async def fresh_client():
+            return await LLMService().send_message_async(prompt + " a", route="intent")
+
+        cases["per-request client"].append(await timed(fresh_client))
+
+        cold_registry = LLMClientRegistry()
+        cold_client = cold_registry.get()
+        cases["shared cold client"].append(
+            await timed(
+                lambda: cold_client.send_message_async(prompt + " b", route="intent")
+            )
+        )
+        cases["shared later call"].append(
+            await timed(
+                lambda: cold_client.send_message_async(prompt + " c", route="intent")
+            )
+        )
+        await cold_registry.shutdown()
+
+        warm_registry = LLMClientRegistry()
+        await warm_registry.startup()
+        warm_client = warm_registry.get()
+        cases["shared warm client"].append(
+            await timed(
+                lambda: warm_client.send_message_async(prompt + " d", route="intent")
+            )
+        )
+        await warm_registry.shutdown()
+
+    for name, samples in cases.items():
+        print(
+            f"{name:<20} median={median(samples):.0f}ms "
+            f"min={min(samples):.0f}ms max={max(samples):.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    if not os.getenv("GOOGLE_API_KEY"):
+        print("GOOGLE_API_KEY not set; this benchmark needs live Gemini access")
+    else:
+        asyncio.run(main())
@@ -14,10 +14,23 @@ class ChatSessionDB(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     user_id = Column(String, nullable=True)
     messages = relationship(
-        "ChatMessageDB", back_populates="session", cascade="all, delete-orphan"
+        "ChatMessageDB",
+        back_populates="session",
+        cascade="all, delete-orphan",
+        order_by="ChatMessageDB.timestamp",
     )
 
 
+class ChatSessionSummaryDB(Base):
+    __tablename__ = "chat_session_summaries"
+    session_id = Column(
+        String, ForeignKey("chat_sessions.session_id"), primary_key=True
+    )
+    summary = Column(Text)
+    summarized_count = Column(Integer, default=0)  # messages folded into summary
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class ChatMessageDB(Base):
     __tablename__ = "chat_messages"
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
@@ -67,3 +80,12 @@ class AITaskCache(Base):
     weather_context = Column(Text)  # JSON string of weather data used
     created_at = Column(DateTime, default=datetime.utcnow)
     expires_at = Column(DateTime)  # Cache expires after 24 hours
+
+
+class LLMResponseCache(Base):
+    __tablename__ = "llm_response_cache"
+    cache_key = Column(String, primary_key=True)  # sha256 of model/config/prompt
+    model = Column(String)
+    response_text = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime)
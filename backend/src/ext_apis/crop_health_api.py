@@ -1,13 +1,32 @@
 from dotenv import load_dotenv
 import os
-import tempfile
-from PIL import Image
 import httpx
 import asyncio
 import time
+from contextlib import aclosing
+from src.services.crop_health_cache import crop_health_cache, image_digest
+from src.services.fanout import FANOUT_MODES, FanoutPolicy, fan_out, provider_latency
+from src.services.image_pipeline import PreparedImage, prepare_image
+from src.services.provider_scheduler import disease_verdict, provider_scheduler
+from dataclasses import replace
+from typing import Optional
 
 load_dotenv()
 
+# Fan-out across the disease providers (Kindwise, DeepLeaf); OpenEPI's cheap binary
+# check always runs alongside them. Modes: all, first, quorum, hedge.
+CROP_HEALTH_FANOUT_POLICY = FanoutPolicy(
+    mode=os.getenv("CROP_HEALTH_FANOUT_MODE", "quorum"),
+    quorum=int(os.getenv("CROP_HEALTH_QUORUM", "2")),
+    budget=float(os.getenv("CROP_HEALTH_FANOUT_BUDGET_SECONDS")) if os.getenv("CROP_HEALTH_FANOUT_BUDGET_SECONDS") else None,
+    max_budget=float(os.getenv("CROP_HEALTH_FANOUT_MAX_BUDGET_SECONDS", "20")),
+    hedge_delay=float(os.getenv("CROP_HEALTH_HEDGE_DELAY_SECONDS", "4")),
+)
+# Preference order, used by the hedge mode
+CROP_HEALTH_DISEASE_PROVIDERS = [p.strip() for p in os.getenv("CROP_HEALTH_PROVIDER_ORDER", "kindwise,deepl").split(",") if p.strip()]
+if CROP_HEALTH_FANOUT_POLICY.mode not in FANOUT_MODES:
+    raise ValueError(f"CROP_HEALTH_FANOUT_MODE must be one of {FANOUT_MODES}")
+
 def simplify_prediction_result(prediction: dict) -> dict:
     kindwise = prediction.get("kindwise_result", {})
     openepi_raw = prediction.get("openEPI_result", {})
@@ -90,27 +109,6 @@ def simplify_prediction_result(prediction: dict) -> dict:
 
 
 
-def ensure_min_resolution(image_path: str) -> str:
-    MIN_SIZE = 200
-    MAX_SIZE = 2000
-    with Image.open(image_path) as img:
-        width, height = img.size
-        if width >= MIN_SIZE and height >= MIN_SIZE:
-            return image_path
-        scale = MIN_SIZE / min(width, height)
-        new_width = int(width * scale)
-        new_height = int(height * scale)
-        if new_width > MAX_SIZE or new_height > MAX_SIZE:
-            scale = min(MAX_SIZE / new_width, MAX_SIZE / new_height)
-            new_width = int(new_width * scale)
-            new_height = int(new_height * scale)
-        resized_img = img.resize((new_width, new_height), Image.LANCZOS)
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-        resized_img.save(temp_file.name, format="JPEG")
-        temp_file.close()
-        return temp_file.name
-
-
 async def async_openEPI_api(client, image_data, model_type="binary"):
     url = "https://api.openepi.io/crop-health/predictions/binary"
     if not url:
@@ -131,11 +129,11 @@ async def async_openEPI_api(client, image_data, model_type="binary"):
 
 
 
-async def async_kindwise_api(client, image_path, image_data, latitude=49.5, longitude=45, similar_images=True):
+async def async_kindwise_api(client, image_data, latitude=49.5, longitude=45, similar_images=True, filename="image.jpg"):
     url = "https://crop.kindwise.com/api/v1/identification"
     headers = {"Api-Key": os.getenv("KINDWISE_API_KEY")}
     form_data = {"latitude": str(latitude), "longitude": str(longitude), "similar_images": str(similar_images).lower()}
-    files = {"images": (image_path, image_data, "image/jpeg")}
+    files = {"images": (filename, image_data, "image/jpeg")}
     try:
         response = await client.post(url, headers=headers, data=form_data, files=files)
         response.raise_for_status()
@@ -155,97 +153,153 @@ async def async_kindwise_api(client, image_path, image_data, latitude=49.5, long
     
     
 
-async def async_deepl_analyze_leaf(client, image_path, lat, lon, language="en"):
-    valid_image_path = ensure_min_resolution(image_path)
+async def async_deepl_analyze_leaf(client, image_data, lat, lon, language="en", filename="image.jpg"):
     params = {"api_key": os.getenv("DEEPL_API_KEY"), "language": language, "lat": lat, "lon": lon}
     try:
-        with open(valid_image_path, "rb") as img_file:
-            files = {"image": (valid_image_path, img_file, "image/jpeg")}
-            response = await client.post("https://api.deepleaf.io/analyze", params=params, files=files)
+        files = {"image": (filename, image_data, "image/jpeg")}
+        response = await client.post("https://api.deepleaf.io/analyze", params=params, files=files)
         if response.status_code != 200:
             return {"api": "deepl", "error": f"Request failed: {response.status_code}", "details": response.text}
         return {"api": "deepl", "result": response.json()}
-    except FileNotFoundError:
-        return {"api": "deepl", "error": "Image file not found"}
     except httpx.HTTPStatusError as e:
         return {"api": "deepl", "error": str(e), "details": e.response.text}
     except httpx.RequestError as e:
         return {"api": "deepl", "error": "Network error", "details": str(e)}
     except Exception as e:
         return {"api": "deepl", "error": "Unexpected error", "details": str(e)}
-    finally:
-        if valid_image_path != image_path:
-            try:
-                os.remove(valid_image_path)
-            except Exception:
-                pass
 
 
 
-async def predict_crop_health(image_path: str, model_type: str = "binary", latitude: float = 49.5, longitude: float = 45, similar_images: bool = True) -> dict:
-    try:
-        with open(image_path, "rb") as f:
-            image_data = f.read()
-    except FileNotFoundError:
-        raise RuntimeError("Image file not found")
-    
-    
-    begin_time = time.time()
+# Provider name -> the key its raw result takes in simplify_prediction_result
+PROVIDER_RESULT_KEYS = {
+    "openepi": "openEPI_result",
+    "kindwise": "kindwise_result",
+    "deepl": "deepl_result",
+}
+
+
+def simplify_provider_result(provider: str, raw: dict) -> dict:
+    """Simplified result for a single provider."""
+    return simplify_prediction_result({PROVIDER_RESULT_KEYS[provider]: raw})[provider]
+
+
+async def stream_crop_health(image_data: bytes, model_type: str = "binary", latitude: float = 49.5, longitude: float = 45, similar_images: bool = True, policy: FanoutPolicy = CROP_HEALTH_FANOUT_POLICY, prepared: Optional[PreparedImage] = None):
+    """
+    Yield each provider's simplified result as soon as it is available.
+    Items are dicts with provider, result, error and cached; cached providers come first.
+    Disease providers are called according to `policy`, adjusted per request by the
+    provider scheduler (unhealthy providers left out, OpenEPI asked first when its
+    healthy verdicts are trusted); providers not called or cancelled are yielded
+    last with an empty result and error "skipped".
+    The upload is decoded once, in memory (or taken from `prepared` when the
+    caller already decoded it), and each provider gets its own downscaled,
+    metadata-free JPEG rendition.
+    """
+    # Re-uploads of the same photo reuse every provider result that succeeded before
+    digest = image_digest(image_data)
+    params = {
+        "openepi": {"model_type": model_type},
+        "kindwise": {"lat": latitude, "lon": longitude, "similar_images": similar_images},
+        "deepl": {"lat": latitude, "lon": longitude},
+    }
+    missing = []
+    results = {}
+    for provider in params:
+        cached = crop_health_cache.get(provider, digest, params[provider])
+        if cached is None:
+            missing.append(provider)
+        else:
+            results[provider] = cached
+            yield {"provider": provider, "result": cached, "error": None, "cached": True}
+    if not missing:
+        print(f"Crop health results for image {digest[:12]} served from cache")
+        return
+
+    if prepared is None:
+        prepared = await asyncio.to_thread(prepare_image, image_data)
+    renditions = await asyncio.to_thread(prepared.build_renditions)
+    print(f"Image renditions for {digest[:12]}: {prepared.stats()}")
+
+    # Which providers to call: unhealthy ones are skipped, and OpenEPI may be
+    # asked first so a confidently healthy leaf needs only one disease provider
+    disease_order = CROP_HEALTH_DISEASE_PROVIDERS + [p for p in ("kindwise", "deepl") if p not in CROP_HEALTH_DISEASE_PROVIDERS]
+    plan = provider_scheduler.plan(missing, disease_order)
+    answered = set()
+
+    def finished(provider, result):
+        answered.add(provider)
+        simplified = simplify_provider_result(provider, result.get("result", {}))
+        error = result.get("error")
+        provider_scheduler.record(provider, not error, simplified)
+        if error:
+            print(f"[{provider} Failed] {error}: {result.get('details', '')}")
+        else:
+            crop_health_cache.set(provider, digest, simplified, params[provider])
+            results[provider] = simplified
+        return {"provider": provider, "result": simplified, "error": error, "cached": False}
 
     async with httpx.AsyncClient() as client:
-        tasks = [
-            async_openEPI_api(client, image_data, model_type),
-            async_kindwise_api(client, image_path, image_data, latitude, longitude, similar_images),
-            async_deepl_analyze_leaf(client, image_path, latitude, longitude)
-        ]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # Extract results and check for errors
-        openEPI_result = {}
-        kindwise_result = {}
-        deepl_result = {}
-        kindwise_failed = False
-        deepl_failed = False
-
-        for result in results:
-            if result["api"] == "openEPI":
-                openEPI_result = result.get("result", {})
-                if "error" in result:
-                    print(f"[OpenEPI Failed] {result['error']}: {result.get('details', '')}")
-            elif result["api"] == "kindwise":
-                kindwise_result = result.get("result", {})
-                if "error" in result:
-                    kindwise_failed = True
-                    print(f"[Kindwise Failed] {result['error']}: {result.get('details', '')}")
-            elif result["api"] == "deepl":
-                deepl_result = result.get("result", {})
-                if "error" in result:
-                    deepl_failed = True
-                    print(f"[DeepLeaf Failed] {result['error']}: {result.get('details', '')}")
-
-        if kindwise_failed and deepl_failed:
-            raise RuntimeError("Both Kindwise and DeepLeaf APIs failed. Unable to analyze crop health.")
-
-
-        # print("before ------------------")
-        
-        # print(deepl_result)
-        
-        ans = simplify_prediction_result({
-            "kindwise_result": kindwise_result,
-            "openEPI_result": openEPI_result,
-            "deepl_result": deepl_result
-        })
-        
-        
-        print("total time it takes",  time.time() - begin_time)
-        # print()
-        # print()
-        
-        # print("after ------------------")
-        # print()
-        # print(ans["deepl"])
+        calls = {
+            "openepi": lambda: async_openEPI_api(client, renditions["openepi"], model_type),
+            "kindwise": lambda: async_kindwise_api(client, renditions["kindwise"], latitude, longitude, similar_images),
+            "deepl": lambda: async_deepl_analyze_leaf(client, renditions["deepl"], latitude, longitude),
+        }
+        contenders, background = plan.contenders, plan.background
+        try:
+            if plan.cheap_first:
+                started = time.perf_counter()
+                try:
+                    raw = await asyncio.wait_for(calls["openepi"](), plan.cheap_first_wait)
+                except asyncio.TimeoutError:
+                    raw = None  # too slow right now; it runs again alongside the others
+                    provider_latency("openepi").observe_censored((time.perf_counter() - started) * 1000)
+                if raw is not None:
+                    provider_latency("openepi").observe((time.perf_counter() - started) * 1000)
+                    background = [p for p in background if p != "openepi"]
+                    yield finished("openepi", raw)
+
+            fanout_policy = policy
+            if len(contenders) > 1 and "openepi" in results and provider_scheduler.confident_healthy(results["openepi"]):
+                # Confirm with the preferred provider; hedge to the next only if it is slow or fails
+                fanout_policy = replace(policy, mode="hedge")
+                provider_scheduler.short_circuits += 1
+            cached_good = sum(1 for p in ("kindwise", "deepl") if p not in missing)
+            # Closing the fan-out (also when the consumer stops early) cancels losing calls
+            async with aclosing(fan_out(calls, fanout_policy, contenders, background, cached_good)) as fanned:
+                async for provider, result, elapsed_ms in fanned:
+                    yield finished(provider, result)
+
+            remaining = [p for p in contenders if p not in answered]
+            if fanout_policy is not policy and remaining and any(disease_verdict(p, results[p]) for p in ("kindwise", "deepl") if p in results):
+                # The confirming provider found a disease OpenEPI missed: ask the others too
+                provider_scheduler.escalations += 1
+                async with aclosing(fan_out(calls, replace(policy, mode="all"), remaining)) as fanned:
+                    async for provider, result, elapsed_ms in fanned:
+                        yield finished(provider, result)
+        finally:
+            for provider in contenders + background:
+                if provider not in answered:
+                    provider_scheduler.release(provider)
+
+    provider_scheduler.record_agreement(results)
+    for provider in missing:
+        if provider not in answered:
+            yield {"provider": provider, "result": simplify_provider_result(provider, {}), "error": "skipped", "cached": False}
+
+
+async def predict_crop_health(image_data: bytes, model_type: str = "binary", latitude: float = 49.5, longitude: float = 45, similar_images: bool = True, prepared: Optional[PreparedImage] = None) -> dict:
+    begin_time = time.time()
+
+    ans = {}
+    failed = set()
+    async for item in stream_crop_health(image_data, model_type, latitude, longitude, similar_images, prepared=prepared):
+        ans[item["provider"]] = item["result"]
+        if item["error"]:
+            failed.add(item["provider"])
 
-        return ans
+    if "kindwise" in failed and "deepl" in failed:
+        raise RuntimeError("Both Kindwise and DeepLeaf APIs failed. Unable to analyze crop health.")
 
+    print("total time it takes",  time.time() - begin_time)
 
+    return {"kindwise": ans["kindwise"], "openepi": ans["openepi"], "deepl": ans["deepl"]}
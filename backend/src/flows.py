@@ -1,25 +1,435 @@
-from src.services.llm_service import LLMService
-from src.ext_apis.crop_health_api import predict_crop_health
-from src.ext_apis.soil_api import get_soil_summary_async
-from src.ext_apis.weather_api import fetch_weather_summary, simplify_weather_response
-import asyncio
+from src.ext_apis.crop_health_api import (
+    predict_crop_health,
+    simplify_provider_result,
+    stream_crop_health,
+)
+from src.services.crop_health_cache import image_digest
+from src.services.image_pipeline import ImageDecodeError, PreparedImage, prepare_image
+from src.services.image_quality import IMAGE_QUALITY_GATE, assess_image
+from src.services.near_duplicates import dhash, near_duplicate_index
+from src.services.similar_images import (
+    gallery_fields,
+    new_diagnosis_id,
+    similar_image_store,
+)
 from src.services.llm_service import llm_service
-from typing import Optional
+from src.services.llm_cache import LLM_CACHE_TTL
+from src.services.field_context import field_context_service
+from src.services.recommendation_cache import recommendation_cache
+from src.services.pipeline import DisconnectCheck, Pipeline, Stage
+from typing import Dict, Hashable, List, Optional, Tuple
+import asyncio
+import json
+import os
+import time
+
+
+# Per-stage budgets; a stage that overruns is reported missing instead of
+# stalling the whole flow.
+FLOW_SOIL_TIMEOUT_SECONDS = float(os.getenv("FLOW_SOIL_TIMEOUT_SECONDS", "20"))
+FLOW_WEATHER_TIMEOUT_SECONDS = float(os.getenv("FLOW_WEATHER_TIMEOUT_SECONDS", "15"))
+FLOW_CROP_HEALTH_TIMEOUT_SECONDS = float(
+    os.getenv("FLOW_CROP_HEALTH_TIMEOUT_SECONDS", "60")
+)
+
+# Photos diagnosed at once across all batch requests in this process; each one
+# fans out to the three crop-health providers.
+BATCH_DIAGNOSIS_CONCURRENCY = int(os.getenv("BATCH_DIAGNOSIS_CONCURRENCY", "8"))
+batch_diagnosis_slots = asyncio.Semaphore(BATCH_DIAGNOSIS_CONCURRENCY)
+
+
+# Instructions shared by every diagnosis call. At a few hundred tokens they are
+# well below every model's minimum for context caching, so they are sent inline.
+DIAGNOSIS_INSTRUCTIONS = (
+    "You are an expert agricultural advisor for smallholder farmers.\n"
+    "You will receive crop health diagnosis results from different api's.\n"
+    "Your job is to analyze the results and provide structured advice.\n"
+    "\n"
+    "IMPORTANT: You must respond with ONLY a valid JSON object, no additional text or explanations.\n"
+    "\n"
+    "Analyze the diagnosis results and provide a JSON response with this exact structure:\n"
+    "{\n"
+    '  "identified_problems": ["list of specific problems detected"],\n'
+    '  "symptoms_noticed": ["list of visible symptoms"],\n'
+    '  "probable_causes": ["list of likely causes"],\n'
+    '  "severity_level": "low/medium/high/critical",\n'
+    '  "recommended_actions": ["list of specific actions to take"],\n'
+    '  "prevention_tips": ["list of prevention measures"],\n'
+    '  "crop_identified": "name of the crop",\n'
+    '  "overall_health": "healthy/unhealthy",\n'
+    '  "confidence_level": "high/medium/low"\n'
+    "}\n"
+    "\n"
+    "Guidelines:\n"
+    "- Be specific and actionable\n"
+    "- Use simple language for farmers\n"
+    "- If the crop is healthy, focus on maintenance tips\n"
+    "- If unhealthy, provide clear next steps\n"
+    "- Don't mention technical probabilities or API sources\n"
+    "- Make severity assessment based on disease probability and spread potential\n"
+    "- Ensure all arrays have at least one item\n"
+    "- Use proper JSON syntax with double quotes"
+)
+
+
+async def prepare_upload(image_data: bytes) -> Optional[PreparedImage]:
+    """
+    Decode an upload once for the quality gate, the near-duplicate hash and the
+    provider renditions. An unreadable upload returns None when the quality gate
+    is on (it answers with a retake hint) and raises ImageDecodeError otherwise.
+    """
+    try:
+        return await asyncio.to_thread(prepare_image, image_data)
+    except ImageDecodeError:
+        if IMAGE_QUALITY_GATE:
+            return None
+        raise
+
+
+async def quality_rejection(prepared: Optional[PreparedImage]) -> Optional[dict]:
+    """
+    Run the local image quality gate on a decoded upload. Returns the diagnosis
+    payload telling the farmer how to retake the photo when it fails, or None
+    when it passes.
+    """
+    if not IMAGE_QUALITY_GATE:
+        return None
+    report = await asyncio.to_thread(assess_image, prepared)
+    if report.passed:
+        return None
+    print(f"Image rejected by quality gate: {report.issues} {report.metrics}")
+    return {"insight": report.hint, "quality": report.to_dict(), "raw_results": {}}
+
+
+async def near_duplicate_reuse(
+    prepared: Optional[PreparedImage], scope: Optional[Hashable]
+) -> Tuple[Optional[int], Optional[dict]]:
+    """
+    Perceptual hash of a decoded upload and, when a near-identical photo was
+    diagnosed recently in the same scope (see `near_duplicate_scope`), that
+    diagnosis marked as reused, with the Hamming distance under `reused_from`.
+    Returns (None, None) without a scope or a decoded image.
+    """
+    if scope is None or prepared is None:
+        return None, None
+    phash = await asyncio.to_thread(dhash, prepared.image)
+    match = near_duplicate_index.find(scope, phash)
+    if match is None:
+        return phash, None
+    distance, entry = match
+    age = round(time.time() - entry.created_at, 1)
+    print(f"Reusing diagnosis of a near-duplicate photo (distance {distance}, {age}s old)")
+    return phash, {
+        **entry.result,
+        "reused": True,
+        "reused_from": {
+            "diagnosis_id": entry.result.get("diagnosis_id"),
+            "age_seconds": age,
+            "distance": distance,
+        },
+    }
+
+
+def remember_diagnosis(
+    scope: Optional[Hashable], phash: Optional[int], result: dict
+) -> None:
+    """
+    Index a completed diagnosis so re-shots of the same plant can reuse it.
+    Results without an insight (the LLM call failed) are not indexed, so the
+    next re-shot runs a fresh diagnosis instead of reusing the empty one.
+    """
+    if scope is None or phash is None:
+        return
+    if result.get("structured_insight") or result.get("insight"):
+        near_duplicate_index.add(scope, phash, result)
 
 
 async def diagnosis_flow(
-    image_path: str,
+    image_data: bytes,
+    disconnected: Optional[DisconnectCheck] = None,
+    scope: Optional[Hashable] = None,
+    prepared: Optional[PreparedImage] = None,
 ) -> dict:
     """
     Orchestrates the crop health diagnosis flow:
+    - Rejects unusable photos locally, with a retake hint, before any API call.
+    - With a `scope`, returns the earlier diagnosis of a near-duplicate photo
+      from that scope (marked `reused`) instead of calling the APIs again.
     - Calls OpenEPI and Kindwise APIs with the given image.
     - Simplifies and combines the results.
     - Passes the results to the LLM for a human-readable, farmer-friendly insight.
-    - Returns both the LLM's insight and the raw API results.
+    - Returns both the LLM's insight and the raw API results. Similar images are
+      not included; they are served on demand under `similar_images_url`.
+    The upload is decoded once, by `prepare_upload`, unless the caller passes
+    the `prepared` image already.
+    """
+    if prepared is None:
+        prepared = await prepare_upload(image_data)
+    rejection = await quality_rejection(prepared)
+    if rejection:
+        return rejection
+    phash, reused = await near_duplicate_reuse(prepared, scope)
+    if reused:
+        return reused
+
+    diagnosis_id = new_diagnosis_id()
+
+    async def crop_health(_):
+        # Similar images go to the gallery, which also keeps them out of the prompt
+        result = await predict_crop_health(image_data, prepared=prepared)
+        return similar_image_store.detach_all(result, diagnosis_id)
+
+    async def insight(values):
+        return await interpret_diagnosis(values["crop_health"])
+
+    result = await Pipeline(
+        "diagnosis",
+        [
+            Stage("crop_health", crop_health, timeout=FLOW_CROP_HEALTH_TIMEOUT_SECONDS),
+            Stage("insight", insight, requires=("crop_health",)),
+        ],
+    ).run(disconnected)
+    if "crop_health" not in result.values:
+        raise RuntimeError(result.errors["crop_health"])
+    if "insight" not in result.values:
+        return {
+            "insight": None,
+            "raw_results": result.values["crop_health"],
+            "pipeline": result.meta(),
+            **gallery_fields(diagnosis_id),
+        }
+    diagnosis = {**result.values["insight"], **gallery_fields(diagnosis_id)}
+    remember_diagnosis(scope, phash, diagnosis)
+    return {**diagnosis, "pipeline": result.meta()}
+
+
+async def diagnosis_flow_stream(
+    image_data: bytes,
+    scope: Optional[Hashable] = None,
+    prepared: Optional[PreparedImage] = None,
+):
+    """
+    Progressive variant of `diagnosis_flow` for SSE endpoints.
+    Yields (event, data) pairs: a `provider` event for each crop-health provider as
+    soon as it answers, then `insight` with the payload `diagnosis_flow` returns.
+    Rejected and reused diagnoses yield only `insight`. Providers still running
+    after FLOW_CROP_HEALTH_TIMEOUT_SECONDS, the budget `diagnosis_flow` gives its
+    crop-health stage, are cancelled and reported with error "timeout".
+    """
+    if prepared is None:
+        prepared = await prepare_upload(image_data)
+    rejection = await quality_rejection(prepared)
+    if rejection:
+        yield "insight", rejection
+        return
+    phash, reused = await near_duplicate_reuse(prepared, scope)
+    if reused:
+        yield "insight", reused
+        return
+
+    diagnosis_id = new_diagnosis_id()
+    started = time.perf_counter()
+    deadline = started + FLOW_CROP_HEALTH_TIMEOUT_SECONDS
+    combined_result = {}
+    failed = set()
+    providers = stream_crop_health(image_data, prepared=prepared)
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(
+                    anext(providers), max(0.0, deadline - time.perf_counter())
+                )
+            except StopAsyncIteration:
+                break
+            if item["provider"] == "kindwise":
+                result = similar_image_store.detach(item["result"], diagnosis_id)
+                item = {**item, "result": result}
+            combined_result[item["provider"]] = item["result"]
+            if item["error"]:
+                failed.add(item["provider"])
+            yield "provider", {
+                **item,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+    except asyncio.TimeoutError:
+        print(
+            f"Crop-health providers timed out after {FLOW_CROP_HEALTH_TIMEOUT_SECONDS:g}s"
+        )
+    finally:
+        # Cancels the calls still in flight
+        await providers.aclose()
+
+    for provider in ("kindwise", "openepi", "deepl"):
+        if provider not in combined_result:
+            combined_result[provider] = simplify_provider_result(provider, {})
+            failed.add(provider)
+            yield "provider", {
+                "provider": provider,
+                "result": combined_result[provider],
+                "error": "timeout",
+                "cached": False,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+
+    if "kindwise" in failed and "deepl" in failed:
+        raise RuntimeError(
+            "Both Kindwise and DeepLeaf APIs failed. Unable to analyze crop health."
+        )
+    # Same key order as predict_crop_health so the insight prompt, and its cache
+    # entry, match the non-streaming flow
+    combined_result = {
+        provider: combined_result[provider]
+        for provider in ("kindwise", "openepi", "deepl")
+    }
+    insight = await interpret_diagnosis(combined_result)
+    diagnosis = {**insight, **gallery_fields(diagnosis_id)}
+    remember_diagnosis(scope, phash, diagnosis)
+    yield "insight", diagnosis
+
+
+def compact_diagnosis(result: dict) -> dict:
+    """The parts of one photo's provider results that matter for a field summary."""
+    kindwise = result.get("kindwise", {})
+    deepl = result.get("deepl", {})
+    crops = kindwise.get("crops") or []
+    return {
+        "crop": crops[0]["name"] if crops else None,
+        "healthy_probability": result.get("openepi", {}).get("healthy"),
+        "diseases": [
+            {"name": d["name"], "probability": round(d["probability"], 2)}
+            for d in kindwise.get("diseases", [])
+        ],
+        "diagnoses": [
+            {
+                "name": d.get("common_name"),
+                "likelihood": d.get("diagnosis_likelihood"),
+                "symptoms": d.get("symptoms_short", []),
+            }
+            for d in deepl.get("diagnoses", [])
+        ],
+    }
+
+
+async def summarize_field(photos: list) -> dict:
+    """
+    One LLM call for a whole scouting session. `photos` holds one entry per
+    distinct image: its compact diagnosis and how many uploads it covers.
+    """
+    prompt = (
+        f"{DIAGNOSIS_INSTRUCTIONS}\n\n"
+        f"Field scouting results: {len(photos)} distinct leaf photos from one field "
+        "(JSON list, one entry per photo; 'photos' is how many identical uploads it "
+        f"stands for):\n{json.dumps(photos)}\n"
+        "\n"
+        "Assess the field as a whole: report problems seen across several photos, "
+        "how widespread they are, and the actions that matter most for the field.\n"
+        "CRITICAL: Return ONLY the JSON object, no markdown formatting, no code blocks, no explanations."
+    )
+    llm_response = await llm_service.send_message_async(
+        prompt,
+        cache_ttl=LLM_CACHE_TTL["diagnosis"],
+        route="diagnosis",
+    )
+    return structured_insight(llm_response, photos)
+
+
+async def batch_diagnosis_flow_stream(images: List[bytes]):
     """
+    Diagnose a batch of photos from one field.
+    Identical images are diagnosed once. Distinct images that pass the quality
+    gate run through `predict_crop_health` under the process-wide
+    `batch_diagnosis_slots` limit; the others fail with their retake hint.
+    Photos are decoded inside that limit too, so a large batch never holds more
+    decoded images than there are slots.
+    Yields an `image` event for every upload as its result is ready (duplicates
+    carry `duplicate_of`), then a single `summary` event for the whole field.
+    """
+    started = time.perf_counter()
+    groups: Dict[str, List[int]] = {}
+    for index, image_data in enumerate(images):
+        groups.setdefault(image_digest(image_data), []).append(index)
+
+    async def diagnose(digest: str, indices: List[int]) -> dict:
+        outcome = {"digest": digest, "indices": indices, "result": None}
+        async with batch_diagnosis_slots:
+            try:
+                prepared = await prepare_upload(images[indices[0]])
+            except ImageDecodeError as e:
+                return {**outcome, "error": str(e)}
+            rejection = await quality_rejection(prepared)
+            if rejection:
+                return {
+                    **outcome,
+                    "error": rejection["insight"],
+                    "quality": rejection["quality"],
+                }
+            try:
+                result = await predict_crop_health(
+                    images[indices[0]], prepared=prepared
+                )
+            except Exception as e:
+                return {**outcome, "error": str(e) or type(e).__name__}
+        diagnosis_id = new_diagnosis_id()
+        return {
+            **outcome,
+            "result": similar_image_store.detach_all(result, diagnosis_id),
+            "gallery": gallery_fields(diagnosis_id),
+        }
 
-    combined_result = await predict_crop_health(image_path)
+    tasks = [
+        asyncio.ensure_future(diagnose(digest, indices))
+        for digest, indices in groups.items()
+    ]
+    photos = []
+    failed = 0
+    rejected = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            outcome = await next_done
+            indices, result = outcome["indices"], outcome["result"]
+            error, quality = outcome.get("error"), outcome.get("quality")
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+            for index in indices:
+                yield "image", {
+                    "index": index,
+                    "digest": outcome["digest"],
+                    "duplicate_of": indices[0] if index != indices[0] else None,
+                    "result": result,
+                    "error": error,
+                    "quality": quality,
+                    **outcome.get("gallery", {}),
+                    "elapsed_ms": elapsed_ms,
+                }
+            if quality:
+                rejected += len(indices)
+            elif error:
+                failed += len(indices)
+            elif result.get("kindwise", {}).get("is_plant", True) is not False:
+                photos.append({"photos": len(indices), **compact_diagnosis(result)})
+    finally:
+        # The consumer went away: stop photos that have not been diagnosed yet
+        for task in tasks:
+            task.cancel()
 
+    meta = {
+        "images": len(images),
+        "unique_images": len(groups),
+        "failed_images": failed,
+        "rejected_images": rejected,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    if not photos:
+        yield "summary", {
+            "insight": "None of the photos could be diagnosed as a plant. Please retake clear photos of the affected leaves.",
+            "raw_results": [],
+            **meta,
+        }
+        return
+    yield "summary", {**await summarize_field(photos), **meta}
+
+
+async def interpret_diagnosis(combined_result: dict) -> dict:
+    """Turn combined provider results into the farmer-facing insight."""
     # If Kindwise confidently indicates this is not a plant, short-circuit with a clear message
     try:
         is_plant_flag = combined_result.get("kindwise", {}).get("is_plant", True)
@@ -34,48 +444,29 @@ async def diagnosis_flow(
             "raw_results": combined_result,
         }
     prompt = (
-        "You are an expert agricultural advisor for smallholder farmers.\n"
-        "You will receive crop health diagnosis results from different api's.\n"
-        "Your job is to analyze the results and provide structured advice.\n"
-        "\n"
-        "IMPORTANT: You must respond with ONLY a valid JSON object, no additional text or explanations.\n"
-        "\n"
-        "Analyze the diagnosis results and provide a JSON response with this exact structure:\n"
-        "{\n"
-        '  "identified_problems": ["list of specific problems detected"],\n'
-        '  "symptoms_noticed": ["list of visible symptoms"],\n'
-        '  "probable_causes": ["list of likely causes"],\n'
-        '  "severity_level": "low/medium/high/critical",\n'
-        '  "recommended_actions": ["list of specific actions to take"],\n'
-        '  "prevention_tips": ["list of prevention measures"],\n'
-        '  "crop_identified": "name of the crop",\n'
-        '  "overall_health": "healthy/unhealthy",\n'
-        '  "confidence_level": "high/medium/low"\n'
-        "}\n"
-        "\n"
-        "Guidelines:\n"
-        "- Be specific and actionable\n"
-        "- Use simple language for farmers\n"
-        "- If the crop is healthy, focus on maintenance tips\n"
-        "- If unhealthy, provide clear next steps\n"
-        "- Don't mention technical probabilities or API sources\n"
-        "- Make severity assessment based on disease probability and spread potential\n"
-        "- Ensure all arrays have at least one item\n"
-        "- Use proper JSON syntax with double quotes\n"
-        "\n"
+        f"{DIAGNOSIS_INSTRUCTIONS}\n\n"
         f"Diagnosis Results (JSON):\n{combined_result}\n"
         "\n"
         "CRITICAL: Return ONLY the JSON object, no markdown formatting, no code blocks, no explanations."
     )
 
-    llm_response = llm_service.send_message(prompt)
+    llm_response = await llm_service.send_message_async(
+        prompt,
+        cache_ttl=LLM_CACHE_TTL["diagnosis"],
+        route="diagnosis",
+    )
+
+    return structured_insight(llm_response, combined_result)
+
 
+def structured_insight(llm_response: dict, raw_results) -> dict:
+    """Parse the diagnosis JSON from an LLM reply, falling back to the raw text."""
     # Try to parse the response as JSON
     try:
         import json
         import re
 
-        response_text = llm_response.get("response", "{}")
+        response_text = llm_response.get("response") or "{}"
 
         # Try to extract JSON from the response (in case it's wrapped in markdown or has extra text)
         json_match = re.search(r"\{.*\}", response_text, re.DOTALL)
@@ -108,20 +499,53 @@ async def diagnosis_flow(
         if all(field in structured_response for field in required_fields):
             return {
                 "structured_insight": structured_response,
-                "raw_results": combined_result,
+                "raw_results": raw_results,
             }
         else:
             # Fallback to old format if JSON parsing fails or structure is incomplete
             return {
                 "insight": llm_response.get("response"),
-                "raw_results": combined_result,
+                "raw_results": raw_results,
             }
 
     except (json.JSONDecodeError, KeyError, TypeError) as e:
         print(f"JSON parsing failed: {e}")
         print(f"Response was: {llm_response.get('response', '{}')}")
         # Fallback to old format if JSON parsing fails
-        return {"insight": llm_response.get("response"), "raw_results": combined_result}
+        return {"insight": llm_response.get("response"), "raw_results": raw_results}
+
+
+def field_stages(
+    lat: float,
+    lon: float,
+    depth: str,
+    top_k: int,
+    past_days: int,
+    forecast_days: int,
+) -> list:
+    """Soil and weather stages, served from the shared field context."""
+
+    async def soil(_):
+        return await field_context_service.soil(lat, lon, depth, top_k)
+
+    async def weather(_):
+        return await field_context_service.weather(lat, lon, past_days, forecast_days)
+
+    return [
+        Stage("soil", soil, timeout=FLOW_SOIL_TIMEOUT_SECONDS),
+        Stage("weather", weather, timeout=FLOW_WEATHER_TIMEOUT_SECONDS),
+    ]
+
+
+def missing_data_note(values: dict) -> str:
+    """Prompt line telling the LLM which field data could not be fetched."""
+    missing = [name for name in ("soil", "weather") if name not in values]
+    if not missing:
+        return ""
+    return (
+        f"\nNote: {' and '.join(missing)} data is unavailable right now. "
+        "Base the advice on the data above and say what should be checked locally.\n"
+    )
 
 
 async def recommend_crops_flow(
@@ -131,81 +555,91 @@ async def recommend_crops_flow(
     top_k: int = 5,
     past_days: int = 30,
     forecast_days: int = 0,
+    disconnected: Optional[DisconnectCheck] = None,
 ) -> dict:
     """
     Orchestrates the crop recommendation flow:
-    - Gets simplified soil and weather summaries.
+    - Gets simplified soil and weather summaries (from the shared field context).
     - Builds a prompt for the LLM.
     - Returns the LLM's crop recommendation and the input data.
+    Soil and weather are separate stages with their own timeouts; when one is
+    missing the recommendation is made from the other and the response says so.
     """
-    # Fetch soil and weather summaries in parallel
-    soil_task = get_soil_summary_async(lat, lon, depth, top_k)
-    weather_task = fetch_weather_summary(lat, lon, past_days, forecast_days)
-    soil_summary, weather_raw = await asyncio.gather(soil_task, weather_task)
-    weather_summary = simplify_weather_response(weather_raw)
+    async def recommend(values):
+        if not values:
+            raise RuntimeError("Soil and weather data are both unavailable")
+        soil_summary = values.get("soil") or {}
+        weather_summary = values.get("weather") or {}
 
-    # Build LLM prompt
-    prompt = (
-        "You are an expert agricultural advisor. Here is the soil and weather information for a farmer's field:\n"
-        f"Soil:\n"
-        f"- Soil type: {soil_summary.get('soil_type')}\n"
-        f"- Texture: {soil_summary.get('texture_class')}\n"
-        f"- pH: {soil_summary.get('ph')}\n"
-        f"- Nitrogen: {soil_summary.get('nitrogen_total_g_per_kg')} g/kg\n"
-        f"- Phosphorous: {soil_summary.get('phosphorous_extractable_ppm')} ppm\n"
-        f"- Potassium: {soil_summary.get('potassium_extractable_ppm')} ppm\n"
-        f"- Cation Exchange Capacity: {soil_summary.get('cation_exchange_capacity_cmol_per_kg')} cmol(+)/kg\n"
-        f"- Organic Carbon: {soil_summary.get('carbon_organic_g_per_kg')} g/kg\n"
-        f"\nWeather (last {past_days} days):\n"
-        f"- Average max temperature: {weather_summary.get('avg_temperature_max')}°C\n"
-        f"- Average min temperature: {weather_summary.get('avg_temperature_min')}°C\n"
-        f"- Total rainfall: {weather_summary.get('total_rainfall_mm')} mm\n"
-        f"- Average sunshine hours: {weather_summary.get('avg_sunshine_hours')}\n"
-        f"- Average wind speed: {weather_summary.get('avg_wind_speed_kph')} kph\n"
-        f"- Average evapotranspiration: {weather_summary.get('avg_evapotranspiration')}\n"
-        "\nBased on this information, recommend the 2-3 most suitable crops to plant now. For each crop, explain why it is suitable, and give 1-2 practical tips for success. Be specific, practical, and use simple language for a smallholder farmer."
-    )
-    llm_services = LLMService()
-    llm_response = llm_services.send_message(prompt)
-    print("llm: ", llm_response, llm_response.get("response"))
+        # Fields with the same quantized soil and weather share a recommendation
+        reco_key = None
+        if "soil" in values and "weather" in values:
+            reco_key = recommendation_cache.make_key(
+                "crops", soil_summary, weather_summary, past_days
+            )
+            cached = recommendation_cache.get(reco_key)
+            if cached is not None:
+                return {"recommendation": cached, "cached": True}
 
+        prompt = (
+            "You are an expert agricultural advisor. Here is the soil and weather information for a farmer's field:\n"
+            f"Soil:\n"
+            f"- Soil type: {soil_summary.get('soil_type')}\n"
+            f"- Texture: {soil_summary.get('texture_class')}\n"
+            f"- pH: {soil_summary.get('ph')}\n"
+            f"- Nitrogen: {soil_summary.get('nitrogen_total_g_per_kg')} g/kg\n"
+            f"- Phosphorous: {soil_summary.get('phosphorous_extractable_ppm')} ppm\n"
+            f"- Potassium: {soil_summary.get('potassium_extractable_ppm')} ppm\n"
+            f"- Cation Exchange Capacity: {soil_summary.get('cation_exchange_capacity_cmol_per_kg')} cmol(+)/kg\n"
+            f"- Organic Carbon: {soil_summary.get('carbon_organic_g_per_kg')} g/kg\n"
+            f"\nWeather (last {past_days} days):\n"
+            f"- Average max temperature: {weather_summary.get('avg_temperature_max')}°C\n"
+            f"- Average min temperature: {weather_summary.get('avg_temperature_min')}°C\n"
+            f"- Total rainfall: {weather_summary.get('total_rainfall_mm')} mm\n"
+            f"- Average sunshine hours: {weather_summary.get('avg_sunshine_hours')}\n"
+            f"- Average wind speed: {weather_summary.get('avg_wind_speed_kph')} kph\n"
+            f"- Average evapotranspiration: {weather_summary.get('avg_evapotranspiration')}\n"
+            f"{missing_data_note(values)}"
+            "\nBased on this information, recommend the 2-3 most suitable crops to plant now. For each crop, explain why it is suitable, and give 1-2 practical tips for success. Be specific, practical, and use simple language for a smallholder farmer."
+        )
+        llm_response = await llm_service.send_message_async(
+            prompt,
+            cache_ttl=LLM_CACHE_TTL["crop_recommendation"],
+            route="crop_recommendation",
+        )
+        print("llm: ", llm_response, llm_response.get("response"))
+        if reco_key and llm_response.get("response"):
+            recommendation_cache.set(reco_key, "crops", llm_response["response"])
+        return {"recommendation": llm_response.get("response"), "cached": False}
+
+    stages = field_stages(lat, lon, depth, top_k, past_days, forecast_days)
+    stages.append(Stage("recommendation", recommend, after=("soil", "weather")))
+    result = await Pipeline("recommend_crops", stages).run(disconnected)
+    if not result.values:
+        raise RuntimeError("; ".join(f"{k}: {v}" for k, v in result.errors.items()))
+
+    recommendation = result.values.get("recommendation", {})
     return {
-        "recommendation": llm_response.get("response"),
-        "soil_summary": soil_summary,
-        "weather_summary": weather_summary,
+        "recommendation": recommendation.get("recommendation"),
+        "soil_summary": result.values.get("soil"),
+        "weather_summary": result.values.get("weather"),
+        "cached": recommendation.get("cached", False),
+        "pipeline": result.meta(),
     }
 
 
-async def recommend_fertilizer_flow(
-    lat: float,
-    lon: float,
+def fertilizer_notes(
+    soil_summary: dict,
     target_crop: str,
-    depth: str = "0-20",
-    top_k: int = 5,
-    past_days: int = 30,
-    forecast_days: int = 0,
     previous_crop: Optional[str] = None,
     growth_stage: Optional[str] = None,
 ) -> dict:
-    """
-    Orchestrates the fertilizer recommendation flow:
-    - Gets simplified soil and weather summaries.
-    - Adds rule-based deficiency detection if NPK is missing.
-    - Builds a prompt for the LLM including previous crop and growth stage.
-    - Returns the fertilizer recommendation and the input data.
-    """
-
-    # Fetch soil and weather summaries in parallel
-    soil_task = get_soil_summary_async(lat, lon, depth, top_k)
-    weather_task = fetch_weather_summary(lat, lon, past_days, forecast_days)
-    soil_summary, weather_raw = await asyncio.gather(soil_task, weather_task)
-    weather_summary = simplify_weather_response(weather_raw)
-
+    """Rule-based deficiency, rotation and growth stage notes for the fertilizer flow."""
     # --- Rule-based deficiency detection if NPK missing ---
     deficiency_notes = []
     # Nitrogen
     if soil_summary.get("nitrogen_total_g_per_kg") is None:
-        if soil_summary.get("texture_class", "").lower() == "sandy":
+        if (soil_summary.get("texture_class") or "").lower() == "sandy":
             deficiency_notes.append(
                 "Sandy soil: likely poor nitrogen retention. Consider more nitrogen fertilizer."
             )
@@ -267,48 +701,130 @@ async def recommend_fertilizer_flow(
         else:
             growth_stage_note = f"Growth stage: {growth_stage}."
 
-    # Build LLM prompt
-    prompt = (
-        "You are a professional agronomist helping smallholder farmers apply the right fertilizer.\n"
-        f"Crop to be grown: {target_crop}\n\n"
-        f"Previous crop: {previous_crop or 'Not provided'}\n"
-        f"Growth stage: {growth_stage or 'Not provided'}\n"
-        f"Rotation note: {rotation_note}\n"
-        f"Growth stage note: {growth_stage_note}\n"
-        f"\n\U0001f324 Weather (last {past_days} days):\n"
-        f"- Avg max temperature: {weather_summary.get('avg_temperature_max')}°C\n"
-        f"- Avg min temperature: {weather_summary.get('avg_temperature_min')}°C\n"
-        f"- Total rainfall: {weather_summary.get('total_rainfall_mm')} mm\n"
-        f"- Avg sunshine hours: {weather_summary.get('avg_sunshine_hours')} hrs\n"
-        f"- Avg wind speed: {weather_summary.get('avg_wind_speed_kph')} kph\n"
-        f"- Avg evapotranspiration: {weather_summary.get('avg_evapotranspiration')}\n"
-        "\n\U0001f3af Task:\n"
-        "Recommend the best fertilizer plan for this field based on the soil and weather conditions, crop rotation, and growth stage.\n"
-        "Mention the nutrient(s) that are lacking or need support.\n"
-        "Suggest both organic and chemical options if possible.\n"
-        "Give specific dosages per hectare, and explain when and how to apply.\n"
-        "Use practical, farmer-friendly language. Keep it short and actionable.\n"
-        "\nHere is the soil and weather information for a farmer's field:\n"
-        f"4cd Soil:\n"
-        f"- Soil type: {soil_summary.get('soil_type')}\n"
-        f"- Texture: {soil_summary.get('texture_class')}\n"
-        f"- pH: {soil_summary.get('ph')}\n"
-        f"- Nitrogen: {soil_summary.get('nitrogen_total_g_per_kg')} g/kg\n"
-        f"- Phosphorous: {soil_summary.get('phosphorous_extractable_ppm')} ppm\n"
-        f"- Potassium: {soil_summary.get('potassium_extractable_ppm')} ppm\n"
-        f"- Cation Exchange Capacity: {soil_summary.get('cation_exchange_capacity_cmol_per_kg')} cmol(+)/kg\n"
-        f"- Organic Carbon: {soil_summary.get('carbon_organic_g_per_kg')} g/kg\n"
-        f"\nDeficiency notes: {deficiency_text}\n"
-        f"\n"
-    )
-
-    llm_response = llm_service.send_message(prompt)
-
     return {
-        "recommendation": llm_response.get("response"),
-        "soil_summary": soil_summary,
-        "weather_summary": weather_summary,
         "deficiency_notes": deficiency_notes,
+        "deficiency_text": deficiency_text,
         "rotation_note": rotation_note,
         "growth_stage_note": growth_stage_note,
     }
+
+
+async def recommend_fertilizer_flow(
+    lat: float,
+    lon: float,
+    target_crop: str,
+    depth: str = "0-20",
+    top_k: int = 5,
+    past_days: int = 30,
+    forecast_days: int = 0,
+    previous_crop: Optional[str] = None,
+    growth_stage: Optional[str] = None,
+    disconnected: Optional[DisconnectCheck] = None,
+) -> dict:
+    """
+    Orchestrates the fertilizer recommendation flow:
+    - Gets simplified soil and weather summaries (from the shared field context).
+    - Adds rule-based deficiency detection if NPK is missing.
+    - Builds a prompt for the LLM including previous crop and growth stage.
+    - Returns the fertilizer recommendation and the input data.
+    """
+    async def notes(values):
+        return fertilizer_notes(
+            values.get("soil") or {}, target_crop, previous_crop, growth_stage
+        )
+
+    async def recommend(values):
+        if "soil" not in values and "weather" not in values:
+            raise RuntimeError("Soil and weather data are both unavailable")
+        soil_summary = values.get("soil") or {}
+        weather_summary = values.get("weather") or {}
+        deficiency_text = values["notes"]["deficiency_text"]
+        rotation_note = values["notes"]["rotation_note"]
+        growth_stage_note = values["notes"]["growth_stage_note"]
+
+        reco_key = None
+        if "soil" in values and "weather" in values:
+            reco_key = recommendation_cache.make_key(
+                "fertilizer",
+                soil_summary,
+                weather_summary,
+                past_days,
+                target_crop=target_crop,
+                growth_stage=growth_stage,
+                previous_crop=previous_crop,
+            )
+            cached = recommendation_cache.get(reco_key)
+            if cached is not None:
+                return {"recommendation": cached, "cached": True}
+
+        # Build LLM prompt
+        prompt = (
+            "You are a professional agronomist helping smallholder farmers apply the right fertilizer.\n"
+            f"Crop to be grown: {target_crop}\n\n"
+            f"Previous crop: {previous_crop or 'Not provided'}\n"
+            f"Growth stage: {growth_stage or 'Not provided'}\n"
+            f"Rotation note: {rotation_note}\n"
+            f"Growth stage note: {growth_stage_note}\n"
+            f"\n\U0001f324 Weather (last {past_days} days):\n"
+            f"- Avg max temperature: {weather_summary.get('avg_temperature_max')}°C\n"
+            f"- Avg min temperature: {weather_summary.get('avg_temperature_min')}°C\n"
+            f"- Total rainfall: {weather_summary.get('total_rainfall_mm')} mm\n"
+            f"- Avg sunshine hours: {weather_summary.get('avg_sunshine_hours')} hrs\n"
+            f"- Avg wind speed: {weather_summary.get('avg_wind_speed_kph')} kph\n"
+            f"- Avg evapotranspiration: {weather_summary.get('avg_evapotranspiration')}\n"
+            "\n\U0001f3af Task:\n"
+            "Recommend the best fertilizer plan for this field based on the soil and weather conditions, crop rotation, and growth stage.\n"
+            "Mention the nutrient(s) that are lacking or need support.\n"
+            "Suggest both organic and chemical options if possible.\n"
+            "Give specific dosages per hectare, and explain when and how to apply.\n"
+            "Use practical, farmer-friendly language. Keep it short and actionable.\n"
+            "\nHere is the soil and weather information for a farmer's field:\n"
+            f"4cd Soil:\n"
+            f"- Soil type: {soil_summary.get('soil_type')}\n"
+            f"- Texture: {soil_summary.get('texture_class')}\n"
+            f"- pH: {soil_summary.get('ph')}\n"
+            f"- Nitrogen: {soil_summary.get('nitrogen_total_g_per_kg')} g/kg\n"
+            f"- Phosphorous: {soil_summary.get('phosphorous_extractable_ppm')} ppm\n"
+            f"- Potassium: {soil_summary.get('potassium_extractable_ppm')} ppm\n"
+            f"- Cation Exchange Capacity: {soil_summary.get('cation_exchange_capacity_cmol_per_kg')} cmol(+)/kg\n"
+            f"- Organic Carbon: {soil_summary.get('carbon_organic_g_per_kg')} g/kg\n"
+            f"\nDeficiency notes: {deficiency_text}\n"
+            f"{missing_data_note(values)}"
+            f"\n"
+        )
+
+        llm_response = await llm_service.send_message_async(
+            prompt,
+            cache_ttl=LLM_CACHE_TTL["fertilizer_recommendation"],
+            route="fertilizer_recommendation",
+        )
+        if reco_key and llm_response.get("response"):
+            recommendation_cache.set(reco_key, "fertilizer", llm_response["response"])
+        return {"recommendation": llm_response.get("response"), "cached": False}
+
+    stages = field_stages(lat, lon, depth, top_k, past_days, forecast_days)
+    stages += [
+        Stage("notes", notes, after=("soil",)),
+        Stage(
+            "recommendation",
+            recommend,
+            requires=("notes",),
+            after=("soil", "weather"),
+        ),
+    ]
+    result = await Pipeline("recommend_fertilizer", stages).run(disconnected)
+    if "soil" not in result.values and "weather" not in result.values:
+        raise RuntimeError("; ".join(f"{k}: {v}" for k, v in result.errors.items()))
+
+    recommendation = result.values.get("recommendation", {})
+    field_notes = result.values.get("notes", {})
+    return {
+        "recommendation": recommendation.get("recommendation"),
+        "soil_summary": result.values.get("soil"),
+        "weather_summary": result.values.get("weather"),
+        "deficiency_notes": field_notes.get("deficiency_notes", []),
+        "rotation_note": field_notes.get("rotation_note", ""),
+        "growth_stage_note": field_notes.get("growth_stage_note", ""),
+        "cached": recommendation.get("cached", False),
+        "pipeline": result.meta(),
+    }
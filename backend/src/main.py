@@ -6,6 +6,7 @@ env_path = Path(__file__).resolve().parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, APIRouter
 from src.routes.crop_health import router as crop_health_router
 from src.routes.soil_data import router as soil_router
@@ -14,12 +15,26 @@ from src.routes.recommend import router as recommend_router
 from src.routes.chat import router as chat_router
 from src.routes.user import router as user_router
 from src.routes.maps import router as maps_router
+from src.routes.metrics import router as metrics_router
+from src.routes.uploads import (
+    BATCH_UPLOAD_MAX_REQUEST_BYTES,
+    UploadSizeLimitMiddleware,
+)
+from src.services.llm_service import llm_registry
 
 
 from fastapi.middleware.cors import CORSMiddleware
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pre-warm shared LLM connections so the first request skips the TLS handshake
+    await llm_registry.startup()
+    yield
+    await llm_registry.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 origins = [
@@ -27,6 +42,14 @@ origins = [
 ]
 
 
+# Stop oversized multipart uploads while they are still being received. Added
+# before CORSMiddleware, which therefore wraps it, so its early 413 carries the
+# CORS headers and browsers can report it as "file too large".
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    path_limits={"/api/crop-health/diagnose-batch": BATCH_UPLOAD_MAX_REQUEST_BYTES},
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -43,3 +66,4 @@ app.include_router(recommend_router)
 app.include_router(chat_router)
 app.include_router(user_router)
 app.include_router(maps_router)
+app.include_router(metrics_router)
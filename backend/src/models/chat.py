@@ -15,6 +15,8 @@ class ChatSession(BaseModel):
     created_at: datetime
     updated_at: datetime
     user_id: Optional[str] = None
+    summary: Optional[str] = None
+    summarized_count: int = 0
 
 
 class User(BaseModel):
@@ -1,5 +1,4 @@
 import re
-import json
 import requests
 from fastapi import (
     APIRouter,
@@ -12,6 +11,7 @@ from fastapi import (
     Request,
 )
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from typing import Optional
 from src.services.chat_service import chat_session_manager
@@ -20,12 +20,23 @@ from src.services.transalation_service import (
     translation_fallback_service,
 )
 from src.services.llm_service import llm_service
+from src.services.llm_cache import LLM_CACHE_TTL
+from src.services.prompt_builder import assemble_chat_prompt, build_farmer_profile
+from src.services.summary_service import conversation_summarizer
+from src.services.intent_classifier import (
+    INTENTS,
+    INTENT_CONFIDENCE_THRESHOLD,
+    intent_classifier,
+    keyword_intent,
+)
 from src.services.audio_service import audio_service
 from src.services.tts_service import tts_service
+from src.services.near_duplicates import near_duplicate_scope
 from src.auth.auth_utils import get_current_user
-from src.flows import diagnosis_flow, recommend_crops_flow
-import tempfile
-import os
+from src.flows import diagnosis_flow, diagnosis_flow_stream, recommend_crops_flow
+from src.routes.sse import format_sse
+from src.routes.uploads import prepare_image_upload, read_upload
+import asyncio
 
 
 def clean_text_for_tts(text: str) -> str:
@@ -60,9 +71,24 @@ def clean_text_for_tts(text: str) -> str:
     return text
 
 
-def _sse(event: str, data: dict) -> bytes:
-    """Format a Server-Sent Event line."""
-    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+def split_complete_sentences(text: str) -> tuple[list[str], str]:
+    """Split buffered text into finished sentences and the unfinished remainder."""
+    parts = re.split(r"(?<=[.!?\n])\s+", text)
+    if len(parts) == 1:
+        return [], text
+    return [p for p in parts[:-1] if p.strip()], parts[-1]
+
+
+async def translate_from_english_async(text: str, dest_lang: str) -> str:
+    """Translate off the event loop, falling back to the secondary service."""
+    try:
+        return await asyncio.to_thread(
+            translation_service.translate_from_english, text, dest_lang
+        )
+    except Exception:
+        return await asyncio.to_thread(
+            translation_fallback_service.translate_from_english, text, dest_lang
+        )
 
 
 def auto_compact_text(
@@ -209,11 +235,90 @@ def parse_lat_lon_from_location(location: str) -> tuple[float, float] | None:
         return None
 
 
-def detect_intent(message_en: str) -> str:
-    """Detect user intent using the LLM. Returns one of:
+CHAT_REPLY_POLICY = """You are an agricultural assistant helping farmers.
+Reply policy:
+- Be concise by default.
+- If the user asks for diagnosis or mentions disease/symptoms, instruct them briefly to attach or take a clear photo of the affected plant using the camera button in the chat, then wait for the image.
+- If the question is vague, ask one brief clarifying question.
+- Use simple, direct language suited for farmers."""
+
+VOICE_REPLY_POLICY = """You are an agricultural assistant helping farmers.
+Reply policy:
+- Be concise by default (1–3 sentences). Avoid small talk and generic disclaimers.
+- If the question is vague, ask one brief clarifying question.
+- Use simple, direct language suited for farmers."""
+
+BRIEF_ANSWER_CLOSING = "Provide a brief, helpful answer tailored to the farmer's context."
+
+PERSONALIZED_ANSWER_CLOSING = (
+    "Respond as the agricultural assistant, taking into account the farmer's "
+    "specific profile, location, experience level, and crops. Provide personalized "
+    "advice that considers their farming context."
+)
+
+
+def build_chat_prompt(
+    current_user,
+    session,
+    user_message: str,
+    policy: str = CHAT_REPLY_POLICY,
+    closing: str = BRIEF_ANSWER_CLOSING,
+    user_label: str = "User message",
+    call_site: str = "chat",
+) -> str:
+    """Assemble a chat prompt from the session's rolling summary and recent turns."""
+    farmer_info = build_farmer_profile(
+        current_user, clean_location_for_display(current_user.location)
+    )
+    prompt, _ = assemble_chat_prompt(
+        policy,
+        farmer_info,
+        session.messages[session.summarized_count :],
+        user_message,
+        closing,
+        user_label=user_label,
+        call_site=call_site,
+        summary=session.summary,
+    )
+    return prompt
+
+
+LLM_UNAVAILABLE_TEXT = (
+    "I'm receiving a lot of questions right now and couldn't answer yours. "
+    "Please try again in a minute."
+)
+
+
+def record_llm_reply(session_id: str, llm_response: dict, summarize: bool = True) -> str:
+    """Persist a successful LLM reply and return its text.
+    When the call failed or was shed under load, nothing is stored and a short
+    retry message is returned instead.
+    """
+    llm_text = llm_response.get("response")
+    if not llm_text:
+        print(f"LLM reply unavailable: {llm_response.get('error')}")
+        return LLM_UNAVAILABLE_TEXT
+    chat_session_manager.add_message(session_id, sender="llm", message=llm_text)
+    if summarize:
+        conversation_summarizer.schedule(session_id)
+    return llm_text
+
+
+async def detect_intent(message_en: str) -> str:
+    """Detect user intent. Returns one of:
     'crop_recommendation' | 'diagnosis' | 'fertilizer_recommendation' | 'general'.
+    Uses the local classifier and only asks the LLM when it is not confident.
     Falls back to 'general' if unsure.
     """
+    if intent_classifier is not None:
+        intent, confidence = intent_classifier.predict(message_en or "")
+        if confidence >= INTENT_CONFIDENCE_THRESHOLD:
+            return intent
+    return await detect_intent_llm(message_en)
+
+
+async def detect_intent_llm(message_en: str) -> str:
+    """Detect user intent using the LLM, with keyword heuristics as fallback."""
     try:
         # Keep prompt small and deterministic
         prompt = (
@@ -227,8 +332,14 @@ def detect_intent(message_en: str) -> str:
             f"User: {message_en}\n\n"
             'Respond with ONLY JSON like {"intent": "crop_recommendation"}.'
         )
-        resp = llm_service.send_message(prompt, temperature=0.0, max_output_tokens=24)
-        data = resp.get("response", "{}")
+        resp = await llm_service.send_message_async(
+            prompt,
+            cache_ttl=LLM_CACHE_TTL["intent"],
+            route="intent",
+            temperature=0.0,
+            max_output_tokens=24,
+        )
+        data = resp.get("response") or "{}"
         import json, re
 
         m = re.search(r"\{.*\}", data, re.DOTALL)
@@ -246,38 +357,10 @@ def detect_intent(message_en: str) -> str:
             normalized = "crop_recommendation"
         elif normalized in ("fertilizer", "fertiliser", "fertilizer_recommendation"):
             normalized = "fertilizer_recommendation"
-        if normalized in {
-            "crop_recommendation",
-            "diagnosis",
-            "fertilizer_recommendation",
-            "general",
-        }:
+        if normalized in set(INTENTS):
             return normalized
         # Fallback heuristic
-        mlc = (message_en or "").lower()
-        if (
-            ("recommend" in mlc and ("crop" in mlc or "plant" in mlc))
-            or ("what to plant" in mlc)
-            or ("best crop" in mlc)
-        ):
-            return "crop_recommendation"
-        if any(
-            k in mlc
-            for k in [
-                "disease",
-                "blight",
-                "symptom",
-                "leaf spot",
-                "diagnos",
-                "unhealthy",
-            ]
-        ):
-            return "diagnosis"
-        if any(
-            k in mlc for k in ["fertilizer", "fertiliser", "npk", "dosage", "apply"]
-        ):
-            return "fertilizer_recommendation"
-        return "general"
+        return keyword_intent(message_en) or "general"
     except Exception:
         return "general"
 
@@ -304,6 +387,65 @@ def start_session(req: StartSessionRequest, current_user=Depends(get_current_use
     return {"session_id": session.session_id, "created_at": session.created_at}
 
 
+async def finish_diagnosis_reply(session_id: str, result: dict, user_lang: str) -> dict:
+    """Format a diagnosis result as the chat reply, persist it and return the payload."""
+    structured = result.get("structured_insight")
+    if structured:
+        problems = structured.get("identified_problems", []) or []
+        overall = structured.get("overall_health") or "Unknown"
+        severity = structured.get("severity_level") or "Unknown"
+        recs = structured.get("recommended_actions", []) or []
+
+        # Clean items and remove trailing punctuation artifacts
+        def _clean_list(items):
+            cleaned = []
+            for it in items:
+                if not isinstance(it, str):
+                    it = str(it)
+                it = it.strip().rstrip(",")
+                if it:
+                    cleaned.append(it)
+            return cleaned
+
+        problems = _clean_list(problems)[:5]
+        recs = _clean_list(recs)[:5]
+
+        # Markdown-formatted, scannable summary
+        md_lines = [
+            f"**Overall:** {overall}",
+            f"**Severity:** {severity}",
+        ]
+        if problems:
+            md_lines.append("\n**Problems**:")
+            md_lines.extend([f"- {p}" for p in problems])
+        if recs:
+            md_lines.append("\n**Next steps**:")
+            md_lines.extend([f"- {r}" for r in recs])
+        assistant_text = "\n".join(md_lines) or "Diagnosis completed."
+    else:
+        assistant_text = result.get("insight") or "Diagnosis completed."
+
+    # Translate back to user's preferred language if needed; translation and the
+    # DB write block, so both run off the event loop
+    if user_lang != "en" and assistant_text:
+        assistant_text = await translate_from_english_async(assistant_text, user_lang)
+    await asyncio.to_thread(
+        chat_session_manager.add_message, session_id, "llm", assistant_text
+    )
+    conversation_summarizer.schedule(session_id)
+
+    # Similar images are fetched on demand from similar_images_url
+    return {
+        "action": "diagnose_crop",
+        "response": assistant_text,
+        "structured_insight": structured,
+        "diagnosis_id": result.get("diagnosis_id"),
+        "similar_images_url": result.get("similar_images_url"),
+        "reused": result.get("reused", False),
+        "reused_from": result.get("reused_from"),
+    }
+
+
 @router.post("/send-message")
 async def send_message(
     request: Request,
@@ -313,6 +455,20 @@ async def send_message(
     preferred_language: Optional[str] = Query(
         None, description="Preferred language for conversation"
     ),
+    stream: Optional[bool] = Query(
+        False,
+        description=(
+            "If true, stream the reply as SSE events: token, done "
+            "(with an image: provider, diagnosis, done)"
+        ),
+    ),
+    crop: Optional[str] = Query(
+        None,
+        description=(
+            "Crop in the attached photo, if known; an earlier diagnosis is only "
+            "reused for a photo of the same crop"
+        ),
+    ),
     current_user=Depends(get_current_user),
 ):
     # Support both JSON body and multipart form
@@ -325,6 +481,7 @@ async def send_message(
             data = {}
         session_id = data.get("session_id")
         message = data.get("message")
+        stream = stream or bool(data.get("stream"))
 
     if not session_id:
         raise HTTPException(status_code=400, detail="session_id is required")
@@ -361,131 +518,52 @@ async def send_message(
             session_id, sender="user", message=message_for_llm
         )
 
-    messages_formatted = "\n".join(
-        [f"{m.sender}: {m.message}" for m in session.messages[-10:]]
-    )
-
-    # Get farmer's personalized information
-    farmer_info = f"""
-Farmer Profile:
-- Name: {current_user.name}
-- Location: {clean_location_for_display(current_user.location)}
-- Experience: {current_user.years_experience} years
-- User Type: {current_user.user_type}
-- Main Goal: {current_user.main_goal}
-- Preferred Language: {current_user.preferred_language}
-- Crops Grown: {current_user.crops_grown}
-"""
-
     # If an image is provided, run the diagnosis flow (function-calling behavior)
-    temp_image_path = None
     if image is not None:
         if not image.content_type or not image.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="File must be an image")
-        try:
-            suffix = os.path.splitext(image.filename or "upload.jpg")[1] or ".jpg"
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                tmp.write(await image.read())
-                temp_image_path = tmp.name
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Error saving image: {str(e)}")
+        image_data = await read_upload(image, "chat.send_message", "image")
+        prepared = await prepare_image_upload(image_data)
+        # Only photos from this conversation and of the same crop are reused
+        scope = near_duplicate_scope(
+            current_user.user_id, current_user.location, session_id, crop
+        )
 
-        try:
-            result = await diagnosis_flow(temp_image_path)
-        finally:
-            try:
-                if temp_image_path and os.path.exists(temp_image_path):
-                    os.remove(temp_image_path)
-            except Exception:
-                pass
-
-        structured = result.get("structured_insight")
-        if structured:
-            problems = structured.get("identified_problems", []) or []
-            overall = structured.get("overall_health") or "Unknown"
-            severity = structured.get("severity_level") or "Unknown"
-            recs = structured.get("recommended_actions", []) or []
-
-            # Clean items and remove trailing punctuation artifacts
-            def _clean_list(items):
-                cleaned = []
-                for it in items:
-                    if not isinstance(it, str):
-                        it = str(it)
-                    it = it.strip().rstrip(",")
-                    if it:
-                        cleaned.append(it)
-                return cleaned
-
-            problems = _clean_list(problems)[:5]
-            recs = _clean_list(recs)[:5]
-
-            # Markdown-formatted, scannable summary
-            md_lines = [
-                f"**Overall:** {overall}",
-                f"**Severity:** {severity}",
-            ]
-            if problems:
-                md_lines.append("\n**Problems**:")
-                md_lines.extend([f"- {p}" for p in problems])
-            if recs:
-                md_lines.append("\n**Next steps**:")
-                md_lines.extend([f"- {r}" for r in recs])
-            assistant_text = "\n".join(md_lines) or "Diagnosis completed."
-        else:
-            assistant_text = result.get("insight") or "Diagnosis completed."
+        if stream:
+
+            async def diagnosis_events():
+                # Each provider's result is sent as it arrives, then the full reply
+                try:
+                    async for event, data in diagnosis_flow_stream(
+                        image_data, scope, prepared
+                    ):
+                        if event == "insight":
+                            reply = await finish_diagnosis_reply(
+                                session_id, data, user_lang
+                            )
+                            yield format_sse("diagnosis", reply)
+                        else:
+                            yield format_sse(event, data)
+                    yield format_sse("done", {"ok": True})
+                except Exception as exc:
+                    yield format_sse("error", {"message": str(exc)})
+                    yield format_sse("done", {"ok": False})
+
+            return StreamingResponse(
+                diagnosis_events(), media_type="text/event-stream"
+            )
 
-        # Translate back to user's preferred language if needed
-        try:
-            needs_translation = user_lang != "en"
-        except NameError:
-            needs_translation = False
-        if needs_translation and assistant_text:
-            try:
-                assistant_text = translation_service.translate_from_english(
-                    assistant_text, user_lang
-                )
-            except Exception:
-                assistant_text = translation_fallback_service.translate_from_english(
-                    assistant_text, user_lang
-                )
-        chat_session_manager.add_message(
-            session_id, sender="llm", message=assistant_text
+        result = await diagnosis_flow(
+            image_data,
+            disconnected=request.is_disconnected,
+            scope=scope,
+            prepared=prepared,
         )
-
-        raw_results = result.get("raw_results", {})
-        kindwise = raw_results.get("kindwise", {})
-        diseases = kindwise.get("diseases", [])
-        crops = kindwise.get("crops", [])
-        similar_images = {
-            "diseases": [
-                {
-                    "name": d.get("name"),
-                    "similar_images": d.get("similar_images", [])[:6],
-                }
-                for d in diseases
-                if d.get("similar_images")
-            ][:3],
-            "crops": [
-                {
-                    "name": c.get("name"),
-                    "similar_images": c.get("similar_images", [])[:6],
-                }
-                for c in crops
-                if c.get("similar_images")
-            ][:3],
-        }
-
-        return {
-            "action": "diagnose_crop",
-            "response": assistant_text,
-            "structured_insight": structured,
-            "similar_images": similar_images,
-        }
+        return await finish_diagnosis_reply(session_id, result, user_lang)
 
     # General answer when no image is provided
     # LLM-based intent detection
-    intent = detect_intent(message_for_llm or "")
+    intent = await detect_intent(message_for_llm or "")
     if intent == "crop_recommendation":
         coords = parse_lat_lon_from_location(current_user.location)
         if not coords:
@@ -494,7 +572,13 @@ Farmer Profile:
         lat, lon = coords
 
         try:
-            reco = await recommend_crops_flow(lat, lon, past_days=30, forecast_days=14)
+            reco = await recommend_crops_flow(
+                lat,
+                lon,
+                past_days=30,
+                forecast_days=14,
+                disconnected=request.is_disconnected,
+            )
             print("reco", reco)
             assistant_text = (
                 reco.get("recommendation")
@@ -518,31 +602,65 @@ Farmer Profile:
         chat_session_manager.add_message(
             session_id, sender="llm", message=assistant_text
         )
+        conversation_summarizer.schedule(session_id)
         return {"response": assistant_text}
 
-    prompt = f"""You are an agricultural assistant helping farmers.
-Reply policy:
-- Be concise by default.
-- If the user asks for diagnosis or mentions disease/symptoms, instruct them briefly to attach or take a clear photo of the affected plant using the camera button in the chat, then wait for the image.
-- If the question is vague, ask one brief clarifying question.
-- Use simple, direct language suited for farmers.
-
-{farmer_info}
+    prompt = build_chat_prompt(
+        current_user,
+        session,
+        message_for_llm,
+        call_site="send_message",
+    )
 
-Conversation history:
-{messages_formatted}
+    if stream:
 
-User message:
-{message_for_llm}
+        async def event_generator():
+            # Tokens are forwarded as they arrive. For non-English users, text is
+            # buffered and translated one finished sentence at a time.
+            chunks = []
+            pending = ""
+            failed = False
+            try:
+                async for chunk in llm_service.stream_message_async(
+                    prompt, route="chat", temperature=0.2, max_output_tokens=280
+                ):
+                    chunks.append(chunk)
+                    if not needs_translation:
+                        yield format_sse("token", {"text": chunk})
+                        continue
+                    pending += chunk
+                    sentences, pending = split_complete_sentences(pending)
+                    for sentence in sentences:
+                        translated = await translate_from_english_async(
+                            sentence, user_lang
+                        )
+                        yield format_sse("token", {"text": translated + " "})
+                if needs_translation and pending.strip():
+                    translated = await translate_from_english_async(pending, user_lang)
+                    yield format_sse("token", {"text": translated})
+            except Exception as exc:
+                failed = True
+                yield format_sse("error", {"message": str(exc)})
+
+            # A reply cut off by an error is not stored as if it were complete.
+            # Like record_llm_reply, the English text is stored uncompacted:
+            # auto_compact_text only shapes what is returned, and streamed tokens
+            # have already reached the client.
+            llm_text_full = "".join(chunks)
+            if llm_text_full and not failed:
+                await asyncio.to_thread(
+                    chat_session_manager.add_message, session_id, "llm", llm_text_full
+                )
+                conversation_summarizer.schedule(session_id)
+            yield format_sse("done", {"ok": bool(llm_text_full) and not failed})
 
-Provide a brief, helpful answer tailored to the farmer's context."""
+        return StreamingResponse(event_generator(), media_type="text/event-stream")
 
-    llm_response = llm_service.send_message(
-        prompt, temperature=0.2, max_output_tokens=280
+    llm_response = await llm_service.send_message_async(
+        prompt, route="chat", temperature=0.2, max_output_tokens=280
     )
-    llm_text = llm_response.get("response", "")
+    llm_text = record_llm_reply(session_id, llm_response)
 
-    chat_session_manager.add_message(session_id, sender="llm", message=llm_text)
     # Translate LLM response back if needed
     if needs_translation and llm_text:
         try:
@@ -598,44 +716,18 @@ async def send_voice_message(
         req.session_id, sender="user", message=message_for_llm
     )
 
-    messages_formatted = "\n".join(
-        [f"{m.sender}: {m.message}" for m in session.messages[-10:]]
+    prompt = build_chat_prompt(
+        current_user,
+        session,
+        message_for_llm,
+        policy=VOICE_REPLY_POLICY,
+        call_site="send_voice_message",
     )
 
-    # Get farmer's personalized information
-    farmer_info = f"""
-Farmer Profile:
-- Name: {current_user.name}
-- Location: {clean_location_for_display(current_user.location)}
-- Experience: {current_user.years_experience} years
-- User Type: {current_user.user_type}
-- Main Goal: {current_user.main_goal}
-- Preferred Language: {current_user.preferred_language}
-- Crops Grown: {current_user.crops_grown}
-"""
-
-    prompt = f"""You are an agricultural assistant helping farmers.
-Reply policy:
-- Be concise by default (1–3 sentences). Avoid small talk and generic disclaimers.
-- If the question is vague, ask one brief clarifying question.
-- Use simple, direct language suited for farmers.
-
-{farmer_info}
-
-Conversation history:
-{messages_formatted}
-
-User message:
-{message_for_llm}
-
-Provide a brief, helpful answer tailored to the farmer's context."""
-
-    llm_response = llm_service.send_message(
-        prompt, temperature=0.2, max_output_tokens=280
+    llm_response = await llm_service.send_message_async(
+        prompt, route="chat", temperature=0.2, max_output_tokens=280
     )
-    llm_text = llm_response.get("response", "")
-
-    chat_session_manager.add_message(req.session_id, sender="llm", message=llm_text)
+    llm_text = record_llm_reply(req.session_id, llm_response)
 
     # Translate LLM response back if needed
     if needs_translation and llm_text:
@@ -679,12 +771,7 @@ async def send_audio_message(
         raise HTTPException(status_code=400, detail="File must be an audio file")
 
     # Read audio content
-    try:
-        audio_content = await audio_file.read()
-    except Exception as e:
-        raise HTTPException(
-            status_code=400, detail=f"Error reading audio file: {str(e)}"
-        )
+    audio_content = await read_upload(audio_file, "chat.send_audio_message", "audio")
 
     # Get chat session
     session = chat_session_manager.get_session(session_id)
@@ -738,50 +825,21 @@ async def send_audio_message(
     # Add user message to chat session
     chat_session_manager.add_message(session_id, sender="user", message=message_for_llm)
 
-    # Format conversation history
-    messages_formatted = "\n".join(
-        [f"{m.sender}: {m.message}" for m in session.messages[-10:]]
-    )
-
-    # Get farmer's personalized information
-    farmer_info = f"""
-Farmer Profile:
-- Name: {current_user.name}
-- Location: {clean_location_for_display(current_user.location)}
-- Experience: {current_user.years_experience} years
-- User Type: {current_user.user_type}
-- Main Goal: {current_user.main_goal}
-- Preferred Language: {current_user.preferred_language}
-- Crops Grown: {current_user.crops_grown}
-"""
-
     # Use the same prompt as text messages
-    prompt = f"""You are an agricultural assistant helping farmers.
-Reply policy:
-- Be concise by default.
-- If the user asks for diagnosis or mentions disease/symptoms, instruct them briefly to attach or take a clear photo of the affected plant using the camera button in the chat, then wait for the image.
-- If the question is vague, ask one brief clarifying question.
-- Use simple, direct language suited for farmers.You are an agricultural assistant helping farmers.
-Reply policy:
-
-{farmer_info}
-
-Conversation history:
-{messages_formatted}
-
-User message:
-{message_for_llm}
-
-Provide a brief, helpful answer tailored to the farmer's context."""
+    prompt = build_chat_prompt(
+        current_user,
+        session,
+        message_for_llm,
+        call_site="send_audio_message",
+    )
 
     # Get LLM response
-    llm_response = llm_service.send_message(
-        prompt, temperature=0.2, max_output_tokens=280
+    llm_response = await llm_service.send_message_async(
+        prompt, route="chat", temperature=0.2, max_output_tokens=280
     )
-    llm_text = llm_response.get("response", "")
 
     # Add LLM response to chat session
-    chat_session_manager.add_message(session_id, sender="llm", message=llm_text)
+    llm_text = record_llm_reply(session_id, llm_response)
 
     # Translate LLM response back if needed
     if needs_translation and llm_text:
@@ -822,12 +880,7 @@ async def voice_conversation(
         raise HTTPException(status_code=400, detail="File must be an audio file")
 
     # Read audio content
-    try:
-        audio_content = await audio_file.read()
-    except Exception as e:
-        raise HTTPException(
-            status_code=400, detail=f"Error reading audio file: {str(e)}"
-        )
+    audio_content = await read_upload(audio_file, "chat.voice_conversation", "audio")
 
     # Get chat session
     session = chat_session_manager.get_session(session_id)
@@ -871,7 +924,7 @@ async def voice_conversation(
         def event_generator():
             try:
                 # Initial language/transcript event
-                yield _sse(
+                yield format_sse(
                     "detected_language",
                     {
                         "detected_language": detected_language,
@@ -899,40 +952,19 @@ async def voice_conversation(
                 chat_session_manager.add_message(
                     session_id, sender="user", message=message_for_llm_local
                 )
-                messages_formatted_local = "\n".join(
-                    [f"{m.sender}: {m.message}" for m in session.messages[-10:]]
+                prompt_local = build_chat_prompt(
+                    current_user,
+                    session,
+                    message_for_llm_local,
+                    closing=PERSONALIZED_ANSWER_CLOSING,
+                    user_label="current user message",
+                    call_site="voice_conversation_stream",
                 )
-                farmer_info_local = f"""
-Farmer Profile:
-- Name: {current_user.name}
-- Location: {clean_location_for_display(current_user.location)}
-- Experience: {current_user.years_experience} years
-- User Type: {current_user.user_type}
-- Main Goal: {current_user.main_goal}
-- Preferred Language: {current_user.preferred_language}
-- Crops Grown: {current_user.crops_grown}
-"""
-                prompt_local = f"""You are an agricultural assistant helping farmers.
-Reply policy:
-- Be concise by default.
-- If the user asks for diagnosis or mentions disease/symptoms, instruct them briefly to attach or take a clear photo of the affected plant using the camera button in the chat, then wait for the image.
-- If the question is vague, ask one brief clarifying question.
-- Use simple, direct language suited for farmers.
-
-{farmer_info_local}
 
-Conversation history:
-{messages_formatted_local}
-
-current user message:
-{message_for_llm_local}
-
-Respond as the agricultural assistant, taking into account the farmer's specific profile, location, experience level, and crops. Provide personalized advice that considers their farming context."""
-
-                llm_response_local = llm_service.send_message(prompt_local)
-                llm_text_local = llm_response_local.get("response", "")
-                chat_session_manager.add_message(
-                    session_id, sender="llm", message=llm_text_local
+                llm_response_local = llm_service.send_message(prompt_local, route="voice")
+                # Summary update runs as the response's background task
+                llm_text_local = record_llm_reply(
+                    session_id, llm_response_local, summarize=False
                 )
 
                 if needs_translation_local and llm_text_local:
@@ -948,14 +980,14 @@ Respond as the agricultural assistant, taking into account the farmer's specific
                         )
 
                 llm_text_local = auto_compact_text(llm_text_local)
-                yield _sse("response_text", {"response": llm_text_local})
+                yield format_sse("response_text", {"response": llm_text_local})
 
                 cleaned_text_local = clean_text_for_tts(llm_text_local)
                 tts_result_local = tts_service.text_to_speech(
                     cleaned_text_local, user_lang
                 )
 
-                yield _sse(
+                yield format_sse(
                     "audio",
                     {
                         "audio_base64": tts_result_local.get("audio_base64"),
@@ -965,11 +997,17 @@ Respond as the agricultural assistant, taking into account the farmer's specific
                     },
                 )
 
-                yield _sse("done", {"ok": True})
+                yield format_sse("done", {"ok": True})
             except Exception as exc:
-                yield _sse("error", {"message": str(exc)})
-
-        return StreamingResponse(event_generator(), media_type="text/event-stream")
+                yield format_sse("error", {"message": str(exc)})
+
+        # The generator runs in the threadpool, so the summary update is attached
+        # as a background task that runs on the event loop after streaming ends.
+        return StreamingResponse(
+            event_generator(),
+            media_type="text/event-stream",
+            background=BackgroundTask(conversation_summarizer.update, session_id),
+        )
 
     # Non-streaming path (original behavior)
     message_for_llm = transcribed_text
@@ -983,39 +1021,16 @@ Respond as the agricultural assistant, taking into account the farmer's specific
             )
 
     chat_session_manager.add_message(session_id, sender="user", message=message_for_llm)
-    messages_formatted = "\n".join(
-        [f"{m.sender}: {m.message}" for m in session.messages[-10:]]
+    prompt = build_chat_prompt(
+        current_user,
+        session,
+        message_for_llm,
+        closing=PERSONALIZED_ANSWER_CLOSING,
+        user_label="current user message",
+        call_site="voice_conversation",
     )
-    farmer_info = f"""
-Farmer Profile:
-- Name: {current_user.name}
-- Location: {clean_location_for_display(current_user.location)}
-- Experience: {current_user.years_experience} years
-- User Type: {current_user.user_type}
-- Main Goal: {current_user.main_goal}
-- Preferred Language: {current_user.preferred_language}
-- Crops Grown: {current_user.crops_grown}
-"""
-    prompt = f"""You are an agricultural assistant helping farmers.
-Reply policy:
-- Be concise by default.
-- If the user asks for diagnosis or mentions disease/symptoms, instruct them briefly to attach or take a clear photo of the affected plant using the camera button in the chat, then wait for the image.
-- If the question is vague, ask one brief clarifying question.
-- Use simple, direct language suited for farmers.You are an agricultural assistant helping farmers.
-Reply policy:
-
-{farmer_info}
-
-Conversation history:
-{messages_formatted}
-
-current user message:
-{message_for_llm}
-
-Respond as the agricultural assistant, taking into account the farmer's specific profile, location, experience level, and crops. Provide personalized advice that considers their farming context."""
-    llm_response = llm_service.send_message(prompt)
-    llm_text = llm_response.get("response", "")
-    chat_session_manager.add_message(session_id, sender="llm", message=llm_text)
+    llm_response = await llm_service.send_message_async(prompt, route="voice")
+    llm_text = record_llm_reply(session_id, llm_response)
     if needs_translation and llm_text:
         try:
             llm_text = translation_service.translate_from_english(llm_text, user_lang)
@@ -1,17 +1,139 @@
-from fastapi import APIRouter, UploadFile, File, Form, Depends
-import tempfile
-from src.flows import diagnosis_flow
+from fastapi import APIRouter, UploadFile, File, Form, Depends, Query, Request, HTTPException
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from src.flows import batch_diagnosis_flow_stream, diagnosis_flow, diagnosis_flow_stream
 from src.auth.auth_utils import get_current_user
+from src.routes.sse import format_sse
+from src.routes.uploads import prepare_image_upload, read_upload
+from src.services.near_duplicates import near_duplicate_scope
+from src.services.similar_images import (
+    SIMILAR_IMAGES_TTL,
+    THUMBNAIL_TTL,
+    similar_image_store,
+    thumbnail_etag,
+)
+from typing import List, Optional
+import os
 
 router = APIRouter(prefix="/api/crop-health", tags=["Crop Health"])
 
+BATCH_DIAGNOSIS_MAX_IMAGES = int(os.getenv("BATCH_DIAGNOSIS_MAX_IMAGES", "50"))
 
 
-@router.post("/diagnose", dependencies=[Depends(get_current_user)])
-async def analyze_crop_health(image: UploadFile = File(...)):
-    with tempfile.NamedTemporaryFile(delete=False) as tmp:
-        tmp.write(await image.read())
-        tmp_path = tmp.name
 
-    result = await diagnosis_flow(tmp_path)
-    return result
\ No newline at end of file
+@router.post("/diagnose")
+async def analyze_crop_health(
+    request: Request,
+    image: UploadFile = File(...),
+    stream: bool = Query(
+        False,
+        description="If true, stream SSE events: provider (one per API), insight, done",
+    ),
+    reuse: bool = Query(
+        True,
+        description="If false, always run a new diagnosis instead of reusing the one of a near-identical recent photo",
+    ),
+    crop: Optional[str] = Query(
+        None,
+        description="Crop in the photo, if known; a diagnosis is only reused for a photo of the same crop",
+    ),
+    current_user=Depends(get_current_user),
+):
+    # The upload stays in memory and is decoded once; the quality gate, the
+    # near-duplicate hash and each provider's rendition all use that image
+    image_data = await read_upload(image, "crop_health.diagnose", "image")
+    prepared = await prepare_image_upload(image_data)
+    scope = (
+        near_duplicate_scope(current_user.user_id, current_user.location, crop=crop)
+        if reuse
+        else None
+    )
+
+    if stream:
+
+        async def event_generator():
+            try:
+                async for event, data in diagnosis_flow_stream(
+                    image_data, scope, prepared
+                ):
+                    yield format_sse(event, data)
+                yield format_sse("done", {"ok": True})
+            except Exception as exc:
+                yield format_sse("error", {"message": str(exc)})
+                yield format_sse("done", {"ok": False})
+
+        return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+    result = await diagnosis_flow(
+        image_data,
+        disconnected=request.is_disconnected,
+        scope=scope,
+        prepared=prepared,
+    )
+    return result
+
+
+@router.post("/diagnose-batch", dependencies=[Depends(get_current_user)])
+async def analyze_crop_health_batch(
+    images: List[UploadFile] = File(...),
+):
+    """
+    Diagnose all photos from a field-scouting session in one request.
+    Streams SSE events: image (one per uploaded photo, in completion order),
+    summary (one field-level insight), done.
+    """
+    if len(images) > BATCH_DIAGNOSIS_MAX_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BATCH_DIAGNOSIS_MAX_IMAGES} images per batch",
+        )
+    image_data = [
+        await read_upload(image, "crop_health.diagnose_batch", "image")
+        for image in images
+    ]
+
+    async def event_generator():
+        try:
+            async for event, data in batch_diagnosis_flow_stream(image_data):
+                yield format_sse(event, data)
+            yield format_sse("done", {"ok": True})
+        except Exception as exc:
+            yield format_sse("error", {"message": str(exc)})
+            yield format_sse("done", {"ok": False})
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
+@router.get("/similar-images/{diagnosis_id}", dependencies=[Depends(get_current_user)])
+async def get_similar_images(diagnosis_id: str):
+    """
+    Similar-image gallery of a diagnosis, in the shape diagnosis responses used to
+    carry inline. Each picture's url is a thumbnail on this API.
+    """
+    gallery = similar_image_store.gallery(diagnosis_id)
+    if gallery is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired diagnosis")
+    return JSONResponse(
+        gallery, headers={"Cache-Control": f"private, max-age={SIMILAR_IMAGES_TTL}"}
+    )
+
+
+# No auth dependency: <img> tags can't send the bearer token, and the diagnosis
+# ID is an unguessable capability that expires with the gallery.
+@router.get("/similar-images/{diagnosis_id}/{index}")
+async def get_similar_image_thumbnail(request: Request, diagnosis_id: str, index: int):
+    """Server-side resized, cached JPEG thumbnail of one similar image."""
+    try:
+        thumbnail = await similar_image_store.thumbnail(diagnosis_id, index)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Image unavailable: {e}")
+    if thumbnail is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired image")
+
+    etag = thumbnail_etag(thumbnail)
+    headers = {
+        "Cache-Control": f"public, max-age={THUMBNAIL_TTL}, immutable",
+        "ETag": etag,
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=thumbnail, media_type="image/jpeg", headers=headers)
@@ -0,0 +1,79 @@
+from fastapi import APIRouter, Depends
+from src.auth.auth_utils import get_current_user
+from src.routes.uploads import upload_metrics
+from src.services.crop_health_cache import crop_health_cache
+from src.services.fanout import fanout_stats
+from src.services.image_quality import quality_gate_stats
+from src.services.field_context import field_context_service
+from src.services.llm_cache import llm_response_cache
+from src.services.llm_service import llm_service
+from src.services.near_duplicates import near_duplicate_index
+from src.services.pipeline import pipeline_metrics
+from src.services.provider_scheduler import provider_scheduler
+from src.services.rate_limiter import limiter_stats
+from src.services.recommendation_cache import recommendation_cache
+from src.services.similar_images import similar_image_store
+
+router = APIRouter(prefix="/api/metrics", tags=["Metrics"])
+
+
+@router.get("/llm", dependencies=[Depends(get_current_user)])
+def get_llm_metrics():
+    """
+    Runtime counters for the LLM layer of this worker process.
+    """
+    return {
+        "cache": llm_response_cache.stats(),
+        "coalescing": llm_service.inflight.stats(),
+        "routes": llm_service.router.stats(),
+        "rate_limiters": limiter_stats(),
+        "context_cache": llm_service.context_cache.stats(),
+    }
+
+
+@router.get("/flows", dependencies=[Depends(get_current_user)])
+def get_flow_metrics():
+    """
+    Shared field context, recommendation cache and flow pipeline counters.
+    """
+    return {
+        "field_context": field_context_service.stats(),
+        "recommendations": recommendation_cache.stats(),
+        "pipelines": pipeline_metrics.stats(),
+    }
+
+
+@router.get("/crop-health", dependencies=[Depends(get_current_user)])
+def get_crop_health_metrics():
+    """
+    Crop-health provider calls, image gating and diagnosis reuse counters.
+    """
+    return {
+        "provider_results": crop_health_cache.stats(),
+        "provider_fanout": fanout_stats(),
+        "provider_scheduler": provider_scheduler.stats(),
+        "image_quality": quality_gate_stats(),
+        "similar_images": similar_image_store.stats(),
+        "near_duplicates": near_duplicate_index.stats(),
+    }
+
+
+@router.get("/uploads", dependencies=[Depends(get_current_user)])
+def get_upload_metrics():
+    """
+    Upload sizes and rejections per endpoint.
+    """
+    return upload_metrics.stats()
+
+
+@router.get("", dependencies=[Depends(get_current_user)])
+def get_metrics():
+    """
+    All runtime counters of this worker process, keyed by subsystem.
+    """
+    return {
+        "llm": get_llm_metrics(),
+        "flows": get_flow_metrics(),
+        "crop_health": get_crop_health_metrics(),
+        "uploads": get_upload_metrics(),
+    }
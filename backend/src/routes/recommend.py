@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Query, HTTPException, Depends
+from fastapi import APIRouter, Query, HTTPException, Depends, Request
 from src.flows import recommend_fertilizer_flow, recommend_crops_flow
 from src.auth.auth_utils import get_current_user
 
@@ -7,6 +7,7 @@ router = APIRouter(prefix="/api/recommend", tags=["Recommendation_Flow"])
 
 @router.get("/crops")
 async def recommend_crops(
+    request: Request,
     lat: float = Query(..., description="Latitude in decimal degrees"),
     lon: float = Query(..., description="Longitude in decimal degrees"),
     depth: str = Query("0-20", description="Soil depth range (e.g., '0-20')"),
@@ -19,7 +20,13 @@ async def recommend_crops(
 ):
     try:
         result = await recommend_crops_flow(
-            lat, lon, depth, top_k, past_days, forecast_days
+            lat,
+            lon,
+            depth,
+            top_k,
+            past_days,
+            forecast_days,
+            disconnected=request.is_disconnected,
         )
         return {"status": "success", **result}
     except Exception as e:
@@ -28,6 +35,7 @@ async def recommend_crops(
 
 @router.get("/fertilizer")
 async def recommend_fertilizer(
+    request: Request,
     lat: float = Query(..., description="Latitude in decimal degrees"),
     lon: float = Query(..., description="Longitude in decimal degrees"),
     target_crop: str = Query(..., description="The crop type (eg. maize)"),
@@ -57,6 +65,7 @@ async def recommend_fertilizer(
             forecast_days,
             previous_crop,
             growth_stage,
+            disconnected=request.is_disconnected,
         )
         return {"status": "success", **result}
     except Exception as e:
@@ -0,0 +1,6 @@
+import json
+
+
+def format_sse(event: str, data: dict) -> bytes:
+    """Format a Server-Sent Event line."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
@@ -0,0 +1,180 @@
+import os
+import time
+import threading
+from typing import Any, Dict, Optional
+from fastapi import HTTPException, UploadFile
+from starlette.responses import JSONResponse
+from src.flows import prepare_upload
+from src.services.image_pipeline import ImageDecodeError, PreparedImage
+from src.services.latency import LatencyHistogram
+
+
+MB = 1024 * 1024
+
+# Per-file limits, enforced chunk by chunk while the upload is read
+UPLOAD_MAX_BYTES = {
+    "image": int(os.getenv("IMAGE_UPLOAD_MAX_BYTES", str(10 * MB))),
+    "audio": int(os.getenv("AUDIO_UPLOAD_MAX_BYTES", str(10 * MB))),
+}
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(64 * 1024)))
+# Whole multipart body limit; leaves room for form fields and part headers
+UPLOAD_MAX_REQUEST_BYTES = int(
+    os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(max(UPLOAD_MAX_BYTES.values()) + MB))
+)
+# Batch endpoints carry many files in one body
+BATCH_UPLOAD_MAX_REQUEST_BYTES = int(
+    os.getenv("BATCH_UPLOAD_MAX_REQUEST_BYTES", str(200 * MB))
+)
+
+
+class UploadMetrics:
+    """Bytes received, read time and rejections per upload endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, Dict[str, Any]] = {}
+        self._latency: Dict[str, LatencyHistogram] = {}
+        self.rejected_bodies = 0
+
+    def _endpoint(self, endpoint: str) -> Dict[str, Any]:
+        if endpoint not in self._endpoints:
+            self._endpoints[endpoint] = {
+                "uploads": 0,
+                "rejected": 0,
+                "bytes_total": 0,
+                "bytes_max": 0,
+            }
+            self._latency[endpoint] = LatencyHistogram()
+        return self._endpoints[endpoint]
+
+    def observe(self, endpoint: str, size: int, ms: float) -> None:
+        with self._lock:
+            counters = self._endpoint(endpoint)
+            counters["uploads"] += 1
+            counters["bytes_total"] += size
+            counters["bytes_max"] = max(counters["bytes_max"], size)
+        self._latency[endpoint].observe(ms)
+
+    def reject(self, endpoint: str) -> None:
+        with self._lock:
+            self._endpoint(endpoint)["rejected"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {
+                name: {**counters, "read": self._latency[name].stats()}
+                for name, counters in self._endpoints.items()
+            }
+        return {"rejected_bodies": self.rejected_bodies, "endpoints": endpoints}
+
+
+upload_metrics = UploadMetrics()
+
+
+def _too_large(limit: int) -> HTTPException:
+    return HTTPException(
+        status_code=413, detail=f"Upload exceeds the {limit // MB} MB limit"
+    )
+
+
+async def read_upload(upload: UploadFile, endpoint: str, kind: str) -> bytes:
+    """
+    Read an uploaded file in chunks, stopping as soon as it exceeds the limit for
+    its `kind`, and close it before returning so its spool file is removed
+    right away rather than at the end of the request.
+    Raises HTTPException 413 when the file is too large and 400 when it is empty
+    or cannot be read.
+    """
+    limit = UPLOAD_MAX_BYTES[kind]
+    started = time.perf_counter()
+    chunks = []
+    size = 0
+    try:
+        if upload.size is not None and upload.size > limit:
+            raise _too_large(limit)
+        while chunk := await upload.read(UPLOAD_CHUNK_BYTES):
+            size += len(chunk)
+            if size > limit:
+                raise _too_large(limit)
+            chunks.append(chunk)
+    except HTTPException:
+        upload_metrics.reject(endpoint)
+        raise
+    except Exception as e:
+        upload_metrics.reject(endpoint)
+        raise HTTPException(status_code=400, detail=f"Error reading {kind}: {e}")
+    finally:
+        await upload.close()
+
+    if not size:
+        upload_metrics.reject(endpoint)
+        raise HTTPException(status_code=400, detail=f"Empty {kind} upload")
+    upload_metrics.observe(endpoint, size, (time.perf_counter() - started) * 1000)
+    return chunks[0] if len(chunks) == 1 else b"".join(chunks)
+
+
+async def prepare_image_upload(data: bytes) -> Optional[PreparedImage]:
+    """
+    Decode an image upload once, before the diagnosis flow (and any SSE stream)
+    starts, so an unreadable file is a 400 rather than a failed diagnosis.
+    Returns None when the quality gate will answer it with a retake hint instead.
+    """
+    try:
+        return await prepare_upload(data)
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject multipart bodies larger than `max_bytes` (or the `path_limits` entry
+    for the request path) while they are being received.
+
+    A declared Content-Length over the limit is answered with 413 before any of the
+    body is read; chunked bodies are counted as they arrive and the request fails
+    with 413 as soon as the limit is crossed, so the multipart parser never spools
+    more than the limit to memory or disk.
+    """
+
+    def __init__(
+        self,
+        app,
+        max_bytes: int = UPLOAD_MAX_REQUEST_BYTES,
+        path_limits: Optional[Dict[str, int]] = None,
+    ):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            return await self.app(scope, receive, send)
+
+        max_bytes = self.path_limits.get(scope["path"], self.max_bytes)
+        length = headers.get(b"content-length")
+        if length and length.isdigit() and int(length) > max_bytes:
+            upload_metrics.rejected_bodies += 1
+            response = JSONResponse(
+                {"detail": f"Request body exceeds the {max_bytes // MB} MB limit"},
+                status_code=413,
+            )
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    upload_metrics.rejected_bodies += 1
+                    # Raised inside form parsing; FastAPI re-raises HTTPException
+                    # as is, so the client gets a 413
+                    raise _too_large(max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -380,6 +380,33 @@ async def get_calendar_weather(
         )
 
 
+# Fixed part of the AI task prompt. Far below every model's minimum for context
+# caching, so it is sent inline ahead of the day's data.
+AI_TASK_INSTRUCTIONS = """You are an expert agricultural advisor. Generate personalized farming task recommendations for a farmer based on the date, location, weather conditions and farmer profile given below.
+
+Generate 3-5 specific, actionable farming tasks for this date. Consider:
+1. Weather conditions and their impact on farming activities
+2. The farmer's specific crops and experience level
+3. Seasonal timing and best practices
+4. Preventive measures based on weather forecasts
+
+Format your response as a JSON array with the following structure:
+[
+  {
+    "task": "Task description",
+    "time": "Recommended time (e.g., '8:00 AM')",
+    "priority": "high/medium/low",
+    "field": "Field name or 'All Fields'",
+    "category": "irrigation/fertilization/pest-control/monitoring/harvesting/maintenance",
+    "description": "Detailed explanation of why this task is recommended",
+    "estimated_duration": "Estimated time (e.g., '2 hours')",
+    "ai_reasoning": "AI's reasoning for this recommendation"
+  }
+]
+
+Focus on practical, actionable advice that a farmer can implement immediately."""
+
+
 @router.get("/ai-tasks")
 async def get_ai_task_recommendations(
     lat: float = Query(..., description="Latitude in decimal degrees"),
@@ -487,9 +514,10 @@ async def get_ai_task_recommendations(
             },
         }
 
-        # Create LLM prompt for task recommendations
-        prompt = f"""
-You are an expert agricultural advisor. Generate personalized farming task recommendations for a farmer based on the following information:
+        # Create LLM prompt for task recommendations: the fixed instructions,
+        # then the day's data
+        prompt = f"""{AI_TASK_INSTRUCTIONS}
+
 
 **Date:** {date}
 **Location:** {lat}, {lon}
@@ -503,32 +531,10 @@ You are an expert agricultural advisor. Generate personalized farming task recom
 - Experience: {user_experience} years
 - Type: {user_type}
 - Goal: {user_goal}
-
-Generate 3-5 specific, actionable farming tasks for this date. Consider:
-1. Weather conditions and their impact on farming activities
-2. The farmer's specific crops and experience level
-3. Seasonal timing and best practices
-4. Preventive measures based on weather forecasts
-
-Format your response as a JSON array with the following structure:
-[
-  {{
-    "task": "Task description",
-    "time": "Recommended time (e.g., '8:00 AM')",
-    "priority": "high/medium/low",
-    "field": "Field name or 'All Fields'",
-    "category": "irrigation/fertilization/pest-control/monitoring/harvesting/maintenance",
-    "description": "Detailed explanation of why this task is recommended",
-    "estimated_duration": "Estimated time (e.g., '2 hours')",
-    "ai_reasoning": "AI's reasoning for this recommendation"
-  }}
-]
-
-Focus on practical, actionable advice that a farmer can implement immediately.
 """
 
         # Call LLM for task recommendations
-        llm_result = llm_service.send_message(prompt)
+        llm_result = await llm_service.send_message_async(prompt, route="tasks")
         llm_response = llm_result.get("response", "")
 
         if not llm_response:
@@ -4,7 +4,7 @@ from typing import Dict, Optional, List
 from src.models.chat import ChatSession, ChatMessage
 from sqlalchemy.orm import Session
 from src.db import SessionLocal
-from src.db.chat_models import ChatSessionDB, ChatMessageDB
+from src.db.chat_models import ChatSessionDB, ChatMessageDB, ChatSessionSummaryDB
 
 
 class ChatSessionManager:
@@ -37,16 +37,35 @@ class ChatSessionManager:
             ChatMessage(sender=m.sender, message=m.message, timestamp=m.timestamp)
             for m in db_session.messages
         ]
+        db_summary = db.query(ChatSessionSummaryDB).filter_by(session_id=session_id).first()
         session = ChatSession(
             session_id=db_session.session_id,
             messages=messages,
             created_at=db_session.created_at,
             updated_at=db_session.updated_at,
             user_id=db_session.user_id,
+            summary=db_summary.summary if db_summary else None,
+            summarized_count=(db_summary.summarized_count or 0) if db_summary else 0,
         )
         db.close()
         return session
 
+    def save_summary(self, session_id: str, summary: str, summarized_count: int) -> None:
+        db: Session = SessionLocal()
+        try:
+            db_summary = (
+                db.query(ChatSessionSummaryDB).filter_by(session_id=session_id).first()
+            )
+            if not db_summary:
+                db_summary = ChatSessionSummaryDB(session_id=session_id)
+                db.add(db_summary)
+            db_summary.summary = summary
+            db_summary.summarized_count = summarized_count
+            db_summary.updated_at = datetime.utcnow()
+            db.commit()
+        finally:
+            db.close()
+
     def add_message(
         self, session_id: str, sender: str, message: str
     ) -> Optional[ChatSession]:
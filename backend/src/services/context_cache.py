@@ -0,0 +1,174 @@
+import os
+import time
+import asyncio
+from typing import Any, Dict, Optional, Tuple
+from google import genai
+from src.services.prompt_builder import estimate_tokens
+
+
+CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE_ENABLED", "true").lower() in ("1", "true")
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+# Gemini rejects cached content below a per-model minimum size; shorter prefixes
+# are sent inline without attempting a create. Models not listed get the default.
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "4096"))
+CONTEXT_CACHE_MODEL_MIN_TOKENS = {
+    "gemini-2.5-flash": 1024,
+    "gemini-2.5-pro": 4096,
+}
+# After a failed create (e.g. prefix below the model's minimum cacheable size),
+# stay inline for this long before trying again.
+CONTEXT_CACHE_RETRY_SECONDS = int(os.getenv("CONTEXT_CACHE_RETRY_SECONDS", "3600"))
+# Recreate a cache this long before it expires so requests never reference a dead one.
+CONTEXT_CACHE_REFRESH_MARGIN_SECONDS = 120
+
+
+class ContextCacheRegistry:
+    """
+    Static prompt prefixes registered once and sent to Gemini as cached content.
+
+    A prefix is created as a cache per model on first use and then referenced by
+    handle, so its tokens are not resent on every call. When caching is disabled
+    or the create call fails, `handle` returns None and the caller sends the prefix
+    inline. The genai client is passed in per call, so any object exposing
+    `aio.caches.create` (such as a local fake) can stand in for the real API.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = CONTEXT_CACHE_ENABLED,
+        ttl_seconds: int = CONTEXT_CACHE_TTL_SECONDS,
+        retry_seconds: int = CONTEXT_CACHE_RETRY_SECONDS,
+        min_tokens: int = CONTEXT_CACHE_MIN_TOKENS,
+        model_min_tokens: Dict[str, int] = CONTEXT_CACHE_MODEL_MIN_TOKENS,
+    ):
+        self.enabled = enabled
+        self.min_tokens = min_tokens
+        self.model_min_tokens = dict(model_min_tokens)
+        self.ttl_seconds = ttl_seconds
+        self.retry_seconds = retry_seconds
+        self._prefixes: Dict[str, str] = {}
+        # (key, model) -> (cache name or None, monotonic time the entry is valid until)
+        self._handles: Dict[Tuple[str, str], Tuple[Optional[str], float]] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self.created = 0
+        self.failed = 0
+        self.hits = 0
+        self.inline = 0
+
+    def register(self, key: str, text: str) -> str:
+        """
+        Register a static prefix under `key`; returns the key for convenience.
+        Only prefixes that reach some model's minimum are worth registering;
+        shorter instructions belong inline in the caller's prompt.
+        """
+        if self._prefixes.get(key) not in (None, text):
+            # Prefix text changed (e.g. reload); drop handles built from the old text
+            for handle_key in [k for k in self._handles if k[0] == key]:
+                del self._handles[handle_key]
+        self._prefixes[key] = text
+        smallest = min([self.min_tokens, *self.model_min_tokens.values()])
+        if self.enabled and estimate_tokens(text) < smallest:
+            print(
+                f"Context cache: prefix '{key}' (~{estimate_tokens(text)} tokens) is "
+                f"below every model's minimum of {smallest}; it is always sent inline"
+            )
+        return key
+
+    def min_tokens_for(self, model: str) -> int:
+        """Smallest cacheable prefix for `model`, matched on the longest name prefix."""
+        matches = [name for name in self.model_min_tokens if model.startswith(name)]
+        if not matches:
+            return self.min_tokens
+        return self.model_min_tokens[max(matches, key=len)]
+
+    def cacheable(self, key: str, model: str) -> bool:
+        return (
+            self.enabled
+            and key in self._prefixes
+            and estimate_tokens(self._prefixes[key]) >= self.min_tokens_for(model)
+        )
+
+    def prefix(self, key: str) -> str:
+        return self._prefixes[key]
+
+    def inline_prompt(self, key: str, prompt: str) -> str:
+        """The prompt as it would be sent without caching."""
+        return f"{self._prefixes[key]}\n\n{prompt}"
+
+    async def handle(self, client: Any, key: str, model: str) -> Optional[str]:
+        """Return the cached-content name for this prefix and model, creating it if needed."""
+        if not self.cacheable(key, model):
+            self.inline += 1
+            return None
+        handle_key = (key, model)
+        name = self._valid_handle(handle_key)
+        if name is not False:
+            self._count(name)
+            return name
+        lock = self._locks.setdefault(handle_key, asyncio.Lock())
+        async with lock:
+            name = self._valid_handle(handle_key)
+            if name is False:
+                name = await self._create(client, key, model)
+        self._count(name)
+        return name
+
+    def invalidate(self, key: str, model: str) -> None:
+        self._handles.pop((key, model), None)
+
+    def _valid_handle(self, handle_key):
+        entry = self._handles.get(handle_key)
+        if entry is None or entry[1] <= time.monotonic():
+            return False
+        return entry[0]
+
+    def _count(self, name: Optional[str]) -> None:
+        if name:
+            self.hits += 1
+        else:
+            self.inline += 1
+
+    async def _create(self, client: Any, key: str, model: str) -> Optional[str]:
+        handle_key = (key, model)
+        try:
+            cache = await client.aio.caches.create(
+                model=model,
+                config=genai.types.CreateCachedContentConfig(
+                    display_name=f"agri-smart-{key}",
+                    contents=[
+                        genai.types.Content(
+                            role="user",
+                            parts=[genai.types.Part.from_text(text=self._prefixes[key])],
+                        )
+                    ],
+                    ttl=f"{self.ttl_seconds}s",
+                ),
+            )
+            valid_until = (
+                time.monotonic() + self.ttl_seconds - CONTEXT_CACHE_REFRESH_MARGIN_SECONDS
+            )
+            self._handles[handle_key] = (cache.name, valid_until)
+            self.created += 1
+            return cache.name
+        except Exception as e:
+            print(f"Context cache unavailable for '{key}' on {model}: {e}")
+            self._handles[handle_key] = (None, time.monotonic() + self.retry_seconds)
+            self.failed += 1
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "min_tokens": {"default": self.min_tokens, **self.model_min_tokens},
+            "prefix_tokens": {
+                key: estimate_tokens(text) for key, text in sorted(self._prefixes.items())
+            },
+            "active_handles": sum(1 for name, _ in self._handles.values() if name),
+            "created": self.created,
+            "failed": self.failed,
+            "hits": self.hits,
+            "inline": self.inline,
+        }
+
+
+context_cache_registry = ContextCacheRegistry()
@@ -0,0 +1,92 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+from google import genai
+
+
+LLM_SESSION_MAX = int(os.getenv("LLM_SESSION_MAX", "500"))
+LLM_SESSION_MAX_TURNS = int(os.getenv("LLM_SESSION_MAX_TURNS", "6"))
+LLM_SESSION_IDLE_SECONDS = int(os.getenv("LLM_SESSION_IDLE_SECONDS", "1800"))
+
+
+class _Conversation:
+    __slots__ = ("history", "last_used")
+
+    def __init__(self):
+        self.history: List[genai.types.Content] = []
+        self.last_used = time.monotonic()
+
+
+class ConversationStore:
+    """
+    Per-session Gemini conversation history kept in an LRU.
+
+    Each session keeps at most `max_turns` user/model exchanges, sessions idle for
+    longer than `idle_seconds` are dropped, and at most `max_sessions` sessions are
+    held at once, so prompt size and memory stay flat for the life of the process.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = LLM_SESSION_MAX,
+        max_turns: int = LLM_SESSION_MAX_TURNS,
+        idle_seconds: int = LLM_SESSION_IDLE_SECONDS,
+    ):
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.idle_seconds = idle_seconds
+        self._sessions: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_idle(self, now: float) -> None:
+        while self._sessions:
+            session_id, conv = next(iter(self._sessions.items()))
+            if now - conv.last_used <= self.idle_seconds:
+                break
+            del self._sessions[session_id]
+
+    def history(self, session_id: str) -> List[genai.types.Content]:
+        """Return a copy of the stored history for a session (empty if unknown)."""
+        with self._lock:
+            now = time.monotonic()
+            self._evict_idle(now)
+            conv = self._sessions.get(session_id)
+            if conv is None:
+                return []
+            conv.last_used = now
+            self._sessions.move_to_end(session_id)
+            return list(conv.history)
+
+    def append(
+        self,
+        session_id: str,
+        user_content: genai.types.Content,
+        model_content: Optional[genai.types.Content],
+    ) -> None:
+        """Record one exchange and trim the session to its bounded history."""
+        with self._lock:
+            now = time.monotonic()
+            self._evict_idle(now)
+            conv = self._sessions.get(session_id)
+            if conv is None:
+                conv = _Conversation()
+                self._sessions[session_id] = conv
+            conv.history.append(user_content)
+            if model_content is not None:
+                conv.history.append(model_content)
+            max_items = self.max_turns * 2
+            if len(conv.history) > max_items:
+                del conv.history[: len(conv.history) - max_items]
+            conv.last_used = now
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def reset(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
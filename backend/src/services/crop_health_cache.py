@@ -0,0 +1,68 @@
+import os
+import json
+import hashlib
+from typing import Any, Dict, Optional
+from src.services.ttl_cache import TTLCache
+
+
+CROP_HEALTH_CACHE_MAX_ENTRIES = int(os.getenv("CROP_HEALTH_CACHE_MAX_ENTRIES", "3000"))
+
+# TTLs (seconds) per provider. OpenEPI's binary model is a pure function of the
+# image; Kindwise and DeepLeaf also return links and advice that may change.
+CROP_HEALTH_CACHE_TTL = {
+    "openepi": 30 * 86400,
+    "kindwise": 7 * 86400,
+    "deepl": 7 * 86400,
+}
+
+
+def image_digest(image_data: bytes) -> str:
+    return hashlib.sha256(image_data).hexdigest()
+
+
+class CropHealthResultCache:
+    """
+    Content-addressed cache of simplified crop-health provider results.
+
+    Entries are keyed by provider, the SHA-256 of the image bytes and the request
+    parameters that affect the answer (location, language), so a re-uploaded photo
+    skips every provider that already answered for it. Only successful results are
+    stored; a provider that failed is queried again on the next upload.
+    """
+
+    def __init__(self, max_entries: int = CROP_HEALTH_CACHE_MAX_ENTRIES):
+        self.memory = TTLCache(max_entries=max_entries)
+        self.provider_hits: Dict[str, int] = {}
+
+    @staticmethod
+    def make_key(
+        provider: str, digest: str, params: Optional[Dict[str, Any]] = None
+    ) -> str:
+        return f"{provider}:{digest}:{json.dumps(params or {}, sort_keys=True)}"
+
+    def get(
+        self, provider: str, digest: str, params: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        value = self.memory.get(self.make_key(provider, digest, params))
+        if value is not None:
+            self.provider_hits[provider] = self.provider_hits.get(provider, 0) + 1
+        return value
+
+    def set(
+        self,
+        provider: str,
+        digest: str,
+        value: Dict[str, Any],
+        params: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.memory.set(
+            self.make_key(provider, digest, params),
+            value,
+            CROP_HEALTH_CACHE_TTL[provider],
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.memory.stats(), "provider_hits": dict(self.provider_hits)}
+
+
+crop_health_cache = CropHealthResultCache()
@@ -0,0 +1,207 @@
+import os
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Optional,
+    Sequence,
+    Tuple,
+)
+from src.services.latency import CensoredLatencyHistogram
+
+
+# Below this many samples a provider's p95 is not trusted and defaults are used.
+FANOUT_MIN_SAMPLES = int(os.getenv("FANOUT_MIN_SAMPLES", "20"))
+
+FANOUT_MODES = ("all", "first", "quorum", "hedge")
+
+
+@dataclass(frozen=True)
+class FanoutPolicy:
+    """
+    How to fan a request out to interchangeable providers.
+
+    - all: wait for every provider.
+    - first: call all providers, the first good answer wins.
+    - quorum: wait for `quorum` good answers, but only until the budget expires;
+      after that the first good answer is enough.
+    - hedge: call providers one at a time in order, starting the next one when the
+      current one has not answered by its p95 latency (or fails).
+    The quorum budget is `budget` when set, otherwise the slowest p95 among the
+    providers times `budget_factor`, clamped to [min_budget, max_budget].
+    """
+
+    mode: str = "quorum"
+    quorum: int = 2
+    budget: Optional[float] = None
+    min_budget: float = 3.0
+    max_budget: float = 20.0
+    budget_factor: float = 1.5
+    hedge_delay: float = 4.0  # seconds, until a provider has enough samples
+
+
+_latency: Dict[str, CensoredLatencyHistogram] = {}
+_counters: Dict[str, int] = {
+    "runs": 0,
+    "hedges": 0,
+    "budget_expired": 0,
+    "cancelled": 0,
+    "censored_samples": 0,
+}
+
+
+def provider_latency(name: str) -> CensoredLatencyHistogram:
+    if name not in _latency:
+        _latency[name] = CensoredLatencyHistogram()
+    return _latency[name]
+
+
+def p95_seconds(name: str, default: float) -> float:
+    """
+    Recent p95 latency of a provider, or `default` while finished samples are
+    scarce or too much of the tail was cancelled to place the p95.
+    """
+    histogram = provider_latency(name)
+    if len(histogram) < FANOUT_MIN_SAMPLES:
+        return default
+    p95 = histogram.percentile(95)
+    return default if p95 is None else p95 / 1000
+
+
+def quorum_budget(policy: FanoutPolicy, providers: Sequence[str]) -> float:
+    if policy.budget is not None:
+        return policy.budget
+    slowest = max(p95_seconds(name, policy.max_budget) for name in providers)
+    budget = slowest * policy.budget_factor
+    return min(policy.max_budget, max(policy.min_budget, budget))
+
+
+def is_good(result: Any) -> bool:
+    return isinstance(result, dict) and "error" not in result
+
+
+async def fan_out(
+    calls: Dict[str, Callable[[], Awaitable[Any]]],
+    policy: FanoutPolicy,
+    contenders: Sequence[str],
+    background: Sequence[str] = (),
+    already_good: int = 0,
+) -> AsyncIterator[Tuple[str, Any, float]]:
+    """
+    Run `calls` under `policy` and yield (name, result, elapsed ms) as each finishes.
+
+    Only `contenders` count towards the policy; `background` calls run alongside
+    them and are yielded if they finish before the policy is satisfied. Calls still
+    running at that point are cancelled and not yielded. `already_good` counts
+    answers the caller already has (e.g. from a cache); when they satisfy the
+    policy no contender is called and only background calls run. A call that
+    raises is yielded as {"error": ...}. Latencies of all calls feed the
+    per-provider histograms that drive adaptive deadlines. A cancelled call is
+    recorded as censored: its elapsed time is only a lower bound, so it is kept
+    out of the measured samples. Counting it as a finished call, or leaving it
+    out, would both drag the p95, and with it the hedge and quorum deadlines,
+    ever lower.
+    """
+    _counters["runs"] += 1
+    started = time.perf_counter()
+    tasks: Dict[asyncio.Task, str] = {}
+
+    async def timed(name: str):
+        call_started = time.perf_counter()
+        finished = False
+        try:
+            try:
+                result = await calls[name]()
+            except Exception as e:
+                result = {"error": str(e) or type(e).__name__}
+            finished = True
+            return result
+        finally:
+            elapsed_ms = (time.perf_counter() - call_started) * 1000
+            if finished:
+                provider_latency(name).observe(elapsed_ms)
+            else:
+                _counters["censored_samples"] += 1
+                provider_latency(name).observe_censored(elapsed_ms)
+
+    def launch(name: str) -> None:
+        tasks[asyncio.ensure_future(timed(name))] = name
+
+    needed = {
+        "all": len(contenders) + already_good,
+        "first": 1,
+        "quorum": min(policy.quorum, len(contenders) + already_good),
+        "hedge": 1,
+    }.get(policy.mode, len(contenders) + already_good)
+    good = already_good
+    settled_upfront = good >= needed
+
+    queue = [] if settled_upfront else list(contenders)
+    hedge_at = None
+    if policy.mode == "hedge" and queue:
+        first = queue.pop(0)
+        launch(first)
+        hedge_at = time.perf_counter() + p95_seconds(first, policy.hedge_delay)
+    else:
+        for name in queue:
+            launch(name)
+        queue = []
+    for name in background:
+        launch(name)
+
+    deadline = None
+    if policy.mode == "quorum" and not settled_upfront:
+        deadline = started + quorum_budget(policy, contenders)
+
+    try:
+        while tasks or queue:
+            if good >= needed and not settled_upfront and policy.mode != "all":
+                break
+            now = time.perf_counter()
+            wake_at = hedge_at if queue else deadline
+            timeout = max(0.0, wake_at - now) if wake_at is not None else None
+            done = set()
+            if tasks:
+                done, _ = await asyncio.wait(
+                    tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+            if not done:
+                if queue:
+                    # Current provider is slower than its p95 or has failed:
+                    # hedge with the next one
+                    name = queue.pop(0)
+                    launch(name)
+                    _counters["hedges"] += 1
+                    delay = p95_seconds(name, policy.hedge_delay)
+                    hedge_at = time.perf_counter() + delay
+                else:
+                    _counters["budget_expired"] += 1
+                    needed = 1
+                    deadline = None
+                continue
+            for task in done:
+                name = tasks.pop(task)
+                result = task.result()
+                if name in contenders:
+                    if is_good(result):
+                        good += 1
+                    elif queue and policy.mode == "hedge":
+                        # Failed outright: no reason to wait for the hedge delay
+                        hedge_at = time.perf_counter()
+                yield name, result, round((time.perf_counter() - started) * 1000, 1)
+    finally:
+        for task in tasks:
+            task.cancel()
+            _counters["cancelled"] += 1
+
+
+def fanout_stats() -> Dict[str, Any]:
+    return {
+        **_counters,
+        "providers": {name: histogram.stats() for name, histogram in _latency.items()},
+    }
@@ -0,0 +1,91 @@
+import os
+from typing import Any, Dict, Tuple
+from src.ext_apis.soil_api import get_soil_summary_async
+from src.ext_apis.weather_api import fetch_weather_summary, simplify_weather_response
+from src.services.singleflight import SingleFlight
+from src.services.ttl_cache import TTLCache
+
+
+# Coordinates are snapped to this grid (0.01° is roughly 1 km) so nearby requests
+# for the same field share one upstream fetch.
+FIELD_CONTEXT_GRID_DEGREES = float(os.getenv("FIELD_CONTEXT_GRID_DEGREES", "0.01"))
+# Soil properties are effectively static; weather summaries change hourly.
+SOIL_CONTEXT_TTL_SECONDS = int(os.getenv("SOIL_CONTEXT_TTL_SECONDS", str(30 * 86400)))
+WEATHER_CONTEXT_TTL_SECONDS = int(os.getenv("WEATHER_CONTEXT_TTL_SECONDS", "3600"))
+FIELD_CONTEXT_MAX_ENTRIES = int(os.getenv("FIELD_CONTEXT_MAX_ENTRIES", "2048"))
+
+
+def snap_location(
+    lat: float, lon: float, grid: float = FIELD_CONTEXT_GRID_DEGREES
+) -> Tuple[float, float]:
+    """Round a coordinate pair to the grid used as the cache key."""
+    return (round(round(lat / grid) * grid, 6), round(round(lon / grid) * grid, 6))
+
+
+class FieldContextService:
+    """
+    Fetch soil and weather for a field once and share it across flows.
+    Each flow asks for soil and weather as separate pipeline stages, so one can
+    time out or fail without losing the other.
+
+    Soil and weather are cached separately, each with its own TTL, keyed by the
+    snapped location and the request window. Concurrent misses for the same key
+    share one upstream call. Failed fetches are not cached.
+    """
+
+    def __init__(
+        self,
+        soil_ttl: float = SOIL_CONTEXT_TTL_SECONDS,
+        weather_ttl: float = WEATHER_CONTEXT_TTL_SECONDS,
+        max_entries: int = FIELD_CONTEXT_MAX_ENTRIES,
+    ):
+        self.soil_cache = TTLCache(max_entries=max_entries, default_ttl=soil_ttl)
+        self.weather_cache = TTLCache(max_entries=max_entries, default_ttl=weather_ttl)
+        self.inflight = SingleFlight()
+
+    async def soil(
+        self, lat: float, lon: float, depth: str = "0-20", top_k: int = 5
+    ) -> Dict[str, Any]:
+        lat, lon = snap_location(lat, lon)
+        key = ("soil", lat, lon, depth, top_k)
+        cached = self.soil_cache.get(key)
+        if cached is not None:
+            return cached
+
+        async def fetch():
+            summary = await get_soil_summary_async(lat, lon, depth, top_k)
+            self.soil_cache.set(key, summary)
+            return summary
+
+        return await self.inflight.do(key, fetch)
+
+    async def weather(
+        self, lat: float, lon: float, past_days: int = 30, forecast_days: int = 0
+    ) -> Dict[str, Any]:
+        lat, lon = snap_location(lat, lon)
+        key = ("weather", lat, lon, past_days, forecast_days)
+        cached = self.weather_cache.get(key)
+        if cached is not None:
+            return cached
+
+        async def fetch():
+            raw = await fetch_weather_summary(lat, lon, past_days, forecast_days)
+            summary = simplify_weather_response(raw)
+            self.weather_cache.set(key, summary)
+            return summary
+
+        return await self.inflight.do(key, fetch)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "grid_degrees": FIELD_CONTEXT_GRID_DEGREES,
+            "soil": {**self.soil_cache.stats(), "ttl_seconds": self.soil_cache.default_ttl},
+            "weather": {
+                **self.weather_cache.stats(),
+                "ttl_seconds": self.weather_cache.default_ttl,
+            },
+            "in_flight": self.inflight.in_flight(),
+        }
+
+
+field_context_service = FieldContextService()
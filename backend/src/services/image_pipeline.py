@@ -0,0 +1,107 @@
+import io
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+from PIL import Image, ImageOps
+
+
+# Largest side each provider can make use of; anything bigger is wasted upload.
+# DeepLeaf also rejects images whose short side is under 200 px.
+PROVIDER_IMAGE_MAX_SIDE = {
+    "openepi": int(os.getenv("OPENEPI_IMAGE_MAX_SIDE", "512")),
+    "kindwise": int(os.getenv("KINDWISE_IMAGE_MAX_SIDE", "1500")),
+    "deepl": int(os.getenv("DEEPLEAF_IMAGE_MAX_SIDE", "1024")),
+}
+PROVIDER_IMAGE_MIN_SIDE = {"deepl": 200}
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+
+
+class ImageDecodeError(ValueError):
+    """Raised when the uploaded bytes are not a readable image."""
+
+
+@dataclass
+class PreparedImage:
+    """
+    A decoded, upright RGB image and the JPEG renditions sent to each provider.
+    The quality gate, the near-duplicate hash and the renditions all work from
+    `image`, so an upload is decoded only once.
+    """
+
+    image: Image.Image
+    original_size: Tuple[int, int]
+    original_bytes: int
+    renditions: Dict[str, bytes] = field(default_factory=dict)
+
+    def build_renditions(
+        self, providers: Dict[str, int] = PROVIDER_IMAGE_MAX_SIDE
+    ) -> Dict[str, bytes]:
+        """Encode one metadata-free JPEG per provider, once."""
+        for name, max_side in providers.items():
+            if name not in self.renditions:
+                resized = rendition(
+                    self.image, max_side, PROVIDER_IMAGE_MIN_SIDE.get(name, 0)
+                )
+                self.renditions[name] = encode_jpeg(resized)
+        return self.renditions
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "original_bytes": self.original_bytes,
+            **{f"{name}_bytes": len(data) for name, data in self.renditions.items()},
+        }
+
+
+def decode_image(
+    data: bytes, max_side: int, resample: int = Image.LANCZOS
+) -> Tuple[Image.Image, Tuple[int, int]]:
+    """
+    Decode once, upright and in RGB, at no more than `max_side` on the long edge.
+    For JPEGs, draft mode lets libjpeg decode at 1/2, 1/4 or 1/8 scale directly,
+    which is much faster than decoding 12 MP and resizing afterwards.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        original_size = img.size
+        if img.format == "JPEG":
+            img.draft("RGB", (max_side, max_side))
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.thumbnail((max_side, max_side), resample)
+    except Exception as e:
+        raise ImageDecodeError(f"Could not read image: {e}") from e
+    return img, original_size
+
+
+def encode_jpeg(img: Image.Image, quality: int = IMAGE_JPEG_QUALITY) -> bytes:
+    """JPEG-encode without EXIF or other metadata."""
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def rendition(
+    img: Image.Image, max_side: int, min_side: int = 0, resample: int = Image.LANCZOS
+) -> Image.Image:
+    width, height = img.size
+    scale = min(1.0, max_side / max(width, height))
+    if min_side and min(width, height) * scale < min_side:
+        scale = min_side / min(width, height)
+    if scale == 1.0:
+        return img
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return img.resize(size, resample)
+
+
+def prepare_image(
+    data: bytes, providers: Dict[str, int] = PROVIDER_IMAGE_MAX_SIDE
+) -> PreparedImage:
+    """
+    Decode an upload once, at the largest size any provider uses. Renditions are
+    encoded on demand by `build_renditions`. Raises ImageDecodeError.
+    """
+    img, original_size = decode_image(data, max(providers.values()))
+    return PreparedImage(
+        image=img, original_size=original_size, original_bytes=len(data)
+    )
@@ -0,0 +1,157 @@
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import numpy as np
+from PIL import Image
+from src.services.image_pipeline import PreparedImage, rendition
+from src.services.latency import LatencyHistogram
+
+
+IMAGE_QUALITY_GATE = os.getenv("IMAGE_QUALITY_GATE", "on").lower() not in (
+    "0",
+    "off",
+    "false",
+)
+# All measurements are taken on a copy of the decoded upload whose long side is
+# at most this; blur thresholds assume it.
+QUALITY_ANALYSIS_SIDE = 512
+
+QUALITY_MIN_SIDE = int(os.getenv("IMAGE_QUALITY_MIN_SIDE", "200"))
+QUALITY_MIN_SHARPNESS = float(os.getenv("IMAGE_QUALITY_MIN_SHARPNESS", "40"))
+QUALITY_MIN_BRIGHTNESS = float(os.getenv("IMAGE_QUALITY_MIN_BRIGHTNESS", "40"))
+QUALITY_MAX_BRIGHTNESS = float(os.getenv("IMAGE_QUALITY_MAX_BRIGHTNESS", "225"))
+QUALITY_MAX_CLIPPED = float(os.getenv("IMAGE_QUALITY_MAX_CLIPPED", "0.6"))
+QUALITY_MIN_GREEN_RATIO = float(os.getenv("IMAGE_QUALITY_MIN_GREEN_RATIO", "0.05"))
+
+RETAKE_HINTS = {
+    "unreadable": "We could not open this file as a photo. Please send a JPEG or PNG picture of the leaf.",
+    "too_small": "The photo is too small. Take it closer to the leaf, or send the original photo instead of a screenshot.",
+    "blurry": "The photo is blurry. Hold the phone steady, tap the leaf on the screen to focus, and take it again.",
+    "too_dark": "The photo is too dark. Take it again in daylight, out of deep shade.",
+    "too_bright": "The photo is too bright. Avoid direct sun on the leaf, for example by shading it with your hand.",
+    "no_plant": "We could not find a plant in the photo. Fill the frame with the affected leaf and take it again.",
+}
+
+
+@dataclass
+class QualityReport:
+    """Local measurements of an upload and the checks it failed, if any."""
+
+    metrics: Dict[str, Any] = field(default_factory=dict)
+    issues: List[str] = field(default_factory=list)
+
+    @property
+    def passed(self) -> bool:
+        return not self.issues
+
+    @property
+    def hint(self) -> Optional[str]:
+        return RETAKE_HINTS[self.issues[0]] if self.issues else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "passed": self.passed,
+            "issues": self.issues,
+            "hint": self.hint,
+            "metrics": self.metrics,
+        }
+
+
+def measure(rgb: np.ndarray) -> Dict[str, float]:
+    """
+    Sharpness, exposure and vegetation measurements of an RGB uint8 array.
+    - sharpness: variance of the 4-neighbour Laplacian of the luminance
+    - brightness: mean luminance (0-255); clipped: share of pixels near 0 or 255
+    - green_ratio: share of pixels whose excess-green index 2g - r - b (on
+      chromaticity-normalised channels) is clearly positive
+    """
+    pixels = rgb.astype(np.float32)
+    r, g, b = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    luma = 0.299 * r + 0.587 * g + 0.114 * b
+
+    laplacian = (
+        luma[:-2, 1:-1]
+        + luma[2:, 1:-1]
+        + luma[1:-1, :-2]
+        + luma[1:-1, 2:]
+        - 4 * luma[1:-1, 1:-1]
+    )
+    clipped = np.count_nonzero((luma < 8) | (luma > 247)) / luma.size
+
+    total = r + g + b + 1e-6
+    excess_green = (2 * g - r - b) / total
+    # Ignore near-black pixels, whose chromaticity is mostly noise
+    green = (excess_green > 0.1) & (total > 60)
+
+    return {
+        "sharpness": round(float(laplacian.var()), 1),
+        "brightness": round(float(luma.mean()), 1),
+        "clipped": round(float(clipped), 3),
+        "green_ratio": round(float(np.count_nonzero(green) / green.size), 3),
+    }
+
+
+_latency = LatencyHistogram()
+_counters: Dict[str, int] = {"checked": 0, "rejected": 0}
+_issues: Dict[str, int] = {}
+
+
+def assess_image(prepared: Optional[PreparedImage]) -> QualityReport:
+    """
+    Cheap pre-flight checks run before any paid crop-health call, on the upload
+    decoded by `prepare_image` (None when it could not be decoded).
+    Fails uploads that are unreadable, too small, badly exposed, blurry or show
+    hardly any vegetation; `hint` tells the farmer how to retake the photo.
+    """
+    started = time.perf_counter()
+    report = _assess(prepared)
+    _latency.observe((time.perf_counter() - started) * 1000)
+    _counters["checked"] += 1
+    if not report.passed:
+        _counters["rejected"] += 1
+        for issue in report.issues:
+            _issues[issue] = _issues.get(issue, 0) + 1
+    return report
+
+
+def _assess(prepared: Optional[PreparedImage]) -> QualityReport:
+    report = QualityReport()
+    if prepared is None:
+        report.issues.append("unreadable")
+        return report
+
+    # Bilinear is enough for measurements and cheaper than Lanczos
+    img = rendition(prepared.image, QUALITY_ANALYSIS_SIDE, resample=Image.BILINEAR)
+    original_size = prepared.original_size
+    report.metrics = {
+        "width": original_size[0],
+        "height": original_size[1],
+        **measure(np.asarray(img)),
+    }
+    metrics = report.metrics
+    if min(original_size) < QUALITY_MIN_SIDE:
+        report.issues.append("too_small")
+    # Exposure first: a badly exposed photo also looks blurry and colourless,
+    # and fixing the light is the hint that helps
+    if metrics["brightness"] < QUALITY_MIN_BRIGHTNESS:
+        report.issues.append("too_dark")
+    elif (
+        metrics["brightness"] > QUALITY_MAX_BRIGHTNESS
+        or metrics["clipped"] > QUALITY_MAX_CLIPPED
+    ):
+        report.issues.append("too_bright")
+    if metrics["sharpness"] < QUALITY_MIN_SHARPNESS:
+        report.issues.append("blurry")
+    if metrics["green_ratio"] < QUALITY_MIN_GREEN_RATIO:
+        report.issues.append("no_plant")
+    return report
+
+
+def quality_gate_stats() -> Dict[str, Any]:
+    return {
+        "enabled": IMAGE_QUALITY_GATE,
+        **_counters,
+        "issues": dict(_issues),
+        "latency": _latency.stats(),
+    }
@@ -0,0 +1,171 @@
+import os
+import re
+import json
+import math
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+INTENTS = (
+    "crop_recommendation",
+    "diagnosis",
+    "fertilizer_recommendation",
+    "general",
+)
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+EXAMPLES_PATH = DATA_DIR / "intent_examples.json"
+MODEL_PATH = Path(os.getenv("INTENT_MODEL_PATH", str(DATA_DIR / "intent_model.json")))
+
+# Below this confidence the caller should ask the LLM instead.
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.7"))
+
+# Log-odds bonus given to the intent a keyword rule points at.
+KEYWORD_BONUS = 2.5
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word unigrams plus bigrams."""
+    words = _TOKEN_RE.findall((text or "").lower())
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+def keyword_intent(message_en: str) -> Optional[str]:
+    """Keyword heuristics used by detect_intent before the local model existed."""
+    mlc = (message_en or "").lower()
+    if (
+        ("recommend" in mlc and ("crop" in mlc or "plant" in mlc))
+        or ("what to plant" in mlc)
+        or ("best crop" in mlc)
+    ):
+        return "crop_recommendation"
+    if any(
+        k in mlc
+        for k in [
+            "disease",
+            "blight",
+            "symptom",
+            "leaf spot",
+            "diagnos",
+            "unhealthy",
+        ]
+    ):
+        return "diagnosis"
+    if any(k in mlc for k in ["fertilizer", "fertiliser", "npk", "dosage", "apply"]):
+        return "fertilizer_recommendation"
+    return None
+
+
+class IntentClassifier:
+    """
+    Multinomial naive Bayes over word unigrams and bigrams, with the keyword
+    heuristics folded in as a prior. Small enough to train in milliseconds and to
+    ship as a JSON file next to this module.
+    """
+
+    def __init__(
+        self,
+        class_counts: Dict[str, int],
+        token_counts: Dict[str, Dict[str, int]],
+        alpha: float = 1.0,
+    ):
+        self.class_counts = class_counts
+        self.token_counts = token_counts
+        self.alpha = alpha
+        vocab = set()
+        for counts in token_counts.values():
+            vocab.update(counts)
+        self.vocab_size = len(vocab)
+        total_docs = sum(class_counts.values())
+        self._log_prior = {
+            label: math.log(count / total_docs) for label, count in class_counts.items()
+        }
+        self._token_totals = {
+            label: sum(counts.values()) for label, counts in token_counts.items()
+        }
+
+    @classmethod
+    def train(
+        cls, examples: Iterable[Tuple[str, str]], alpha: float = 1.0
+    ) -> "IntentClassifier":
+        class_counts: Counter = Counter()
+        token_counts: Dict[str, Counter] = {label: Counter() for label in INTENTS}
+        for text, label in examples:
+            class_counts[label] += 1
+            token_counts[label].update(tokenize(text))
+        return cls(
+            dict(class_counts),
+            {label: dict(counts) for label, counts in token_counts.items()},
+            alpha,
+        )
+
+    def predict(self, message_en: str) -> Tuple[str, float]:
+        """Return the most likely intent and its posterior probability."""
+        tokens = tokenize(message_en)
+        keyword_label = keyword_intent(message_en)
+        scores = {}
+        for label, log_prior in self._log_prior.items():
+            counts = self.token_counts.get(label, {})
+            denom = self._token_totals[label] + self.alpha * (self.vocab_size + 1)
+            score = log_prior
+            for tok in tokens:
+                score += math.log((counts.get(tok, 0) + self.alpha) / denom)
+            if label == keyword_label:
+                score += KEYWORD_BONUS
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        norm = sum(math.exp(s - top) for s in scores.values())
+        return best, 1.0 / norm
+
+    def save(self, path: Path = MODEL_PATH) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "alpha": self.alpha,
+                    "class_counts": self.class_counts,
+                    "token_counts": self.token_counts,
+                },
+                f,
+                sort_keys=True,
+            )
+
+    @classmethod
+    def load(cls, path: Path = MODEL_PATH) -> "IntentClassifier":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["class_counts"], data["token_counts"], data.get("alpha", 1.0))
+
+
+def load_examples(path: Path = EXAMPLES_PATH) -> List[Tuple[str, str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [(text, label) for label, texts in data.items() for text in texts]
+
+
+def load_intent_classifier() -> Optional[IntentClassifier]:
+    """Load the serialized model, training it from the bundled examples if missing."""
+    try:
+        return IntentClassifier.load(MODEL_PATH)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Error loading intent model: {e}")
+    try:
+        return IntentClassifier.train(load_examples())
+    except Exception as e:
+        print(f"Error training intent model: {e}")
+        return None
+
+
+intent_classifier = load_intent_classifier()
+
+
+if __name__ == "__main__":
+    # Retrain and serialize: python -m src.services.intent_classifier
+    model = IntentClassifier.train(load_examples())
+    model.save(MODEL_PATH)
+    print(f"Saved intent model to {MODEL_PATH}")
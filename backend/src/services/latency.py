@@ -0,0 +1,124 @@
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+
+class LatencyHistogram:
+    """
+    Rolling window of recent latency samples (milliseconds) with percentiles.
+
+    Keeps the last `window` samples only, so percentiles follow current
+    behaviour rather than the whole process lifetime.
+    """
+
+    def __init__(self, window: int = 500):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def observe(self, ms: float) -> None:
+        with self._lock:
+            self._samples.append(ms)
+            self.count += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+        return ordered[idx]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95, p99 = (self.percentile(q) for q in (50, 95, 99))
+        return {
+            "count": self.count,
+            "window": len(self._samples),
+            "p50_ms": round(p50, 1) if p50 is not None else None,
+            "p95_ms": round(p95, 1) if p95 is not None else None,
+            "p99_ms": round(p99, 1) if p99 is not None else None,
+        }
+
+
+class CensoredLatencyHistogram(LatencyHistogram):
+    """
+    Latency histogram that also keeps censored samples: calls cancelled before
+    they finished, whose elapsed time is only a lower bound on their latency.
+
+    Censored samples are kept apart from measured ones. Percentiles use the
+    Kaplan-Meier (product-limit) estimator, so a cancelled call neither counts as
+    finished when it was cancelled nor simply disappears. When too much of the
+    tail is censored to place a percentile, it is unknown (None).
+    """
+
+    def __init__(self, window: int = 500):
+        super().__init__(window)
+        self._censored: Deque[float] = deque(maxlen=window)
+        self.censored_count = 0
+
+    def observe_censored(self, ms: float) -> None:
+        with self._lock:
+            self._censored.append(ms)
+            self.censored_count += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._censored:
+                censored = None
+            else:
+                finished = list(self._samples)
+                censored = list(self._censored)
+        if censored is None:
+            return super().percentile(q)
+        # Finished calls sort before calls cancelled at the same time
+        observations = sorted(
+            [(ms, False) for ms in finished] + [(ms, True) for ms in censored]
+        )
+        at_risk = len(observations)
+        survival = 1.0
+        for ms, is_censored in observations:
+            if not is_censored:
+                survival *= 1 - 1 / at_risk
+                if survival <= 1 - q / 100 + 1e-9:
+                    return ms
+            at_risk -= 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "censored": self.censored_count,
+            "censored_window": len(self._censored),
+        }
+
+
+class SLOTracker:
+    """Latency histogram plus SLO breach, error and fallback counters for one call site."""
+
+    def __init__(self, slo_ms: float, window: int = 500):
+        self.slo_ms = slo_ms
+        self.latency = LatencyHistogram(window)
+        self.breaches = 0
+        self.errors = 0
+        self.fallbacks = 0
+
+    def observe(self, ms: float, ok: bool = True) -> None:
+        self.latency.observe(ms)
+        if ms > self.slo_ms:
+            self.breaches += 1
+        if not ok:
+            self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        count = self.latency.count
+        return {
+            **self.latency.stats(),
+            "slo_ms": self.slo_ms,
+            "slo_breaches": self.breaches,
+            "slo_attainment": round(1 - self.breaches / count, 4) if count else None,
+            "errors": self.errors,
+            "fallbacks": self.fallbacks,
+        }
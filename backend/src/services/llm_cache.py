@@ -0,0 +1,134 @@
+import os
+import json
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from src.services.ttl_cache import TTLCache
+
+
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+LLM_CACHE_PERSIST = os.getenv("LLM_CACHE_PERSIST", "false").lower() in ("1", "true")
+
+# TTLs (seconds) for the call sites whose prompts are deterministic enough to repeat.
+LLM_CACHE_TTL = {
+    "intent": 7 * 24 * 3600,
+    "diagnosis": 24 * 3600,
+    "crop_recommendation": 6 * 3600,
+    "fertilizer_recommendation": 6 * 3600,
+}
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so formatting-only differences share a cache entry."""
+    return " ".join(prompt.split())
+
+
+def make_cache_key(model: str, config: Dict[str, Any], prompt: str) -> str:
+    payload = json.dumps(
+        {"model": model, "config": config, "prompt": normalize_prompt(prompt)},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Exact-match cache of LLM response text.
+
+    The memory tier is a bounded LRU with per-entry TTL. When LLM_CACHE_PERSIST is
+    set, entries are also written to the `llm_response_cache` table so they survive
+    restarts and are shared between workers.
+    """
+
+    def __init__(
+        self, max_entries: int = LLM_CACHE_MAX_ENTRIES, persist: bool = LLM_CACHE_PERSIST
+    ):
+        self.memory = TTLCache(max_entries=max_entries)
+        self.persist = persist
+        self.persistent_hits = 0
+        self._writes = set()
+
+    async def get(self, key: str) -> Optional[str]:
+        text = self.memory.get(key)
+        if text is not None or not self.persist:
+            return text
+        # SQLAlchemy is blocking; keep it off the event loop
+        text, ttl_left = await asyncio.to_thread(self._get_persistent, key)
+        if text is not None:
+            self.persistent_hits += 1
+            self.memory.set(key, text, ttl_left)
+        return text
+
+    def set(self, key: str, model: str, text: str, ttl: float) -> None:
+        """Store in memory now; the persistent write runs in the background."""
+        self.memory.set(key, text, ttl)
+        if not self.persist:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._set_persistent(key, model, text, ttl)
+            return
+        task = asyncio.ensure_future(
+            asyncio.to_thread(self._set_persistent, key, model, text, ttl)
+        )
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    def _get_persistent(self, key: str):
+        from src.db import SessionLocal
+        from src.db.chat_models import LLMResponseCache as LLMResponseCacheDB
+
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            entry = (
+                db.query(LLMResponseCacheDB)
+                .filter(
+                    LLMResponseCacheDB.cache_key == key,
+                    LLMResponseCacheDB.expires_at > now,
+                )
+                .first()
+            )
+            if not entry:
+                return None, None
+            return entry.response_text, (entry.expires_at - now).total_seconds()
+        except Exception as e:
+            print(f"Error reading LLM cache: {e}")
+            return None, None
+        finally:
+            db.close()
+
+    def _set_persistent(self, key: str, model: str, text: str, ttl: float) -> None:
+        from src.db import SessionLocal
+        from src.db.chat_models import LLMResponseCache as LLMResponseCacheDB
+
+        db = SessionLocal()
+        try:
+            db.merge(
+                LLMResponseCacheDB(
+                    cache_key=key,
+                    model=model,
+                    response_text=text,
+                    created_at=datetime.utcnow(),
+                    expires_at=datetime.utcnow() + timedelta(seconds=ttl),
+                )
+            )
+            db.commit()
+        except Exception as e:
+            print(f"Error saving LLM cache: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.memory.stats(),
+            "persist": self.persist,
+            "persistent_hits": self.persistent_hits,
+        }
+
+
+llm_response_cache = LLMResponseCache()
@@ -0,0 +1,70 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+from src.services.latency import SLOTracker
+
+
+LLM_MODEL_FAST = os.getenv("LLM_MODEL_FAST", "gemini-2.0-flash-lite-001")
+LLM_MODEL_DEFAULT = os.getenv("LLM_MODEL_DEFAULT", "gemini-2.0-flash-001")
+LLM_MODEL_STRONG = os.getenv("LLM_MODEL_STRONG", "gemini-2.5-flash")
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    """Which model a call site uses, its limits, and where to go when it fails."""
+
+    model: str
+    fallbacks: Tuple[str, ...] = ()
+    max_output_tokens: Optional[int] = None
+    timeout: float = 30.0  # seconds per attempt
+    slo_ms: float = 10000.0
+
+    @property
+    def models(self) -> Tuple[str, ...]:
+        return (self.model,) + tuple(m for m in self.fallbacks if m != self.model)
+
+
+# Cheap classification goes to the lowest-latency model; only structured diagnosis
+# pays for the stronger one.
+LLM_ROUTES: Dict[str, ModelRoute] = {
+    "default": ModelRoute(LLM_MODEL_DEFAULT, (LLM_MODEL_FAST,), None, 30.0, 10000),
+    "intent": ModelRoute(LLM_MODEL_FAST, (LLM_MODEL_DEFAULT,), 24, 5.0, 1000),
+    "chat": ModelRoute(LLM_MODEL_DEFAULT, (LLM_MODEL_FAST,), 280, 15.0, 4000),
+    "voice": ModelRoute(LLM_MODEL_DEFAULT, (LLM_MODEL_FAST,), None, 20.0, 6000),
+    "summary": ModelRoute(LLM_MODEL_FAST, (LLM_MODEL_DEFAULT,), 256, 20.0, 6000),
+    "diagnosis": ModelRoute(LLM_MODEL_STRONG, (LLM_MODEL_DEFAULT,), None, 45.0, 15000),
+    "crop_recommendation": ModelRoute(
+        LLM_MODEL_DEFAULT, (LLM_MODEL_FAST,), None, 30.0, 10000
+    ),
+    "fertilizer_recommendation": ModelRoute(
+        LLM_MODEL_DEFAULT, (LLM_MODEL_FAST,), None, 30.0, 10000
+    ),
+    "tasks": ModelRoute(LLM_MODEL_DEFAULT, (LLM_MODEL_FAST,), None, 30.0, 10000),
+}
+
+
+@dataclass
+class LLMRouter:
+    routes: Dict[str, ModelRoute]
+    trackers: Dict[str, SLOTracker] = field(default_factory=dict)
+
+    def route(self, name: Optional[str]) -> ModelRoute:
+        return self.routes.get(name or "default", self.routes["default"])
+
+    def tracker(self, name: Optional[str]) -> SLOTracker:
+        name = name if name in self.routes else "default"
+        if name not in self.trackers:
+            self.trackers[name] = SLOTracker(self.routes[name].slo_ms)
+        return self.trackers[name]
+
+    def stats(self) -> Dict[str, Dict]:
+        return {
+            name: {
+                "models": list(self.routes[name].models),
+                **tracker.stats(),
+            }
+            for name, tracker in self.trackers.items()
+        }
+
+
+llm_router = LLMRouter(LLM_ROUTES)
@@ -1,40 +1,512 @@
 import os
-from typing import Any, Dict, Optional
+import time
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Dict, Optional
+import httpx
 from google import genai
+from google.genai import errors as genai_errors
 from pathlib import Path
 from dotenv import load_dotenv
+from src.services.conversation_store import ConversationStore
+from src.services.llm_cache import llm_response_cache, make_cache_key
+from src.services.singleflight import SingleFlight
+from src.services.context_cache import ContextCacheRegistry, context_cache_registry
+from src.services.llm_router import LLMRouter, ModelRoute, llm_router
+from src.services.rate_limiter import (
+    LLM_MAX_RETRIES,
+    AdaptiveRateLimiter,
+    LLMOverloadedError,
+    backoff_delay,
+    limiter_for_key,
+    parse_retry_after,
+)
 
 load_dotenv()
 
 
+# Per-process limits for outbound Gemini traffic. The connection pool is shared by
+# every request on the worker; the concurrency limit caps how many calls may be in
+# flight at once so a burst cannot exhaust the pool or the API quota.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_KEEPALIVE_CONNECTIONS", "10"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_WARMUP_TIMEOUT_SECONDS = float(os.getenv("LLM_WARMUP_TIMEOUT_SECONDS", "10"))
+
+
+class LLMFallbackError(Exception):
+    """Raised when a model attempt failed in a way another model may not."""
+
+
+def _is_rate_limited(exc: Exception) -> bool:
+    return isinstance(exc, genai_errors.APIError) and exc.code == 429
+
+
+def _is_transient(exc: Exception) -> bool:
+    return isinstance(exc, genai_errors.APIError) and exc.code in (429, 500, 503, 504)
+
+
+def _is_retryable_with_fallback(exc: Exception) -> bool:
+    """Timeouts, rate limits and overload errors justify trying the next model."""
+    if isinstance(exc, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return True
+    return _is_transient(exc)
+
+
 class LLMService:
 
-    def __init__(self, model_name: str = "gemini-2.0-flash-001"):
+    def __init__(
+        self,
+        router: LLMRouter = llm_router,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        context_cache: ContextCacheRegistry = context_cache_registry,
+    ):
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
             raise ValueError("GOOGLE_API_KEY environment variable not set.")
-        self.client = genai.Client(api_key=api_key)
-        self.model_name = model_name
-        self.chat = self.client.chats.create(model=self.model_name)
+        limits = httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_KEEPALIVE_CONNECTIONS,
+        )
+        self.client = genai.Client(
+            api_key=api_key,
+            http_options=genai.types.HttpOptions(
+                timeout=int(LLM_TIMEOUT_SECONDS * 1000),
+                client_args={"limits": limits},
+                async_client_args={"limits": limits},
+            ),
+        )
+        self.router = router
+        self._api_key = api_key
+        self.conversations = ConversationStore()
+        self.cache = llm_response_cache
+        self.inflight = SingleFlight()
+        self.context_cache = context_cache
+        self.max_concurrency = max_concurrency
+        # Created by `start` on the serving loop; blocking calls run on it too, so
+        # they share the concurrency slots with async callers
+        self.limiter: Optional[AdaptiveRateLimiter] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self._private_loop_lock = threading.Lock()
+
+    def _build_request(self, prompt: str, session_id: Optional[str]):
+        user_content = genai.types.Content(
+            role="user", parts=[genai.types.Part.from_text(text=prompt)]
+        )
+        if session_id is None:
+            return user_content, [user_content]
+        return user_content, self.conversations.history(session_id) + [user_content]
+
+    def _record_turn(self, session_id: Optional[str], user_content, response) -> None:
+        if session_id is None:
+            return
+        model_content = None
+        if response.candidates:
+            model_content = response.candidates[0].content
+        self.conversations.append(session_id, user_content, model_content)
 
-    def send_message(self, prompt: str, **kwargs) -> Dict[str, Any]:
+    def _full_prompt(self, prompt: str, static_prefix: Optional[str]) -> str:
+        """Prompt text including any static prefix, as sent when not cached."""
+        if not static_prefix:
+            return prompt
+        return self.context_cache.inline_prompt(static_prefix, prompt)
+
+    async def _prepare_async(
+        self,
+        model: str,
+        prompt: str,
+        session_id: Optional[str],
+        kwargs: Dict[str, Any],
+        static_prefix: Optional[str],
+    ):
+        """Reference the static prefix by cache handle when possible, else inline it."""
+        handle = None
+        if static_prefix:
+            handle = await self.context_cache.handle(self.client, static_prefix, model)
+        if handle:
+            user_content, contents = self._build_request(prompt, session_id)
+            return user_content, contents, dict(kwargs, cached_content=handle), handle
+        user_content, contents = self._build_request(
+            self._full_prompt(prompt, static_prefix), session_id
+        )
+        return user_content, contents, kwargs, None
+
+    def _resolve(self, route_name: Optional[str], kwargs: Dict[str, Any]):
+        """Look up the call site's route and fill in its default token limit."""
+        route = self.router.route(route_name)
+        if route.max_output_tokens is not None:
+            kwargs.setdefault("max_output_tokens", route.max_output_tokens)
+        return route, kwargs
+
+    def _cache_key(
+        self, route: ModelRoute, prompt: str, session_id: Optional[str], cache_ttl, kwargs
+    ):
+        if not cache_ttl or session_id is not None:
+            return None
+        return make_cache_key(route.model, kwargs, prompt)
+
+    async def send_message_async(
+        self,
+        prompt: str,
+        session_id: Optional[str] = None,
+        cache_ttl: Optional[float] = None,
+        route: Optional[str] = None,
+        static_prefix: Optional[str] = None,
+        **kwargs,
+    ) -> Dict[str, Any]:
         """
-        Send a prompt to the model and return the response.
+        Send a prompt to the model without blocking the event loop.
         Args:
             prompt: The prompt string to send.
+            session_id: Optional conversation key. When omitted the call is a
+                stateless single-shot generation; when given, the bounded history
+                kept for that session is sent along and extended with this turn.
+            cache_ttl: If set, identical stateless prompts (same model, config and
+                normalized text) are answered from the response cache for this
+                many seconds instead of calling Gemini.
+            route: Call-site name in LLM_ROUTES, selecting the model, default token
+                limit, per-attempt timeout and fallback chain.
+            static_prefix: Key of a prefix registered with the context cache. It is
+                referenced as Gemini cached content when available and prepended
+                to the prompt otherwise.
             kwargs: Additional config for the model (temperature, max_output_tokens, etc.)
         Returns:
             Dict with the response text and any error encountered.
         """
+        await self.start()
+        model_route, kwargs = self._resolve(route, kwargs)
+        full_prompt = self._full_prompt(prompt, static_prefix)
+        cache_key = self._cache_key(
+            model_route, full_prompt, session_id, cache_ttl, kwargs
+        )
+        if cache_key:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                return {"response": cached, "cached": True}
+        tracker = self.router.tracker(route)
+        started = time.perf_counter()
         try:
-            response = self.chat.send_message(
-                message=genai.types.Part.from_text(text=prompt),
-                config=genai.types.GenerateContentConfig(**kwargs),
-            )
-            return {"response": response.text}
+            if session_id is None:
+                # Identical stateless prompts already in flight share one upstream call
+                fingerprint = cache_key or make_cache_key(
+                    model_route.model, kwargs, full_prompt
+                )
+                text, model = await self.inflight.do(
+                    fingerprint,
+                    lambda: self._generate_routed_async(
+                        model_route, prompt, None, kwargs, static_prefix
+                    ),
+                )
+            else:
+                text, model = await self._generate_routed_async(
+                    model_route, prompt, session_id, kwargs, static_prefix
+                )
+            tracker.observe((time.perf_counter() - started) * 1000)
+            if model != model_route.model:
+                tracker.fallbacks += 1
+            if cache_key and text:
+                self.cache.set(cache_key, model, text, cache_ttl)
+            return {"response": text, "model": model}
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            tracker.observe((time.perf_counter() - started) * 1000, ok=False)
+            print(f"Error in LLMService.send_message_async: {e}")
+            return {
+                "response": None,
+                "error": str(e),
+                "overloaded": isinstance(e, LLMOverloadedError),
+            }
+
+    async def _generate_routed_async(
+        self,
+        route: ModelRoute,
+        prompt: str,
+        session_id: Optional[str],
+        kwargs: Dict[str, Any],
+        static_prefix: Optional[str] = None,
+    ):
+        """Try each model in the route's chain; returns (text, model used)."""
+        last_error: Optional[Exception] = None
+        for model in route.models:
+            try:
+                text = await asyncio.wait_for(
+                    self._generate_async(
+                        model, prompt, session_id, kwargs, static_prefix
+                    ),
+                    timeout=route.timeout,
+                )
+                return text, model
+            except Exception as e:
+                if not _is_retryable_with_fallback(e):
+                    raise
+                print(f"LLM model {model} failed ({type(e).__name__}), trying fallback")
+                last_error = e
+        raise LLMFallbackError(f"All models failed: {last_error}") from last_error
+
+    async def _generate_async(
+        self,
+        model: str,
+        prompt: str,
+        session_id: Optional[str],
+        kwargs: Dict[str, Any],
+        static_prefix: Optional[str] = None,
+    ) -> Optional[str]:
+        """One model call behind the rate limiter, retried on transient errors."""
+        user_content, contents, config, handle = await self._prepare_async(
+            model, prompt, session_id, kwargs, static_prefix
+        )
+        attempt = 0
+        while True:
+            await self.limiter.acquire()
+            try:
+                async with self._slots:
+                    response = await self.client.aio.models.generate_content(
+                        model=model,
+                        contents=contents,
+                        config=genai.types.GenerateContentConfig(**config),
+                    )
+            except Exception as e:
+                if (
+                    handle
+                    and isinstance(e, genai_errors.APIError)
+                    and e.code in (400, 403, 404)
+                ):
+                    # Cached content expired or was rejected; resend the prefix
+                    # inline. This happens at most once and is not a retry attempt.
+                    self.context_cache.invalidate(static_prefix, model)
+                    user_content, contents = self._build_request(
+                        self._full_prompt(prompt, static_prefix), session_id
+                    )
+                    config, handle = kwargs, None
+                    continue
+                if not _is_transient(e) or attempt == LLM_MAX_RETRIES:
+                    raise
+                retry_after = parse_retry_after(e)
+                if _is_rate_limited(e):
+                    self.limiter.on_throttle(retry_after)
+                await asyncio.sleep(backoff_delay(attempt, retry_after))
+                attempt += 1
+                continue
+            self.limiter.on_success()
+            self._record_turn(session_id, user_content, response)
+            return response.text
+
+    async def stream_message_async(
+        self,
+        prompt: str,
+        session_id: Optional[str] = None,
+        route: Optional[str] = None,
+        static_prefix: Optional[str] = None,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        """
+        Stream the model's reply as text chunks as soon as they are generated.
+        Only the route's primary model is used, since a partially streamed reply
+        cannot be handed over to a fallback. Errors are raised to the caller.
+        The upstream stream is read by a background task into a queue, so the
+        concurrency slot is held only while Gemini is generating, not while a
+        slow client drains the reply. The route's timeout bounds the wait for
+        each chunk, including the first.
+        """
+        await self.start()
+        model_route, kwargs = self._resolve(route, kwargs)
+        tracker = self.router.tracker(route)
+        started = time.perf_counter()
+        queue: asyncio.Queue = asyncio.Queue()
+        finished = object()
+        handle = None
+
+        async def produce():
+            nonlocal handle
+            try:
+                user_content, contents, config, handle = await self._prepare_async(
+                    model_route.model, prompt, session_id, kwargs, static_prefix
+                )
+                await self.limiter.acquire()
+                async with self._slots:
+                    stream = await self.client.aio.models.generate_content_stream(
+                        model=model_route.model,
+                        contents=contents,
+                        config=genai.types.GenerateContentConfig(**config),
+                    )
+                    async for chunk in stream:
+                        if chunk.text:
+                            queue.put_nowait(chunk.text)
+                self.limiter.on_success()
+                queue.put_nowait((finished, user_content))
+            except Exception as e:
+                queue.put_nowait(e)
+
+        producer = asyncio.ensure_future(produce())
+        chunks = []
+        try:
+            while True:
+                item = await asyncio.wait_for(queue.get(), model_route.timeout)
+                if isinstance(item, Exception):
+                    raise item
+                if isinstance(item, tuple) and item[0] is finished:
+                    user_content = item[1]
+                    break
+                chunks.append(item)
+                yield item
         except Exception as e:
-            print(f"Error in LLMService.send_message: {e}")
-            return {"response": None, "error": str(e)}
+            tracker.observe((time.perf_counter() - started) * 1000, ok=False)
+            if _is_rate_limited(e):
+                self.limiter.on_throttle(parse_retry_after(e))
+            if (
+                handle
+                and isinstance(e, genai_errors.APIError)
+                and e.code in (400, 403, 404)
+            ):
+                # Let the next call recreate the cached content or go inline
+                self.context_cache.invalidate(static_prefix, model_route.model)
+            raise
+        finally:
+            # The consumer went away (or failed): stop reading upstream
+            producer.cancel()
+        tracker.observe((time.perf_counter() - started) * 1000)
+        if session_id is not None:
+            self.conversations.append(
+                session_id,
+                user_content,
+                genai.types.Content(
+                    role="model", parts=[genai.types.Part.from_text(text="".join(chunks))]
+                ),
+            )
+
+    def send_message(
+        self,
+        prompt: str,
+        session_id: Optional[str] = None,
+        cache_ttl: Optional[float] = None,
+        route: Optional[str] = None,
+        static_prefix: Optional[str] = None,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        """
+        Blocking wrapper over `send_message_async` for callers that run outside the
+        event loop (threadpool endpoints, sync generators, scripts).
+        The call is scheduled on the service's event loop, so it shares the
+        concurrency limit, rate limiter, route timeouts and fallbacks with async
+        callers. Calling it from that loop's own thread would block the loop and
+        raises RuntimeError instead.
+        """
+        loop = self._sync_loop()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            raise RuntimeError(
+                "LLMService.send_message called on the event loop; "
+                "use send_message_async"
+            )
+        future = asyncio.run_coroutine_threadsafe(
+            self.send_message_async(
+                prompt,
+                session_id=session_id,
+                cache_ttl=cache_ttl,
+                route=route,
+                static_prefix=static_prefix,
+                **kwargs,
+            ),
+            loop,
+        )
+        return future.result()
+
+    async def start(self) -> None:
+        """
+        Create the concurrency slots and rate limiter on the running loop.
+
+        `LLMClientRegistry.startup` calls this on the serving loop; services used
+        outside the registry start on their first call. A service stays bound to
+        its loop while that loop runs, and calling it from another running loop
+        raises RuntimeError. Once the loop has stopped, the next loop to start the
+        service gets fresh slots rather than ones bound to the old loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self._loop_lock:
+            if self._loop is loop:
+                return
+            if self._loop is not None and self._loop.is_running():
+                raise RuntimeError("LLMService is already serving another event loop")
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            if self.limiter is None:
+                self.limiter = limiter_for_key(self._api_key)
+            self._loop = loop
+
+    def _sync_loop(self) -> asyncio.AbstractEventLoop:
+        """The serving loop, or a private one on a daemon thread when none runs."""
+        with self._private_loop_lock:
+            loop = self._loop
+            if loop is None or not loop.is_running():
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="llm-service-loop", daemon=True
+                ).start()
+                asyncio.run_coroutine_threadsafe(self.start(), loop).result()
+            return loop
+
+    async def warm_up(self) -> None:
+        """Open pooled TLS connections by fetching metadata for each routed model."""
+        await self.start()
+        models = {m for route in self.router.routes.values() for m in route.models}
+        results = await asyncio.gather(
+            *(self.client.aio.models.get(model=m) for m in models),
+            return_exceptions=True,
+        )
+        for model, result in zip(models, results):
+            if isinstance(result, Exception):
+                print(f"LLM warm-up failed for {model}: {result}")
+
+    async def aclose(self) -> None:
+        aclose = getattr(self.client.aio, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class LLMClientRegistry:
+    """
+    Process-wide owner of LLMService instances.
+
+    Flows and routes get their client from here instead of constructing one, so
+    every call shares one genai client and connection pool. `startup` and
+    `shutdown` are wired to the FastAPI lifespan to pre-warm and close them.
+    """
+
+    def __init__(self):
+        self._services: Dict[str, LLMService] = {}
+
+    def get(self, name: str = "default") -> LLMService:
+        if name not in self._services:
+            self._services[name] = LLMService()
+        return self._services[name]
+
+    async def startup(self) -> None:
+        self.get()
+        for service in self._services.values():
+            await service.start()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(s.warm_up() for s in self._services.values())),
+                timeout=LLM_WARMUP_TIMEOUT_SECONDS,
+            )
+        except asyncio.TimeoutError:
+            print("LLM warm-up timed out; continuing with cold connections")
+        print(f"LLM clients warmed up in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    async def shutdown(self) -> None:
+        for service in self._services.values():
+            try:
+                await service.aclose()
+            except Exception as e:
+                print(f"Error closing LLM client: {e}")
 
 
-llm_service = LLMService()
+llm_registry = LLMClientRegistry()
+llm_service = llm_registry.get()
@@ -0,0 +1,209 @@
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from src.services.field_context import snap_location
+from src.services.ttl_cache import TTLCache
+
+
+# A re-shot of the same plant is reused only within this window and distance.
+# Re-shots of one leaf land within a few bits of each other; by 8-10 bits,
+# photos of different plants of the same crop start to match.
+NEAR_DUPLICATE_WINDOW_SECONDS = float(
+    os.getenv("NEAR_DUPLICATE_WINDOW_SECONDS", "1800")
+)
+NEAR_DUPLICATE_MAX_DISTANCE = int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", "5"))
+NEAR_DUPLICATE_MAX_PER_SCOPE = int(os.getenv("NEAR_DUPLICATE_MAX_PER_SCOPE", "200"))
+NEAR_DUPLICATE_MAX_SCOPES = int(os.getenv("NEAR_DUPLICATE_MAX_SCOPES", "10000"))
+NEAR_DUPLICATE_REGION_DEGREES = 0.1
+
+HASH_SIZE = 8  # 8x8 gradient bits: a 64-bit hash
+
+
+def dhash(img: Image.Image, size: int = HASH_SIZE) -> int:
+    """
+    Difference hash: each bit tells whether a pixel of the (size+1) x size
+    grayscale thumbnail is brighter than its right-hand neighbour. Robust to
+    scaling, recompression and small shifts in framing or exposure.
+    """
+    small = img.convert("L").resize((size + 1, size), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def near_duplicate_scope(
+    user_id: str,
+    location: Optional[str],
+    session_id: Optional[str] = None,
+    crop: Optional[str] = None,
+) -> Tuple[str, str, str, str]:
+    """
+    Index scope of an upload: the user, a coarse region taken from their profile
+    location (snapped to a 0.1 degree grid when it holds coordinates), the chat
+    session if any and the crop the client says is in the photo, if any. A
+    diagnosis is only reused for an upload with the same scope.
+    """
+    region = (location or "").strip().lower()
+    match = re.search(r"([+-]?[0-9]*\.?[0-9]+)\s*,\s*([+-]?[0-9]*\.?[0-9]+)", region)
+    if match:
+        lat, lon = snap_location(
+            float(match.group(1)),
+            float(match.group(2)),
+            NEAR_DUPLICATE_REGION_DEGREES,
+        )
+        region = f"{lat},{lon}"
+    return (
+        str(user_id),
+        region,
+        session_id or "",
+        (crop or "").strip().lower(),
+    )
+
+
+@dataclass
+class IndexedDiagnosis:
+    hash: int
+    created_at: float
+    result: Dict[str, Any]
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over 64-bit hashes under Hamming distance.
+
+    Each node keeps its children by their distance to it, so a radius search
+    only descends into children whose edge distance lies within
+    [d - radius, d + radius] of the query's distance to the node.
+    Nodes are [entry, {distance: child}] lists.
+    """
+
+    def __init__(self):
+        self.root: Optional[list] = None
+        self.size = 0
+
+    def add(self, entry: IndexedDiagnosis) -> None:
+        self.size += 1
+        if self.root is None:
+            self.root = [entry, {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(entry.hash, node[0].hash)
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = [entry, {}]
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, IndexedDiagnosis]]:
+        """Entries within `radius` of `value`, as (distance, entry) pairs."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            entry, children = stack.pop()
+            distance = hamming(value, entry.hash)
+            if distance <= radius:
+                found.append((distance, entry))
+            for edge, child in children.items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return found
+
+    def entries(self) -> List[IndexedDiagnosis]:
+        collected = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            entry, children = stack.pop()
+            collected.append(entry)
+            stack.extend(children.values())
+        return collected
+
+
+class NearDuplicateIndex:
+    """
+    Recent diagnoses per scope (user, region, chat session and declared crop;
+    see `near_duplicate_scope`), searchable by perceptual hash.
+
+    A re-shot of the same plant (slightly different angle, zoom or light) lands
+    within a few bits of the earlier photo's dHash, so its diagnosis can be
+    reused instead of paying for every provider and the LLM again. Each scope
+    holds a small BK-tree; entries older than the window are dropped by
+    rebuilding the tree from the live entries, and idle scopes expire.
+    """
+
+    def __init__(self):
+        self.scopes = TTLCache(
+            max_entries=NEAR_DUPLICATE_MAX_SCOPES,
+            default_ttl=NEAR_DUPLICATE_WINDOW_SECONDS,
+        )
+        self.lookups = 0
+        self.reused = 0
+        self.inserts = 0
+
+    def _live_tree(self, scope: Hashable, now: float) -> Optional[BKTree]:
+        tree = self.scopes.get(scope)
+        if tree is None:
+            return None
+        live = [
+            e
+            for e in tree.entries()
+            if now - e.created_at <= NEAR_DUPLICATE_WINDOW_SECONDS
+        ]
+        if len(live) == tree.size:
+            return tree
+        rebuilt = BKTree()
+        for entry in sorted(live, key=lambda e: e.created_at):
+            rebuilt.add(entry)
+        self.scopes.set(scope, rebuilt)
+        return rebuilt
+
+    def find(
+        self, scope: Hashable, value: int
+    ) -> Optional[Tuple[int, IndexedDiagnosis]]:
+        """The closest diagnosis within the distance threshold, newest on ties."""
+        self.lookups += 1
+        now = time.time()
+        tree = self._live_tree(scope, now)
+        if tree is None:
+            return None
+        matches = tree.search(value, NEAR_DUPLICATE_MAX_DISTANCE)
+        if not matches:
+            return None
+        self.reused += 1
+        return min(matches, key=lambda m: (m[0], -m[1].created_at))
+
+    def add(self, scope: Hashable, value: int, result: Dict[str, Any]) -> None:
+        now = time.time()
+        tree = self._live_tree(scope, now) or BKTree()
+        if tree.size >= NEAR_DUPLICATE_MAX_PER_SCOPE:
+            # Keep the newest entries only
+            rebuilt = BKTree()
+            entries = sorted(tree.entries(), key=lambda e: e.created_at)
+            for entry in entries[-(NEAR_DUPLICATE_MAX_PER_SCOPE - 1) :]:
+                rebuilt.add(entry)
+            tree = rebuilt
+        tree.add(IndexedDiagnosis(value, now, result))
+        self.scopes.set(scope, tree)
+        self.inserts += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "scopes": self.scopes.stats(),
+            "lookups": self.lookups,
+            "reused": self.reused,
+            "inserts": self.inserts,
+            "reuse_rate": round(self.reused / self.lookups, 4) if self.lookups else None,
+            "max_distance": NEAR_DUPLICATE_MAX_DISTANCE,
+            "window_seconds": NEAR_DUPLICATE_WINDOW_SECONDS,
+        }
+
+
+near_duplicate_index = NearDuplicateIndex()
@@ -0,0 +1,248 @@
+import os
+import time
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from src.services.latency import LatencyHistogram
+
+
+PIPELINE_DISCONNECT_POLL_SECONDS = float(
+    os.getenv("PIPELINE_DISCONNECT_POLL_SECONDS", "0.5")
+)
+
+StageFn = Callable[[Dict[str, Any]], Awaitable[Any]]
+DisconnectCheck = Callable[[], Awaitable[bool]]
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One node of a flow.
+
+    `fn` receives the values of the stages that finished before it. It only runs
+    once every stage in `requires` has produced a value; stages in `after` are
+    waited for but may be missing. When `fn` fails or exceeds `timeout`, the
+    optional `fallback` is called with the same values and its result is used
+    instead.
+    """
+
+    name: str
+    fn: StageFn
+    requires: Tuple[str, ...] = ()
+    after: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    fallback: Optional[Callable[[Dict[str, Any]], Any]] = None
+
+    @property
+    def deps(self) -> Tuple[str, ...]:
+        return self.requires + self.after
+
+
+@dataclass
+class PipelineResult:
+    values: Dict[str, Any] = field(default_factory=dict)
+    status: Dict[str, str] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+    total_ms: float = 0.0
+    cancelled: bool = False
+
+    @property
+    def missing(self) -> List[str]:
+        return [name for name in self.status if name not in self.values]
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.missing)
+
+    def meta(self) -> Dict[str, Any]:
+        """Summary attached to flow responses."""
+        return {
+            "partial": self.partial,
+            "missing": self.missing,
+            "errors": self.errors,
+            "timings_ms": self.timings_ms,
+            "total_ms": self.total_ms,
+        }
+
+
+class PipelineCancelled(Exception):
+    """Raised when the client went away before the flow finished."""
+
+
+class Pipeline:
+    """
+    Run a flow declared as a DAG of stages.
+
+    Stages whose dependencies are settled run concurrently, each under its own
+    timeout. A failed stage without a fallback is recorded as missing and skips the
+    stages that require it, so the rest of the flow still returns what it could.
+    When `disconnected` reports that the client has gone, every running stage is
+    cancelled and `PipelineCancelled` is raised. Stage timings are logged and kept
+    per pipeline for the metrics endpoint.
+    """
+
+    def __init__(self, name: str, stages: Sequence[Stage]):
+        self.name = name
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError(f"Pipeline '{name}' has duplicate stage names")
+        self._order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        order: List[str] = []
+        visiting = set()
+
+        def visit(name: str) -> None:
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline '{self.name}' has a cycle at '{name}'")
+            if name not in self.stages:
+                raise ValueError(f"Pipeline '{self.name}' has no stage '{name}'")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    async def run(
+        self, disconnected: Optional[DisconnectCheck] = None
+    ) -> PipelineResult:
+        result = PipelineResult()
+        started = time.perf_counter()
+        running: Dict[asyncio.Task, str] = {}
+        watcher = None
+        if disconnected:
+            watcher = asyncio.ensure_future(self._watch(disconnected))
+        try:
+            while len(result.status) < len(self.stages):
+                self._start_ready(result, running)
+                if not running:
+                    break
+                waiting = set(running) | ({watcher} if watcher else set())
+                done, _ = await asyncio.wait(
+                    waiting, return_when=asyncio.FIRST_COMPLETED
+                )
+                if watcher in done and watcher.result():
+                    result.cancelled = True
+                    raise PipelineCancelled(f"Client disconnected during '{self.name}'")
+                for task in done:
+                    if task is not watcher:
+                        name = running.pop(task)
+                        await self._settle(name, task, result)
+        finally:
+            for task in running:
+                task.cancel()
+            if watcher:
+                watcher.cancel()
+            result.total_ms = round((time.perf_counter() - started) * 1000, 1)
+            pipeline_metrics.record(self.name, result)
+        return result
+
+    def _start_ready(
+        self, result: PipelineResult, running: Dict[asyncio.Task, str]
+    ) -> None:
+        active = set(running.values())
+        for name in self._order:
+            if name in result.status or name in active:
+                continue
+            stage = self.stages[name]
+            if not all(dep in result.status for dep in stage.deps):
+                continue
+            unmet = [dep for dep in stage.requires if dep not in result.values]
+            if unmet:
+                result.status[name] = "skipped"
+                result.errors[name] = f"missing {', '.join(unmet)}"
+                continue
+            inputs = {d: result.values[d] for d in stage.deps if d in result.values}
+            running[asyncio.ensure_future(self._timed(stage, inputs))] = name
+
+    async def _timed(self, stage: Stage, inputs: Dict[str, Any]):
+        started = time.perf_counter()
+        try:
+            if stage.timeout:
+                value = await asyncio.wait_for(stage.fn(inputs), stage.timeout)
+            else:
+                value = await stage.fn(inputs)
+            return value, "ok", None, started
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            return None, "timeout", f"timed out after {stage.timeout:g}s", started
+        except Exception as e:
+            return None, "failed", str(e) or type(e).__name__, started
+
+    async def _settle(
+        self, name: str, task: asyncio.Task, result: PipelineResult
+    ) -> None:
+        value, status, error, started = task.result()
+        stage = self.stages[name]
+        result.status[name] = status
+        if error is None:
+            result.values[name] = value
+        else:
+            result.errors[name] = error
+            if stage.fallback is not None:
+                inputs = {d: result.values[d] for d in stage.deps if d in result.values}
+                try:
+                    fallback_value = stage.fallback(inputs)
+                    if asyncio.iscoroutine(fallback_value):
+                        fallback_value = await fallback_value
+                    result.values[name] = fallback_value
+                    result.status[name] = "fallback"
+                except Exception as e:
+                    result.errors[name] = f"{error}; fallback failed: {e}"
+            print(f"[pipeline] {self.name}.{name} {result.status[name]}: {error}")
+        result.timings_ms[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    async def _watch(self, disconnected: DisconnectCheck) -> bool:
+        while True:
+            if await disconnected():
+                return True
+            await asyncio.sleep(PIPELINE_DISCONNECT_POLL_SECONDS)
+
+
+class PipelineMetrics:
+    """Per-stage latency histograms and outcome counts for every pipeline run."""
+
+    def __init__(self):
+        self.stage_latency: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self.outcomes: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self.runs: Dict[str, Dict[str, int]] = {}
+
+    def record(self, pipeline: str, result: PipelineResult) -> None:
+        runs = self.runs.setdefault(
+            pipeline, {"runs": 0, "partial": 0, "cancelled": 0}
+        )
+        runs["runs"] += 1
+        runs["partial"] += int(result.partial)
+        runs["cancelled"] += int(result.cancelled)
+        for stage, ms in result.timings_ms.items():
+            key = (pipeline, stage)
+            self.stage_latency.setdefault(key, LatencyHistogram()).observe(ms)
+        for stage, status in result.status.items():
+            counts = self.outcomes.setdefault((pipeline, stage), {})
+            counts[status] = counts.get(status, 0) + 1
+        timings = ", ".join(f"{s}={ms}ms" for s, ms in result.timings_ms.items())
+        print(f"[pipeline] {pipeline}: {result.total_ms}ms ({timings})")
+
+    def stats(self) -> Dict[str, Any]:
+        report: Dict[str, Any] = {}
+        for pipeline, runs in self.runs.items():
+            stages = {}
+            for (name, stage), histogram in self.stage_latency.items():
+                if name == pipeline:
+                    stages[stage] = {
+                        **histogram.stats(),
+                        "outcomes": self.outcomes.get((name, stage), {}),
+                    }
+            report[pipeline] = {**runs, "stages": stages}
+        return report
+
+
+pipeline_metrics = PipelineMetrics()
@@ -0,0 +1,115 @@
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from src.models.chat import ChatMessage
+
+
+# Token budget for the conversation-history section of chat prompts, and the cap
+# for any single past message inside it.
+PROMPT_HISTORY_TOKEN_BUDGET = int(os.getenv("PROMPT_HISTORY_TOKEN_BUDGET", "600"))
+PROMPT_MAX_MESSAGE_TOKENS = int(os.getenv("PROMPT_MAX_MESSAGE_TOKENS", "150"))
+
+# Gemini averages roughly four characters of English text per token.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Cheap local token estimate, close enough for budgeting prompts."""
+    if not text:
+        return 0
+    return max(1, -(-len(text) // CHARS_PER_TOKEN))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly `max_tokens`, on a word boundary."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + "…"
+
+
+def build_farmer_profile(user: Any, location: str) -> str:
+    """Farmer profile block shared by the chat prompts."""
+    return f"""
+Farmer Profile:
+- Name: {user.name}
+- Location: {location}
+- Experience: {user.years_experience} years
+- User Type: {user.user_type}
+- Main Goal: {user.main_goal}
+- Preferred Language: {user.preferred_language}
+- Crops Grown: {user.crops_grown}
+"""
+
+
+def pack_history(
+    messages: Sequence[ChatMessage],
+    budget_tokens: int = PROMPT_HISTORY_TOKEN_BUDGET,
+    max_message_tokens: int = PROMPT_MAX_MESSAGE_TOKENS,
+) -> Tuple[str, Dict[str, int]]:
+    """
+    Pack conversation history newest-first into a token budget.
+
+    Each message is truncated to `max_message_tokens`; once the budget is spent,
+    older messages are dropped. Returns the formatted history in chronological
+    order and counts describing what was kept.
+    """
+    lines: List[str] = []
+    used = 0
+    truncated = 0
+    for m in reversed(messages):
+        text = truncate_to_tokens(m.message or "", max_message_tokens)
+        if text != (m.message or ""):
+            truncated += 1
+        line = f"{m.sender}: {text}"
+        cost = estimate_tokens(line)
+        if used + cost > budget_tokens:
+            break
+        lines.append(line)
+        used += cost
+    lines.reverse()
+    return "\n".join(lines), {
+        "history_tokens": used,
+        "history_messages_used": len(lines),
+        "history_messages_dropped": len(messages) - len(lines),
+        "history_messages_truncated": truncated,
+    }
+
+
+def assemble_chat_prompt(
+    policy: str,
+    farmer_info: str,
+    messages: Sequence[ChatMessage],
+    user_message: str,
+    closing: str,
+    user_label: str = "User message",
+    budget_tokens: int = PROMPT_HISTORY_TOKEN_BUDGET,
+    call_site: str = "chat",
+    summary: Optional[str] = None,
+) -> Tuple[str, Dict[str, int]]:
+    """
+    Build a chat prompt from its parts with the history packed into a budget.
+    When a rolling summary is given, `messages` should only hold the turns not yet
+    folded into it.
+    Returns the prompt and its size report, which is also logged.
+    """
+    history, stats = pack_history(messages, budget_tokens)
+    summary_section = f"Conversation summary:\n{summary}\n\n" if summary else ""
+    prompt = f"""{policy}
+
+{farmer_info}
+
+{summary_section}Conversation history:
+{history}
+
+{user_label}:
+{user_message}
+
+{closing}"""
+    stats["prompt_tokens"] = estimate_tokens(prompt)
+    print(
+        f"[prompt] {call_site}: ~{stats['prompt_tokens']} tokens "
+        f"(history {stats['history_tokens']} tokens, "
+        f"{stats['history_messages_used']} kept, "
+        f"{stats['history_messages_dropped']} dropped)"
+    )
+    return prompt, stats
@@ -0,0 +1,277 @@
+import os
+import time
+import random
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+from src.services.fanout import p95_seconds
+
+
+# Circuit breaker: a provider whose recent calls mostly fail is left out for a
+# cool-down, then retried with a single probe request.
+SCHEDULER_HEALTH_WINDOW = int(os.getenv("SCHEDULER_HEALTH_WINDOW", "20"))
+SCHEDULER_HEALTH_WINDOW_SECONDS = float(
+    os.getenv("SCHEDULER_HEALTH_WINDOW_SECONDS", "900")
+)
+SCHEDULER_MIN_CALLS = int(os.getenv("SCHEDULER_MIN_CALLS", "5"))
+SCHEDULER_MAX_ERROR_RATE = float(os.getenv("SCHEDULER_MAX_ERROR_RATE", "0.5"))
+SCHEDULER_COOLDOWN_SECONDS = float(os.getenv("SCHEDULER_COOLDOWN_SECONDS", "120"))
+
+# Cheap-first: when OpenEPI's confident "healthy" verdicts have agreed with the
+# disease providers often enough, ask it first and confirm with one provider.
+SCHEDULER_HEALTHY_CONFIDENCE = float(os.getenv("SCHEDULER_HEALTHY_CONFIDENCE", "0.9"))
+SCHEDULER_MIN_AGREEMENT = float(os.getenv("SCHEDULER_MIN_AGREEMENT", "0.95"))
+SCHEDULER_MIN_AGREEMENT_SAMPLES = int(
+    os.getenv("SCHEDULER_MIN_AGREEMENT_SAMPLES", "30")
+)
+SCHEDULER_CHEAP_FIRST_MAX_WAIT = float(
+    os.getenv("SCHEDULER_CHEAP_FIRST_MAX_WAIT", "3")
+)
+# Asking OpenEPI first delays every other request by its latency, so it only pays
+# off when enough uploads turn out confidently healthy
+SCHEDULER_MIN_HEALTHY_SHARE = float(os.getenv("SCHEDULER_MIN_HEALTHY_SHARE", "0.25"))
+# Share of requests that still fan out to everyone, so agreement keeps being measured
+SCHEDULER_EXPLORE_RATE = float(os.getenv("SCHEDULER_EXPLORE_RATE", "0.1"))
+
+KINDWISE_DISEASE_PROBABILITY = 0.5
+
+
+def disease_verdict(provider: str, result: Dict[str, Any]) -> Optional[bool]:
+    """
+    Whether a provider's simplified result says the plant is diseased.
+    None when the result carries no usable verdict (e.g. not a plant).
+    """
+    if provider == "openepi":
+        if not result.get("healthy") and not result.get("not_healthy"):
+            return None
+        return result.get("not_healthy", 0) > result.get("healthy", 0)
+    if provider == "kindwise":
+        if not result.get("is_plant"):
+            return None
+        return any(
+            d.get("probability", 0) >= KINDWISE_DISEASE_PROBABILITY
+            for d in result.get("diseases", [])
+        )
+    if provider == "deepl":
+        if not result.get("crops") and not result.get("diagnoses"):
+            return None
+        return bool(result.get("diagnoses_detected"))
+    return None
+
+
+@dataclass
+class ProviderHealth:
+    """Recent outcomes of one provider and its circuit-breaker state."""
+
+    outcomes: Deque[Tuple[float, bool]] = field(
+        default_factory=lambda: deque(maxlen=SCHEDULER_HEALTH_WINDOW)
+    )
+    open_until: float = 0.0
+    probing: bool = False
+    calls: int = 0
+    errors: int = 0
+    agreed: int = 0
+    compared: int = 0
+
+    def error_rate(self, now: float) -> Tuple[float, int]:
+        recent = [
+            ok
+            for at, ok in self.outcomes
+            if now - at <= SCHEDULER_HEALTH_WINDOW_SECONDS
+        ]
+        if not recent:
+            return 0.0, 0
+        return 1 - sum(recent) / len(recent), len(recent)
+
+
+@dataclass
+class ProviderPlan:
+    """Which disease providers to call for one request, and in what way."""
+
+    contenders: List[str]
+    background: List[str]
+    skipped: List[str]
+    cheap_first: bool
+    cheap_first_wait: float
+
+
+class ProviderScheduler:
+    """
+    Decides per request which crop-health providers to call.
+
+    - Providers whose recent error rate is too high are skipped for a cool-down,
+      then retried with one probe request; a successful probe closes the breaker.
+    - When OpenEPI's confident "healthy" verdicts have agreed with the final
+      diagnosis often enough, OpenEPI is asked first; if it is confident the
+      plant is healthy only one disease provider is called to confirm, and the
+      others are called only if that provider disagrees.
+    Agreement is measured against the majority verdict of the disease providers
+    on requests where more than one of them answered.
+    """
+
+    def __init__(self):
+        self.providers: Dict[str, ProviderHealth] = {}
+        self.healthy_calls = 0
+        self.healthy_confirmed = 0
+        self.openepi_answers = 0
+        self.openepi_confident = 0
+        self.plans = {"full": 0, "cheap_first": 0, "explore": 0}
+        self.short_circuits = 0
+        self.escalations = 0
+
+    def _health(self, provider: str) -> ProviderHealth:
+        if provider not in self.providers:
+            self.providers[provider] = ProviderHealth()
+        return self.providers[provider]
+
+    def available(self, provider: str) -> bool:
+        health = self._health(provider)
+        if health.probing:
+            # A probe is already out; wait for its outcome
+            return False
+        if health.open_until and time.time() >= health.open_until:
+            health.probing = True
+            return True
+        return not health.open_until
+
+    def release(self, provider: str) -> None:
+        """Give back a probe slot for a provider that ended up not being called."""
+        self._health(provider).probing = False
+
+    def record(
+        self, provider: str, ok: bool, result: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Outcome of a call that finished (cancelled calls are not recorded)."""
+        now = time.time()
+        health = self._health(provider)
+        if provider == "openepi" and ok and result is not None:
+            self.openepi_answers += 1
+            healthy = result.get("healthy") or 0
+            self.openepi_confident += healthy >= SCHEDULER_HEALTHY_CONFIDENCE
+        health.calls += 1
+        health.errors += 0 if ok else 1
+        health.outcomes.append((now, ok))
+        if health.probing or health.open_until:
+            health.probing = False
+            if ok:
+                health.open_until = 0.0
+                health.outcomes.clear()
+                print(f"Provider {provider} recovered; breaker closed")
+            else:
+                health.open_until = now + SCHEDULER_COOLDOWN_SECONDS
+            return
+        rate, samples = health.error_rate(now)
+        if samples >= SCHEDULER_MIN_CALLS and rate >= SCHEDULER_MAX_ERROR_RATE:
+            health.open_until = now + SCHEDULER_COOLDOWN_SECONDS
+            print(
+                f"Provider {provider} unhealthy ({rate:.0%} errors); "
+                f"skipping it for {SCHEDULER_COOLDOWN_SECONDS:g}s"
+            )
+
+    def healthy_trusted(self) -> bool:
+        if self.healthy_calls < SCHEDULER_MIN_AGREEMENT_SAMPLES:
+            return False
+        return self.healthy_confirmed / self.healthy_calls >= SCHEDULER_MIN_AGREEMENT
+
+    def healthy_share(self) -> float:
+        if not self.openepi_answers:
+            return 0.0
+        return self.openepi_confident / self.openepi_answers
+
+    def confident_healthy(self, openepi_result: Dict[str, Any]) -> bool:
+        healthy = openepi_result.get("healthy", 0) or 0
+        return healthy >= SCHEDULER_HEALTHY_CONFIDENCE and self.healthy_trusted()
+
+    def plan(self, missing: Sequence[str], order: Sequence[str]) -> ProviderPlan:
+        """
+        Plan the calls for the providers in `missing` (not served from cache).
+        `order` is the preferred order of the disease providers; any other
+        missing provider (OpenEPI) runs in the background.
+        """
+        wanted = [p for p in order if p in missing]
+        contenders = [p for p in wanted if self.available(p)]
+        skipped = [p for p in wanted if p not in contenders]
+        if wanted and not contenders:
+            # Never leave a request without a disease provider
+            contenders, skipped = wanted, []
+        background = [p for p in missing if p not in wanted]
+        skipped += [p for p in background if not self.available(p)]
+        background = [p for p in background if p not in skipped]
+
+        openepi_wait = p95_seconds("openepi", SCHEDULER_CHEAP_FIRST_MAX_WAIT)
+        cheap_first = (
+            "openepi" in background
+            and len(contenders) > 1
+            and self.healthy_trusted()
+            and self.healthy_share() >= SCHEDULER_MIN_HEALTHY_SHARE
+            and openepi_wait <= SCHEDULER_CHEAP_FIRST_MAX_WAIT
+        )
+        if cheap_first and random.random() < SCHEDULER_EXPLORE_RATE:
+            cheap_first = False
+            self.plans["explore"] += 1
+        else:
+            self.plans["cheap_first" if cheap_first else "full"] += 1
+        return ProviderPlan(contenders, background, skipped, cheap_first, openepi_wait)
+
+    def record_agreement(self, results: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Compare each provider with the majority verdict of the disease providers.
+        `results` holds the simplified results of the providers that answered.
+        """
+        verdicts = {
+            provider: disease_verdict(provider, result)
+            for provider, result in results.items()
+        }
+        disease_votes = [
+            v for p, v in verdicts.items() if p != "openepi" and v is not None
+        ]
+        if len(disease_votes) < 2:
+            return
+        diseased = sum(disease_votes)
+        if diseased * 2 == len(disease_votes):
+            return  # a tie has no final verdict
+        final = diseased * 2 > len(disease_votes)
+        for provider, verdict in verdicts.items():
+            if verdict is None:
+                continue
+            health = self._health(provider)
+            health.compared += 1
+            health.agreed += verdict == final
+        openepi = results.get("openepi")
+        if openepi and (openepi.get("healthy") or 0) >= SCHEDULER_HEALTHY_CONFIDENCE:
+            self.healthy_calls += 1
+            self.healthy_confirmed += not final
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        providers = {}
+        for name, health in self.providers.items():
+            rate, samples = health.error_rate(now)
+            providers[name] = {
+                "available": not health.open_until,
+                "probing": health.probing,
+                "recent_error_rate": round(rate, 3) if samples else None,
+                "calls": health.calls,
+                "errors": health.errors,
+                "agreement": (
+                    round(health.agreed / health.compared, 3)
+                    if health.compared
+                    else None
+                ),
+                "compared": health.compared,
+            }
+        return {
+            "providers": providers,
+            "plans": dict(self.plans),
+            "short_circuits": self.short_circuits,
+            "escalations": self.escalations,
+            "confident_healthy": {
+                "calls": self.healthy_calls,
+                "confirmed": self.healthy_confirmed,
+                "trusted": self.healthy_trusted(),
+                "share": round(self.healthy_share(), 3),
+            },
+        }
+
+
+provider_scheduler = ProviderScheduler()
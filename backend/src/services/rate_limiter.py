@@ -0,0 +1,176 @@
+import os
+import re
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+from src.services.latency import LatencyHistogram
+
+
+LLM_RATE_PER_SECOND = float(os.getenv("LLM_RATE_PER_SECOND", "5"))
+LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", "10"))
+LLM_RATE_MIN_PER_SECOND = float(os.getenv("LLM_RATE_MIN_PER_SECOND", "0.5"))
+LLM_QUEUE_MAX_DEPTH = int(os.getenv("LLM_QUEUE_MAX_DEPTH", "50"))
+LLM_QUEUE_MAX_WAIT_SECONDS = float(os.getenv("LLM_QUEUE_MAX_WAIT_SECONDS", "20"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+
+
+class LLMOverloadedError(Exception):
+    """Raised when a request is shed instead of queued."""
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket with a bounded wait queue and AIMD rate adaptation.
+
+    Requests take one token; when none is available they wait in line, and once
+    `max_queue` requests are already waiting new ones are shed immediately. A 429
+    halves the rate and pauses the bucket for the server's retry-after; each
+    success nudges the rate back up towards its configured ceiling.
+    """
+
+    def __init__(
+        self,
+        rate: float = LLM_RATE_PER_SECOND,
+        burst: int = LLM_RATE_BURST,
+        min_rate: float = LLM_RATE_MIN_PER_SECOND,
+        max_queue: int = LLM_QUEUE_MAX_DEPTH,
+        max_wait: float = LLM_QUEUE_MAX_WAIT_SECONDS,
+    ):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.queue_depth = 0
+        self.shed = 0
+        self.throttled = 0
+        self.wait = LatencyHistogram()
+
+    def _try_take(self) -> float:
+        """Take a token if possible; otherwise return seconds until one is due."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def _enter_queue(self) -> None:
+        with self._lock:
+            if self.queue_depth >= self.max_queue:
+                self.shed += 1
+                raise LLMOverloadedError(
+                    f"LLM queue full ({self.queue_depth} waiting); request shed"
+                )
+            self.queue_depth += 1
+
+    def _leave_queue(self, started: float) -> None:
+        with self._lock:
+            self.queue_depth -= 1
+        self.wait.observe((time.monotonic() - started) * 1000)
+
+    def _check_deadline(self, started: float, delay: float) -> None:
+        if time.monotonic() - started + delay > self.max_wait:
+            with self._lock:
+                self.shed += 1
+            raise LLMOverloadedError(
+                f"LLM queue wait would exceed {self.max_wait:.0f}s; request shed"
+            )
+
+    async def acquire(self) -> None:
+        self._enter_queue()
+        started = time.monotonic()
+        try:
+            while True:
+                delay = self._try_take()
+                if delay <= 0:
+                    return
+                self._check_deadline(started, delay)
+                await asyncio.sleep(delay)
+        finally:
+            self._leave_queue(started)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def on_throttle(self, retry_after: Optional[float]) -> None:
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + retry_after
+                )
+
+    def stats(self) -> Dict[str, Any]:
+        wait = self.wait.stats()
+        return {
+            "rate_per_second": round(self.rate, 3),
+            "max_rate_per_second": self.max_rate,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue,
+            "shed": self.shed,
+            "throttled": self.throttled,
+            "wait_p50_ms": wait["p50_ms"],
+            "wait_p95_ms": wait["p95_ms"],
+        }
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Exponential backoff with full jitter, never shorter than retry-after."""
+    ceiling = min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * (2**attempt))
+    delay = random.uniform(0, ceiling)
+    if retry_after:
+        delay = max(delay, min(retry_after, LLM_BACKOFF_MAX_SECONDS))
+    return delay
+
+
+def parse_retry_after(exc: Exception) -> Optional[float]:
+    """Read retry-after from the HTTP header or Gemini's RetryInfo detail."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("retry-after")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    match = re.search(r"retryDelay['\"]?\s*:\s*['\"]?(\d+(?:\.\d+)?)s", str(exc))
+    if match:
+        return float(match.group(1))
+    return None
+
+
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for_key(api_key: str) -> AdaptiveRateLimiter:
+    """One limiter per API key, since Gemini quotas are enforced per key."""
+    key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+    with _limiters_lock:
+        if key_id not in _limiters:
+            _limiters[key_id] = AdaptiveRateLimiter()
+        return _limiters[key_id]
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    return {key_id: limiter.stats() for key_id, limiter in _limiters.items()}
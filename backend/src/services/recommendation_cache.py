@@ -0,0 +1,164 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence, Tuple
+from src.services.ttl_cache import TTLCache
+
+
+RECOMMENDATION_CACHE_MAX_ENTRIES = int(
+    os.getenv("RECOMMENDATION_CACHE_MAX_ENTRIES", "4000")
+)
+# Upper bound on an entry's life within a season, per flow.
+RECOMMENDATION_CACHE_MAX_TTL = {
+    "crops": 14 * 86400,
+    "fertilizer": 7 * 86400,
+}
+
+# Ethiopian agricultural seasons by month: belg short rains, kiremt main rains and
+# the bega dry season. Recommendations change at season boundaries, so no entry
+# outlives the season it was produced in.
+SEASONS = {
+    1: "bega",
+    2: "belg",
+    3: "belg",
+    4: "belg",
+    5: "belg",
+    6: "kiremt",
+    7: "kiremt",
+    8: "kiremt",
+    9: "kiremt",
+    10: "bega",
+    11: "bega",
+    12: "bega",
+}
+
+# Band edges: a value falls into the first band whose upper edge it is below.
+NITROGEN_BANDS = ((1.0, "low"), (2.0, "medium"))  # g/kg
+PHOSPHOROUS_BANDS = ((10.0, "low"), (25.0, "medium"))  # ppm
+POTASSIUM_BANDS = ((100.0, "low"), (250.0, "medium"))  # ppm
+RAINFALL_BANDS = (
+    (10.0, "0-10"),
+    (50.0, "10-50"),
+    (100.0, "50-100"),
+    (200.0, "100-200"),
+    (400.0, "200-400"),
+)  # mm over the weather window
+PH_STEP = 0.5
+TEMPERATURE_STEP = 2.0  # °C
+
+
+def band(
+    value: Optional[float], bands: Sequence[Tuple[float, str]], top: str = "high"
+) -> str:
+    if value is None:
+        return "unknown"
+    for upper, label in bands:
+        if value < upper:
+            return label
+    return top
+
+
+def bucket(value: Optional[float], step: float) -> Optional[float]:
+    """Round down to a multiple of `step`; None stays None."""
+    if value is None:
+        return None
+    return round((value // step) * step, 2)
+
+
+def current_season(now: Optional[datetime] = None) -> str:
+    return SEASONS[(now or datetime.utcnow()).month]
+
+
+def seconds_until_season_end(now: Optional[datetime] = None) -> float:
+    now = now or datetime.utcnow()
+    season = SEASONS[now.month]
+    year, month = now.year, now.month
+    while SEASONS[month] == season:
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+    return (datetime(year, month, 1) - now).total_seconds()
+
+
+def quantize_field(
+    soil_summary: Dict[str, Any], weather_summary: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Reduce soil and weather summaries to the coarse features a recommendation depends on."""
+    texture = soil_summary.get("texture_class")
+    return {
+        "soil_type": (soil_summary.get("soil_type") or "").lower() or None,
+        "texture": texture.lower() if isinstance(texture, str) else None,
+        "ph": bucket(soil_summary.get("ph"), PH_STEP),
+        "nitrogen": band(soil_summary.get("nitrogen_total_g_per_kg"), NITROGEN_BANDS),
+        "phosphorous": band(
+            soil_summary.get("phosphorous_extractable_ppm"), PHOSPHOROUS_BANDS
+        ),
+        "potassium": band(soil_summary.get("potassium_extractable_ppm"), POTASSIUM_BANDS),
+        "rainfall": band(
+            weather_summary.get("total_rainfall_mm"), RAINFALL_BANDS, top="400+"
+        ),
+        "temperature_max": bucket(
+            weather_summary.get("avg_temperature_max"), TEMPERATURE_STEP
+        ),
+        "temperature_min": bucket(
+            weather_summary.get("avg_temperature_min"), TEMPERATURE_STEP
+        ),
+    }
+
+
+def _normalize(value: Optional[str]) -> Optional[str]:
+    return " ".join(value.lower().split()) if value else None
+
+
+class RecommendationCache:
+    """
+    Cache of crop and fertilizer recommendation text keyed on quantized field features.
+
+    Fields with the same soil bands and weather bands in the same season share one
+    recommendation, so nearby farms skip the LLM call entirely. Each entry expires
+    at the end of the current season or after the flow's maximum TTL, whichever
+    comes first.
+    """
+
+    def __init__(self, max_entries: int = RECOMMENDATION_CACHE_MAX_ENTRIES):
+        self.memory = TTLCache(max_entries=max_entries)
+
+    def make_key(
+        self,
+        flow: str,
+        soil_summary: Dict[str, Any],
+        weather_summary: Dict[str, Any],
+        past_days: int,
+        target_crop: Optional[str] = None,
+        growth_stage: Optional[str] = None,
+        previous_crop: Optional[str] = None,
+    ) -> str:
+        payload = json.dumps(
+            {
+                "flow": flow,
+                "season": current_season(),
+                "past_days": past_days,
+                "features": quantize_field(soil_summary, weather_summary),
+                "target_crop": _normalize(target_crop),
+                "growth_stage": _normalize(growth_stage),
+                "previous_crop": _normalize(previous_crop),
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def ttl(self, flow: str) -> float:
+        return min(RECOMMENDATION_CACHE_MAX_TTL[flow], seconds_until_season_end())
+
+    def get(self, key: str) -> Optional[str]:
+        return self.memory.get(key)
+
+    def set(self, key: str, flow: str, text: str) -> None:
+        self.memory.set(key, text, self.ttl(flow))
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.memory.stats(), "season": current_season()}
+
+
+recommendation_cache = RecommendationCache()
@@ -0,0 +1,186 @@
+import os
+import asyncio
+import hashlib
+import secrets
+from typing import Any, Dict, Optional
+import httpx
+from src.services.image_pipeline import decode_image, encode_jpeg
+from src.services.singleflight import SingleFlight
+from src.services.ttl_cache import TTLCache
+
+
+SIMILAR_IMAGES_TTL = int(os.getenv("SIMILAR_IMAGES_TTL_SECONDS", str(24 * 3600)))
+SIMILAR_IMAGES_MAX_GALLERIES = int(os.getenv("SIMILAR_IMAGES_MAX_GALLERIES", "5000"))
+THUMBNAIL_SIDE = int(os.getenv("SIMILAR_IMAGES_THUMBNAIL_SIDE", "320"))
+THUMBNAIL_QUALITY = 80
+# Vendor reference pictures do not change; thumbnails are shared across diagnoses
+THUMBNAIL_TTL = int(os.getenv("SIMILAR_IMAGES_THUMBNAIL_TTL_SECONDS", str(7 * 86400)))
+THUMBNAIL_MAX_ENTRIES = int(os.getenv("SIMILAR_IMAGES_THUMBNAIL_MAX_ENTRIES", "2000"))
+THUMBNAIL_SOURCE_MAX_BYTES = 8 * 1024 * 1024
+THUMBNAIL_FETCH_TIMEOUT = float(os.getenv("SIMILAR_IMAGES_FETCH_TIMEOUT", "10"))
+
+SIMILAR_IMAGES_PATH = "/api/crop-health/similar-images"
+
+
+def new_diagnosis_id() -> str:
+    # Unguessable: thumbnail URLs are loaded by <img> tags without credentials
+    return secrets.token_urlsafe(16)
+
+
+def similar_images_url(diagnosis_id: str) -> str:
+    return f"{SIMILAR_IMAGES_PATH}/{diagnosis_id}"
+
+
+def gallery_fields(diagnosis_id: str) -> Dict[str, str]:
+    """Fields added to a diagnosis response in place of inline similar images."""
+    return {
+        "diagnosis_id": diagnosis_id,
+        "similar_images_url": similar_images_url(diagnosis_id),
+    }
+
+
+class SimilarImageStore:
+    """
+    Similar-image galleries of recent diagnoses, served on demand as thumbnails.
+
+    Kindwise returns reference pictures with every identification. Instead of
+    shipping their full-size vendor URLs in the diagnosis response, `detach` moves
+    them into a gallery keyed by a diagnosis ID; clients fetch the gallery later
+    and load server-side resized, cached thumbnails from this API.
+    """
+
+    def __init__(self):
+        self.galleries = TTLCache(
+            max_entries=SIMILAR_IMAGES_MAX_GALLERIES, default_ttl=SIMILAR_IMAGES_TTL
+        )
+        self.thumbnails = TTLCache(
+            max_entries=THUMBNAIL_MAX_ENTRIES, default_ttl=THUMBNAIL_TTL
+        )
+        self.inflight = SingleFlight()
+        self.fetches = 0
+        self.fetch_errors = 0
+
+    def detach(self, kindwise: Dict[str, Any], diagnosis_id: str) -> Dict[str, Any]:
+        """
+        Return a copy of a simplified Kindwise result without `similar_images`,
+        adding the pictures to the gallery of `diagnosis_id`. The input is not
+        modified, as it may be shared with the result cache.
+        """
+        gallery = self.galleries.get(diagnosis_id) or {
+            "diseases": [],
+            "crops": [],
+            "urls": [],
+        }
+        stripped = dict(kindwise)
+        for kind in ("diseases", "crops"):
+            entries = []
+            for entry in kindwise.get(kind, []):
+                images = entry.get("similar_images") or []
+                if images:
+                    group = {"name": entry.get("name"), "similar_images": []}
+                    for image in images:
+                        gallery["urls"].append(image["url"])
+                        group["similar_images"].append(
+                            {
+                                "index": len(gallery["urls"]) - 1,
+                                "citation": image.get("citation", ""),
+                            }
+                        )
+                    gallery[kind].append(group)
+                entries.append(
+                    {k: v for k, v in entry.items() if k != "similar_images"}
+                )
+            stripped[kind] = entries
+        self.galleries.set(diagnosis_id, gallery)
+        return stripped
+
+    def detach_all(
+        self, combined: Dict[str, Any], diagnosis_id: str
+    ) -> Dict[str, Any]:
+        """`detach` applied to the Kindwise part of combined provider results."""
+        if "kindwise" not in combined:
+            return combined
+        kindwise = self.detach(combined["kindwise"], diagnosis_id)
+        return {**combined, "kindwise": kindwise}
+
+    def gallery(self, diagnosis_id: str) -> Optional[Dict[str, Any]]:
+        """
+        The gallery in the shape the diagnosis response used to carry inline, with
+        each picture pointing at its thumbnail on this API.
+        """
+        gallery = self.galleries.get(diagnosis_id)
+        if gallery is None:
+            return None
+        base = similar_images_url(diagnosis_id)
+        return {
+            kind: [
+                {
+                    "name": group["name"],
+                    "similar_images": [
+                        {
+                            "url": f"{base}/{image['index']}",
+                            "citation": image["citation"],
+                        }
+                        for image in group["similar_images"]
+                    ],
+                }
+                for group in gallery[kind]
+            ]
+            for kind in ("diseases", "crops")
+        }
+
+    async def thumbnail(self, diagnosis_id: str, index: int) -> Optional[bytes]:
+        """
+        JPEG thumbnail of one gallery picture, or None when the diagnosis or the
+        picture is unknown. Raises httpx.HTTPError or ImageDecodeError when the
+        vendor image can't be fetched or read.
+        """
+        gallery = self.galleries.get(diagnosis_id)
+        if gallery is None or not 0 <= index < len(gallery["urls"]):
+            return None
+        url = gallery["urls"][index]
+        cached = self.thumbnails.get(url)
+        if cached is not None:
+            return cached
+        return await self.inflight.do(url, lambda: self._fetch_thumbnail(url))
+
+    async def _fetch_thumbnail(self, url: str) -> bytes:
+        self.fetches += 1
+        try:
+            async with httpx.AsyncClient(
+                timeout=THUMBNAIL_FETCH_TIMEOUT, follow_redirects=True
+            ) as client:
+                async with client.stream("GET", url) as response:
+                    response.raise_for_status()
+                    data = bytearray()
+                    async for chunk in response.aiter_bytes():
+                        data += chunk
+                        if len(data) > THUMBNAIL_SOURCE_MAX_BYTES:
+                            raise httpx.HTTPError(f"Image too large: {url}")
+            thumbnail = await asyncio.to_thread(self._resize, bytes(data))
+        except Exception:
+            self.fetch_errors += 1
+            raise
+        self.thumbnails.set(url, thumbnail)
+        return thumbnail
+
+    @staticmethod
+    def _resize(data: bytes) -> bytes:
+        img, _ = decode_image(data, THUMBNAIL_SIDE)
+        return encode_jpeg(img, THUMBNAIL_QUALITY)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "galleries": self.galleries.stats(),
+            "thumbnails": self.thumbnails.stats(),
+            "fetches": self.fetches,
+            "fetch_errors": self.fetch_errors,
+            "coalesced": self.inflight.coalesced,
+        }
+
+
+def thumbnail_etag(data: bytes) -> str:
+    return f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+
+
+similar_image_store = SimilarImageStore()
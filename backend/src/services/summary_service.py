@@ -0,0 +1,90 @@
+import os
+import asyncio
+from typing import Set
+from src.services.chat_service import chat_session_manager
+from src.services.llm_service import llm_service
+from src.services.prompt_builder import truncate_to_tokens
+
+
+# Most recent messages always sent verbatim; only older ones are folded into the
+# summary, and only once at least SUMMARY_MIN_NEW_MESSAGES have aged out.
+SUMMARY_KEEP_RECENT = int(os.getenv("SUMMARY_KEEP_RECENT", "6"))
+SUMMARY_MIN_NEW_MESSAGES = int(os.getenv("SUMMARY_MIN_NEW_MESSAGES", "4"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "200"))
+
+
+class ConversationSummarizer:
+    """
+    Maintain a compact rolling summary for each chat session.
+
+    After each turn the messages that have fallen out of the recent window are
+    folded into the stored summary with one small LLM call; messages already
+    folded in are never resent.
+    """
+
+    def __init__(self):
+        self._running: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def schedule(self, session_id: str) -> None:
+        """Update the summary in the background without delaying the reply."""
+        if session_id in self._running:
+            return
+        task = asyncio.create_task(self.update(session_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def update(self, session_id: str) -> None:
+        if session_id in self._running:
+            return
+        self._running.add(session_id)
+        try:
+            # Session reads and writes are blocking DB calls; keep them off the loop
+            session = await asyncio.to_thread(
+                chat_session_manager.get_session, session_id
+            )
+            if not session:
+                return
+            fold_until = len(session.messages) - SUMMARY_KEEP_RECENT
+            new_messages = session.messages[session.summarized_count : fold_until]
+            if len(new_messages) < SUMMARY_MIN_NEW_MESSAGES:
+                return
+
+            new_text = "\n".join(
+                f"{m.sender}: {truncate_to_tokens(m.message or '', 300)}"
+                for m in new_messages
+            )
+            prompt = (
+                "You maintain a running summary of a conversation between a farmer "
+                "and an agricultural assistant.\n"
+                "Update the summary with the new messages. Keep facts about the "
+                "farmer, their crops and field, problems reported, and advice already "
+                "given. Drop greetings and repetition. Write plain sentences, at most "
+                "120 words.\n\n"
+                f"Current summary:\n{session.summary or '(none)'}\n\n"
+                f"New messages:\n{new_text}\n\n"
+                "Updated summary:"
+            )
+            result = await llm_service.send_message_async(
+                prompt,
+                route="summary",
+                temperature=0.2,
+                max_output_tokens=SUMMARY_MAX_TOKENS,
+            )
+            summary = (result.get("response") or "").strip()
+            if not summary:
+                print(f"Summary update skipped for {session_id}: {result.get('error')}")
+                return
+            await asyncio.to_thread(
+                chat_session_manager.save_summary,
+                session_id,
+                summary,
+                session.summarized_count + len(new_messages),
+            )
+        except Exception as e:
+            print(f"Error updating conversation summary: {e}")
+        finally:
+            self._running.discard(session_id)
+
+
+conversation_summarizer = ConversationSummarizer()
@@ -0,0 +1,8 @@
+import os
+
+# The LLM service module builds its shared client at import time; a placeholder
+# key is enough, as tests replace the client with a local fake.
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+os.environ.setdefault("CONTEXT_CACHE_ENABLED", "true")
+# Importing src.db creates the tables; keep them in memory instead of ./chat.db
+os.environ.setdefault("DATABASE_URL", "sqlite://")
@@ -0,0 +1,68 @@
+import asyncio
+from types import SimpleNamespace
+
+
+class FakeModels:
+    """Stands in for `client.aio.models`, tracking concurrent calls."""
+
+    def __init__(self, delay: float = 0.0, errors=None, model_delays=None):
+        self.delay = delay
+        self.model_delays = model_delays or {}
+        self.errors = list(errors or [])
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate_content(self, model, contents, config):
+        self.calls.append({"model": model, "contents": contents, "config": config})
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.model_delays.get(model, self.delay))
+            if self.errors:
+                raise self.errors.pop(0)
+            return SimpleNamespace(text=f"reply from {model}", candidates=[])
+        finally:
+            self.in_flight -= 1
+
+    async def generate_content_stream(self, model, contents, config):
+        self.calls.append({"model": model, "contents": contents, "config": config})
+        if self.errors:
+            raise self.errors.pop(0)
+
+        async def chunks():
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                for word in ("streamed ", "reply ", f"from {model}"):
+                    await asyncio.sleep(self.model_delays.get(model, self.delay))
+                    yield SimpleNamespace(text=word)
+            finally:
+                self.in_flight -= 1
+
+        return chunks()
+
+    async def get(self, model):
+        return SimpleNamespace(name=model)
+
+
+class FakeCaches:
+    """Stands in for `client.aio.caches`."""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.created = []
+
+    async def create(self, model, config):
+        if self.fail:
+            raise RuntimeError("caching unavailable")
+        name = f"cachedContents/{len(self.created) + 1}"
+        self.created.append({"name": name, "model": model, "config": config})
+        return SimpleNamespace(name=name)
+
+
+class FakeGenaiClient:
+    def __init__(self, models: FakeModels = None, caches: FakeCaches = None):
+        self.aio = SimpleNamespace(
+            models=models or FakeModels(), caches=caches or FakeCaches()
+        )
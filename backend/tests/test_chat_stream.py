@@ -0,0 +1,77 @@
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.auth.auth_utils import get_current_user
+from src.models.chat import ChatSession
+from src.routes import chat
+
+USER = SimpleNamespace(
+    user_id="u1",
+    name="Abebe",
+    location="",
+    years_experience=5,
+    user_type="smallholder",
+    main_goal="yield",
+    preferred_language="en",
+    crops_grown=["maize"],
+)
+
+
+def make_client(monkeypatch, stream_message_async):
+    now = datetime.now()
+    session = ChatSession(session_id="s1", created_at=now, updated_at=now)
+    stored = []
+
+    def add_message(session_id, sender, message):
+        stored.append((sender, message, threading.current_thread()))
+
+    monkeypatch.setattr(chat.chat_session_manager, "get_session", lambda sid: session)
+    monkeypatch.setattr(chat.chat_session_manager, "add_message", add_message)
+    monkeypatch.setattr(chat.conversation_summarizer, "schedule", lambda sid: None)
+    monkeypatch.setattr(chat, "detect_intent", fake_intent)
+    monkeypatch.setattr(
+        chat.llm_service, "stream_message_async", stream_message_async
+    )
+    app = FastAPI()
+    app.include_router(chat.router)
+    app.dependency_overrides[get_current_user] = lambda: USER
+    return TestClient(app), stored
+
+
+async def fake_intent(message):
+    return "general"
+
+
+def send(client):
+    return client.post(
+        f"{chat.router.prefix}/send-message",
+        params={"stream": True, "preferred_language": "en"},
+        json={"session_id": "s1", "message": "How do I water maize?"},
+    ).text
+
+
+def test_streamed_reply_is_stored_off_the_event_loop(monkeypatch):
+    async def stream_message_async(prompt, **kwargs):
+        for chunk in ("Water early ", "in the morning."):
+            yield chunk
+
+    client, stored = make_client(monkeypatch, stream_message_async)
+    body = send(client)
+    assert '"ok": true' in body
+    user_message, reply = stored
+    assert reply[:2] == ("llm", "Water early in the morning.")
+    # The user message is stored on the loop thread, the streamed reply is not
+    assert reply[2] is not user_message[2]
+
+
+def test_reply_cut_off_by_an_error_is_not_stored(monkeypatch):
+    async def stream_message_async(prompt, **kwargs):
+        yield "Water early "
+        raise RuntimeError("stream broke")
+
+    client, stored = make_client(monkeypatch, stream_message_async)
+    body = send(client)
+    assert "event: error" in body and '"ok": false' in body
+    assert [sender for sender, _, _ in stored] == ["user"]
@@ -0,0 +1,131 @@
+import asyncio
+import importlib
+from types import SimpleNamespace
+import pytest
+from google.genai import errors as genai_errors
+from src.services import context_cache
+from src.services.context_cache import (
+    CONTEXT_CACHE_REFRESH_MARGIN_SECONDS,
+    ContextCacheRegistry,
+)
+from src.services.llm_router import LLM_ROUTES, LLMRouter
+from src.services.llm_service import LLMService
+from src.services.rate_limiter import LLM_MAX_RETRIES, AdaptiveRateLimiter
+from tests.fakes import FakeCaches, FakeGenaiClient, FakeModels
+
+LONG_PREFIX = "Static advisor instructions. " * 200  # ~1500 tokens
+MODEL = "gemini-2.5-flash"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(context_cache, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def make_registry(**kwargs) -> ContextCacheRegistry:
+    registry = ContextCacheRegistry(enabled=True, **kwargs)
+    registry.register("advisor", LONG_PREFIX)
+    return registry
+
+
+def test_handle_is_created_once_and_reused():
+    registry = make_registry()
+    client = FakeGenaiClient(caches=FakeCaches())
+
+    async def main():
+        return await asyncio.gather(
+            *(registry.handle(client, "advisor", MODEL) for _ in range(5))
+        )
+
+    handles = asyncio.run(main())
+    assert handles == ["cachedContents/1"] * 5
+    assert len(client.aio.caches.created) == 1
+    assert registry.stats()["created"] == 1
+    assert registry.stats()["hits"] == 5
+
+
+def test_handle_is_recreated_before_it_expires(clock):
+    registry = make_registry(ttl_seconds=600)
+    client = FakeGenaiClient(caches=FakeCaches())
+    assert asyncio.run(registry.handle(client, "advisor", MODEL)) == "cachedContents/1"
+    clock[0] += 600 - CONTEXT_CACHE_REFRESH_MARGIN_SECONDS - 1
+    assert asyncio.run(registry.handle(client, "advisor", MODEL)) == "cachedContents/1"
+    clock[0] += 2
+    assert asyncio.run(registry.handle(client, "advisor", MODEL)) == "cachedContents/2"
+
+
+def test_short_prefixes_and_failed_creates_go_inline(clock):
+    registry = make_registry(retry_seconds=60)
+    registry.register("short", "Too short to cache.")
+    failing = FakeGenaiClient(caches=FakeCaches(fail=True))
+    assert asyncio.run(registry.handle(failing, "short", MODEL)) is None
+    assert failing.aio.caches.created == []
+    # Below the larger minimum of models other than 2.5 Flash
+    assert not registry.cacheable("advisor", "gemini-2.0-flash-001")
+
+    assert asyncio.run(registry.handle(failing, "advisor", MODEL)) is None
+    assert registry.stats()["failed"] == 1
+    # The failure is remembered until the retry window has passed
+    working = FakeGenaiClient(caches=FakeCaches())
+    assert asyncio.run(registry.handle(working, "advisor", MODEL)) is None
+    clock[0] += 61
+    assert asyncio.run(registry.handle(working, "advisor", MODEL)) == "cachedContents/1"
+
+
+def test_rejected_handle_is_invalidated_and_prompt_resent_inline():
+    registry = make_registry()
+    models = FakeModels(
+        errors=[genai_errors.ClientError(404, {"error": {"message": "not found"}})]
+    )
+    service = LLMService(router=LLMRouter(LLM_ROUTES), context_cache=registry)
+    service.client = FakeGenaiClient(models=models, caches=FakeCaches())
+    service.limiter = AdaptiveRateLimiter(rate=1000, burst=1000)
+
+    result = asyncio.run(
+        service.send_message_async(
+            "What is wrong with my maize?", route="diagnosis", static_prefix="advisor"
+        )
+    )
+    assert result["response"] == f"reply from {MODEL}"
+    first, second = models.calls
+    assert first["config"].cached_content == "cachedContents/1"
+    assert first["contents"][0].parts[0].text == "What is wrong with my maize?"
+    assert second["config"].cached_content is None
+    assert second["contents"][0].parts[0].text.startswith(LONG_PREFIX)
+    assert registry.stats()["active_handles"] == 0
+
+
+def test_only_prefixes_some_model_can_cache_are_registered():
+    from src.services.context_cache import context_cache_registry as registry
+
+    # Importing the prompt modules registers their prefixes, if any
+    for module in ("src.flows", "src.routes.weather_forecast"):
+        importlib.import_module(module)
+    smallest = min([registry.min_tokens, *registry.model_min_tokens.values()])
+    for key, tokens in registry.stats()["prefix_tokens"].items():
+        assert tokens >= smallest, key
+
+
+def test_inline_resend_after_the_last_retry_is_not_dropped(monkeypatch):
+    monkeypatch.setattr("src.services.llm_service.backoff_delay", lambda *a: 0)
+    registry = make_registry()
+    transient = [
+        genai_errors.ServerError(503, {"error": {"message": "overloaded"}})
+        for _ in range(LLM_MAX_RETRIES)
+    ]
+    models = FakeModels(
+        errors=transient
+        + [genai_errors.ClientError(403, {"error": {"message": "cache gone"}})]
+    )
+    service = LLMService(router=LLMRouter(LLM_ROUTES), context_cache=registry)
+    service.client = FakeGenaiClient(models=models, caches=FakeCaches())
+    service.limiter = AdaptiveRateLimiter(rate=1000, burst=1000)
+
+    result = asyncio.run(
+        service.send_message_async("Hello", route="diagnosis", static_prefix="advisor")
+    )
+    assert result == {"response": f"reply from {MODEL}", "model": MODEL}
+    assert len(models.calls) == LLM_MAX_RETRIES + 2
+    assert models.calls[-1]["config"].cached_content is None
@@ -0,0 +1,123 @@
+import asyncio
+from src.services import fanout
+from src.services.fanout import (
+    FanoutPolicy,
+    fan_out,
+    fanout_stats,
+    p95_seconds,
+    provider_latency,
+)
+from src.services.latency import CensoredLatencyHistogram
+
+
+def provider(delay: float, cancelled: list, name: str, fail: bool = False):
+    async def call():
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(name)
+            raise
+        if fail:
+            raise RuntimeError(f"{name} failed")
+        return {"provider": name}
+
+    return call
+
+
+def run(calls, policy, contenders, background=()):
+    async def main():
+        return [
+            item async for item in fan_out(calls, policy, contenders, background)
+        ]
+
+    return asyncio.run(main())
+
+
+def test_quorum_cancels_the_slow_loser_and_records_it_as_censored():
+    cancelled = []
+    calls = {
+        "q-fast-a": provider(0.01, cancelled, "q-fast-a"),
+        "q-fast-b": provider(0.02, cancelled, "q-fast-b"),
+        "q-slow": provider(5, cancelled, "q-slow"),
+    }
+    censored_before = fanout_stats()["censored_samples"]
+    results = run(calls, FanoutPolicy(mode="quorum", quorum=2, budget=3), list(calls))
+
+    assert [name for name, _, _ in results] == ["q-fast-a", "q-fast-b"]
+    assert cancelled == ["q-slow"]
+    # The loser's elapsed time is a lower bound, kept out of the measured samples
+    assert len(provider_latency("q-slow")) == 0
+    assert provider_latency("q-slow").stats()["censored"] == 1
+    assert len(provider_latency("q-fast-a")) == 1
+    assert fanout_stats()["censored_samples"] == censored_before + 1
+
+
+def test_quorum_settles_for_one_answer_once_the_budget_expires():
+    cancelled = []
+    calls = {
+        "b-fast": provider(0.01, cancelled, "b-fast"),
+        "b-slow": provider(5, cancelled, "b-slow"),
+    }
+    results = run(calls, FanoutPolicy(mode="quorum", quorum=2, budget=0.1), list(calls))
+    assert [name for name, _, _ in results] == ["b-fast"]
+    assert cancelled == ["b-slow"]
+
+
+def test_hedge_starts_the_next_provider_and_cancels_the_slow_one():
+    cancelled = []
+    calls = {
+        "h-slow": provider(5, cancelled, "h-slow"),
+        "h-fast": provider(0.01, cancelled, "h-fast"),
+    }
+    hedges_before = fanout_stats()["hedges"]
+    results = run(calls, FanoutPolicy(mode="hedge", hedge_delay=0.05), list(calls))
+
+    assert [name for name, _, _ in results] == ["h-fast"]
+    assert cancelled == ["h-slow"]
+    assert fanout_stats()["hedges"] == hedges_before + 1
+    assert provider_latency("h-slow").stats()["censored"] == 1
+
+
+def test_hedge_moves_on_immediately_when_a_provider_fails():
+    cancelled = []
+    calls = {
+        "f-broken": provider(0, cancelled, "f-broken", fail=True),
+        "f-next": provider(0.01, cancelled, "f-next"),
+    }
+    results = run(calls, FanoutPolicy(mode="hedge", hedge_delay=5), list(calls))
+    assert [name for name, _, _ in results] == ["f-broken", "f-next"]
+    assert "error" in results[0][1]
+    assert results[1][2] < 1000
+
+
+def test_censored_samples_do_not_pull_the_p95_down():
+    histogram = CensoredLatencyHistogram()
+    for _ in range(95):
+        histogram.observe(100)
+    for _ in range(5):
+        histogram.observe(2000)
+    # Slow calls hedged away at 300 ms: counted as finished, they would put the
+    # p95 at 300 ms
+    for _ in range(20):
+        histogram.observe_censored(300)
+    assert histogram.percentile(95) == 2000
+    assert histogram.percentile(50) == 100
+
+
+def test_p95_falls_back_to_the_default_when_the_tail_was_cancelled(monkeypatch):
+    histogram = provider_latency("c-tail")
+    for _ in range(90):
+        histogram.observe(100)
+    for _ in range(10):
+        histogram.observe_censored(300)
+    assert histogram.percentile(95) is None
+    monkeypatch.setattr(fanout, "FANOUT_MIN_SAMPLES", 20)
+    assert p95_seconds("c-tail", 4.0) == 4.0
+
+
+def test_without_censored_samples_percentiles_are_unchanged():
+    histogram = CensoredLatencyHistogram()
+    for ms in range(1, 101):
+        histogram.observe(ms)
+    assert histogram.percentile(95) == 95
+    assert histogram.stats()["censored"] == 0
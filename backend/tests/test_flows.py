@@ -0,0 +1,132 @@
+import asyncio
+import io
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+from src import flows
+from src.routes import uploads
+from src.services import image_pipeline
+from src.services.image_pipeline import ImageDecodeError
+
+
+def leaf_photo(width: int = 1600, height: int = 1200) -> bytes:
+    rng = np.random.default_rng(0)
+    base = np.array([60, 130, 45], dtype=np.int16)
+    noise = rng.integers(-35, 35, size=(height, width, 1), dtype=np.int16)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8)).save(
+        buffer, format="JPEG"
+    )
+    return buffer.getvalue()
+
+
+def test_diagnosis_stream_times_out_hung_providers(monkeypatch):
+    cancelled = []
+
+    async def stream_crop_health(image_data, prepared=None):
+        yield {
+            "provider": "kindwise",
+            "result": {"is_plant": True, "diseases": [], "crops": []},
+            "error": None,
+            "cached": False,
+        }
+        try:
+            await asyncio.sleep(30)  # DeepLeaf and OpenEPI never answer
+        finally:
+            cancelled.append(True)
+
+    async def no_rejection(image_data):
+        return None
+
+    async def interpret_diagnosis(combined_result):
+        return {"insight": "Looks healthy", "raw_results": combined_result}
+
+    monkeypatch.setattr(flows, "stream_crop_health", stream_crop_health)
+    monkeypatch.setattr(flows, "quality_rejection", no_rejection)
+    monkeypatch.setattr(flows, "interpret_diagnosis", interpret_diagnosis)
+    monkeypatch.setattr(flows, "FLOW_CROP_HEALTH_TIMEOUT_SECONDS", 0.1)
+
+    async def main():
+        return [item async for item in flows.diagnosis_flow_stream(b"photo")]
+
+    events = asyncio.run(asyncio.wait_for(main(), 5))
+    providers = {data["provider"]: data["error"] for event, data in events[:-1]}
+    assert providers == {"kindwise": None, "openepi": "timeout", "deepl": "timeout"}
+    event, insight = events[-1]
+    assert event == "insight" and insight["insight"] == "Looks healthy"
+    assert list(insight["raw_results"]) == ["kindwise", "openepi", "deepl"]
+    assert cancelled == [True]
+
+
+def test_diagnosis_decodes_the_upload_once(monkeypatch):
+    decodes = []
+    decode_image = image_pipeline.decode_image
+
+    def counting_decode(data, max_side, *args):
+        decodes.append(max_side)
+        return decode_image(data, max_side, *args)
+
+    async def predict_crop_health(image_data, prepared=None):
+        assert set(prepared.build_renditions()) == {"openepi", "kindwise", "deepl"}
+        return {"kindwise": {"is_plant": True}, "openepi": {}, "deepl": {}}
+
+    async def interpret_diagnosis(combined_result):
+        return {"insight": "Looks healthy", "raw_results": combined_result}
+
+    monkeypatch.setattr(image_pipeline, "decode_image", counting_decode)
+    monkeypatch.setattr(flows, "IMAGE_QUALITY_GATE", True)
+    monkeypatch.setattr(flows, "predict_crop_health", predict_crop_health)
+    monkeypatch.setattr(flows, "interpret_diagnosis", interpret_diagnosis)
+
+    result = asyncio.run(
+        flows.diagnosis_flow(leaf_photo(), scope=("decode-once-user", ""))
+    )
+    assert result["insight"] == "Looks healthy"
+    assert decodes == [max(image_pipeline.PROVIDER_IMAGE_MAX_SIDE.values())]
+
+
+def test_unreadable_upload_gets_a_retake_hint_when_the_gate_is_on(monkeypatch):
+    monkeypatch.setattr(flows, "IMAGE_QUALITY_GATE", True)
+    assert asyncio.run(uploads.prepare_image_upload(b"not an image")) is None
+    result = asyncio.run(flows.diagnosis_flow(b"not an image"))
+    assert result["quality"]["issues"] == ["unreadable"]
+
+
+def test_unreadable_upload_is_a_400_when_the_gate_is_off(monkeypatch):
+    monkeypatch.setattr(flows, "IMAGE_QUALITY_GATE", False)
+    with pytest.raises(ImageDecodeError):
+        asyncio.run(flows.diagnosis_flow(b"not an image"))
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(uploads.prepare_image_upload(b"not an image"))
+    assert raised.value.status_code == 400
+
+
+def test_failed_insight_is_not_reused_for_a_near_duplicate(monkeypatch):
+    llm_calls = []
+
+    async def predict_crop_health(image_data, prepared=None):
+        return {"kindwise": {"is_plant": True}, "openepi": {}, "deepl": {}}
+
+    async def send_message_async(prompt, **kwargs):
+        llm_calls.append(prompt)
+        if len(llm_calls) == 1:
+            return {"response": None, "error": "LLM unavailable"}
+        return {"response": "Water the maize in the morning."}
+
+    monkeypatch.setattr(flows, "IMAGE_QUALITY_GATE", False)
+    monkeypatch.setattr(flows, "predict_crop_health", predict_crop_health)
+    monkeypatch.setattr(flows.llm_service, "send_message_async", send_message_async)
+    photo = leaf_photo()
+    scope = ("failed-insight-user", "", "", "")
+
+    failed = asyncio.run(flows.diagnosis_flow(photo, scope=scope))
+    assert failed["insight"] is None
+    retried = asyncio.run(flows.diagnosis_flow(photo, scope=scope))
+    assert not retried.get("reused")
+    assert retried["insight"] == "Water the maize in the morning."
+    assert len(llm_calls) == 2
+    # The successful diagnosis is the one a re-shot reuses
+    reused = asyncio.run(flows.diagnosis_flow(photo, scope=scope))
+    assert reused["reused"] and reused["reused_from"]["distance"] == 0
+    assert len(llm_calls) == 2
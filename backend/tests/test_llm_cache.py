@@ -0,0 +1,59 @@
+import asyncio
+import threading
+import time
+from src.services.llm_cache import LLMResponseCache, make_cache_key
+
+
+class SlowStoreCache(LLMResponseCache):
+    """Persistent tier replaced by a blocking in-memory store."""
+
+    def __init__(self):
+        super().__init__(max_entries=10, persist=True)
+        self.rows = {}
+        self.threads = set()
+
+    def _get_persistent(self, key):
+        self.threads.add(threading.get_ident())
+        time.sleep(0.2)
+        return self.rows.get(key, (None, None))
+
+    def _set_persistent(self, key, model, text, ttl):
+        self.threads.add(threading.get_ident())
+        time.sleep(0.2)
+        self.rows[key] = (text, ttl)
+
+
+def test_cache_key_ignores_whitespace_but_not_config():
+    a = make_cache_key("m", {"temperature": 0}, "Is  my\nmaize ok?")
+    assert a == make_cache_key("m", {"temperature": 0}, "Is my\nmaize ok?")
+    assert a != make_cache_key("m", {"temperature": 1}, "Is my\nmaize ok?")
+    assert a != make_cache_key("other", {"temperature": 0}, "Is my\nmaize ok?")
+
+
+def test_persistent_tier_does_not_block_the_event_loop():
+    cache = SlowStoreCache()
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        background = asyncio.ensure_future(ticker())
+        cache.set("k", "model", "cached reply", 60)
+        assert await cache.get("k") == "cached reply"  # memory tier
+        cache.memory.clear()
+        while cache._writes:
+            await asyncio.sleep(0.01)
+        assert await cache.get("k") == "cached reply"  # persistent tier
+        background.cancel()
+        return ticks
+
+    ticks = asyncio.run(main())
+    # Two 200 ms blocking calls ran while the loop kept ticking
+    assert ticks >= 20
+    assert threading.get_ident() not in cache.threads
+    assert cache.persistent_hits == 1
@@ -0,0 +1,155 @@
+import asyncio
+import time
+import pytest
+from src.services.llm_router import LLM_ROUTES, LLMRouter, ModelRoute
+from src.services.llm_service import LLMClientRegistry, LLMService
+from src.services.rate_limiter import AdaptiveRateLimiter
+from tests.fakes import FakeGenaiClient, FakeModels
+
+
+def make_service(models: FakeModels, max_concurrency: int = 2) -> LLMService:
+    service = LLMService(router=LLMRouter(LLM_ROUTES), max_concurrency=max_concurrency)
+    service.client = FakeGenaiClient(models)
+    service.limiter = AdaptiveRateLimiter(rate=1000, burst=1000)
+    return service
+
+
+def test_sync_and_async_calls_share_one_concurrency_limit():
+    models = FakeModels(delay=0.05)
+    service = make_service(models, max_concurrency=2)
+    sync_results = []
+
+    async def main():
+        # As at app startup, the serving loop is bound before blocking callers run
+        await service.send_message_async("warm up")
+        loop = asyncio.get_running_loop()
+        threads = [
+            loop.run_in_executor(
+                None, lambda i=i: sync_results.append(service.send_message(f"sync {i}"))
+            )
+            for i in range(3)
+        ]
+        replies = await asyncio.gather(
+            *(service.send_message_async(f"async {i}") for i in range(3)), *threads
+        )
+        return replies[:3]
+
+    async_results = asyncio.run(main())
+    assert models.max_in_flight == 2
+    assert len(models.calls) == 7
+    assert all(r["response"] for r in async_results + sync_results)
+
+
+def test_send_message_without_a_serving_loop_uses_a_private_loop():
+    models = FakeModels()
+    service = make_service(models)
+    assert service.send_message("hello")["response"].startswith("reply from")
+    assert service.send_message("again")["response"].startswith("reply from")
+
+
+def test_send_message_on_the_event_loop_thread_refuses_to_block():
+    service = make_service(FakeModels())
+
+    async def main():
+        await service.send_message_async("bind the loop")
+        with pytest.raises(RuntimeError):
+            service.send_message("would block")
+
+    asyncio.run(main())
+
+
+def test_stream_releases_its_slot_before_a_slow_consumer_drains_it():
+    models = FakeModels()
+    service = make_service(models, max_concurrency=1)
+
+    async def main():
+        stream = service.stream_message_async("tell me", route="chat")
+        first = await anext(stream)
+        # The consumer stalls here; the upstream reply is already buffered and the
+        # only slot is free for other calls
+        other = await asyncio.wait_for(service.send_message_async("other"), 1)
+        rest = [chunk async for chunk in stream]
+        return first, rest, other
+
+    first, rest, other = asyncio.run(main())
+    assert first + "".join(rest) == "streamed reply from gemini-2.0-flash-001"
+    assert other["response"]
+
+
+def test_failed_stream_is_recorded_as_an_error():
+    models = FakeModels(errors=[RuntimeError("upstream down")])
+    service = make_service(models)
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            async for _ in service.stream_message_async("tell me", route="chat"):
+                pass
+
+    asyncio.run(main())
+    stats = service.router.stats()["chat"]
+    assert stats["errors"] == 1
+
+
+def test_blocking_calls_honour_the_route_timeout_and_fall_back():
+    models = FakeModels(model_delays={"slow-model": 5})
+    service = make_service(models)
+    service.router = LLMRouter(
+        {"default": ModelRoute("slow-model", ("fast-model",), timeout=0.1)}
+    )
+    started = time.perf_counter()
+    result = service.send_message("hello")
+    assert result == {"response": "reply from fast-model", "model": "fast-model"}
+    assert time.perf_counter() - started < 2
+    assert service.router.stats()["default"]["fallbacks"] == 1
+
+
+def test_stalled_stream_times_out():
+    models = FakeModels(model_delays={"slow-model": 5})
+    service = make_service(models)
+    service.router = LLMRouter({"default": ModelRoute("slow-model", timeout=0.1)})
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            async for _ in service.stream_message_async("tell me"):
+                pass
+
+    asyncio.run(main())
+    assert service.router.stats()["default"]["errors"] == 1
+
+
+def test_registry_startup_creates_the_slots_on_the_serving_loop():
+    registry = LLMClientRegistry()
+    service = registry.get()
+    service.client = FakeGenaiClient(FakeModels())
+    assert service._slots is None and service.limiter is None
+
+    async def main():
+        await registry.startup()
+        return asyncio.get_running_loop()
+
+    loop = asyncio.run(main())
+    assert service._loop is loop
+    assert service._slots is not None and service.limiter is not None
+
+
+def test_a_new_loop_gets_its_own_slots_instead_of_inheriting_them():
+    models = FakeModels(delay=0.02)
+    service = make_service(models, max_concurrency=1)
+
+    async def burst():
+        # Contention binds the semaphore to this loop
+        return await asyncio.gather(
+            *(service.send_message_async(f"q{i}") for i in range(3))
+        )
+
+    asyncio.run(burst())
+    replies = asyncio.run(burst())
+    assert all(r["response"] for r in replies)
+    assert models.max_in_flight == 1
+
+
+def test_a_service_serving_a_running_loop_refuses_another():
+    service = make_service(FakeModels())
+    service.send_message("starts the private loop")
+    with pytest.raises(RuntimeError):
+        asyncio.run(service.send_message_async("from another loop"))
@@ -0,0 +1,88 @@
+import random
+import numpy as np
+from PIL import Image
+from src.services import near_duplicates
+from src.services.near_duplicates import (
+    NEAR_DUPLICATE_MAX_DISTANCE,
+    BKTree,
+    IndexedDiagnosis,
+    NearDuplicateIndex,
+    dhash,
+    hamming,
+    near_duplicate_scope,
+)
+
+
+def test_bk_tree_search_matches_a_linear_scan():
+    rng = random.Random(7)
+    centres = [rng.getrandbits(64) for _ in range(20)]
+    values = []
+    for _ in range(500):
+        # Clusters of nearby hashes, like re-shots of the same plants
+        value = rng.choice(centres)
+        for bit in rng.sample(range(64), rng.randint(0, 12)):
+            value ^= 1 << bit
+        values.append(value)
+
+    tree = BKTree()
+    for value in values:
+        tree.add(IndexedDiagnosis(value, 0.0, {}))
+    assert tree.size == len(values)
+
+    for radius in (0, 3, 5, 10):
+        for query in rng.sample(values, 20) + [rng.getrandbits(64) for _ in range(5)]:
+            found = sorted(d for d, _ in tree.search(query, radius))
+            expected = sorted(
+                hamming(query, v) for v in values if hamming(query, v) <= radius
+            )
+            assert found == expected
+
+
+def test_reshot_photo_is_near_and_a_different_photo_is_not():
+    rng = np.random.default_rng(1)
+    leaf = Image.fromarray(rng.integers(0, 255, (600, 800, 3), dtype=np.uint8))
+    leaf = leaf.resize((80, 60), Image.BILINEAR).resize((800, 600), Image.BICUBIC)
+    reshot = leaf.crop((8, 6, 792, 594)).resize((1000, 750), Image.LANCZOS)
+    other = Image.fromarray(rng.integers(0, 255, (600, 800, 3), dtype=np.uint8))
+
+    assert hamming(dhash(leaf), dhash(reshot)) <= NEAR_DUPLICATE_MAX_DISTANCE
+    assert hamming(dhash(leaf), dhash(other)) > NEAR_DUPLICATE_MAX_DISTANCE
+
+
+def test_index_returns_the_closest_match_within_the_threshold():
+    index = NearDuplicateIndex()
+    scope = ("user", "", "", "")
+    index.add(scope, 0b0, {"diagnosis_id": "exact"})
+    index.add(scope, 0b111, {"diagnosis_id": "three-bits"})
+
+    distance, entry = index.find(scope, 0b1)
+    assert (distance, entry.result["diagnosis_id"]) == (1, "exact")
+    far = (1 << (NEAR_DUPLICATE_MAX_DISTANCE + 1)) - 1
+    assert index.find(scope, far << 8) is None
+
+
+def test_index_forgets_diagnoses_outside_the_window(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(near_duplicates.time, "time", lambda: now[0])
+    index = NearDuplicateIndex()
+    scope = ("user", "", "", "")
+    index.add(scope, 42, {"diagnosis_id": "old"})
+    assert index.find(scope, 42) is not None
+
+    now[0] += near_duplicates.NEAR_DUPLICATE_WINDOW_SECONDS + 1
+    assert index.find(scope, 42) is None
+
+
+def test_scopes_keep_sessions_and_crops_apart():
+    index = NearDuplicateIndex()
+    index.add(near_duplicate_scope("u1", "9.145, 40.489", "chat-a", "Maize"), 42, {})
+
+    def found(user, location, session, crop):
+        return index.find(near_duplicate_scope(user, location, session, crop), 42)
+
+    # Same 0.1 degree cell, crop names compared case-insensitively
+    assert found("u1", "9.13, 40.47", "chat-a", "maize ") is not None
+    assert found("u1", "9.145, 40.489", "chat-b", "maize") is None
+    assert found("u1", "9.145, 40.489", "chat-a", "sorghum") is None
+    assert found("u1", "9.145, 40.489", "chat-a", None) is None
+    assert found("u2", "9.145, 40.489", "chat-a", "maize") is None
@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+from src.services import rate_limiter
+from src.services.rate_limiter import (
+    AdaptiveRateLimiter,
+    LLMOverloadedError,
+    backoff_delay,
+    parse_retry_after,
+)
+
+
+def test_burst_is_served_without_waiting():
+    limiter = AdaptiveRateLimiter(rate=1, burst=3, max_queue=10, max_wait=5)
+
+    async def main():
+        for _ in range(3):
+            await asyncio.wait_for(limiter.acquire(), 0.05)
+
+    asyncio.run(main())
+    assert limiter.queue_depth == 0 and limiter.shed == 0
+
+
+def test_requests_beyond_the_queue_are_shed():
+    limiter = AdaptiveRateLimiter(rate=1, burst=1, max_queue=2, max_wait=5)
+
+    async def main():
+        await limiter.acquire()  # takes the only token
+        waiting = [asyncio.ensure_future(limiter.acquire()) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert limiter.queue_depth == 2
+        with pytest.raises(LLMOverloadedError):
+            await limiter.acquire()
+        for task in waiting:
+            task.cancel()
+        await asyncio.gather(*waiting, return_exceptions=True)
+
+    asyncio.run(main())
+    assert limiter.shed == 1
+    assert limiter.queue_depth == 0
+
+
+def test_request_is_shed_when_the_wait_would_exceed_the_deadline():
+    limiter = AdaptiveRateLimiter(rate=0.1, burst=1, max_queue=10, max_wait=1)
+
+    async def main():
+        await limiter.acquire()
+        with pytest.raises(LLMOverloadedError):
+            await limiter.acquire()  # next token is 10s away
+
+    asyncio.run(main())
+    assert limiter.shed == 1
+
+
+def test_throttle_halves_the_rate_and_pauses_for_retry_after():
+    limiter = AdaptiveRateLimiter(rate=10, burst=10, min_rate=1, max_wait=5)
+    limiter.on_throttle(0.2)
+    assert limiter.rate == 5 and limiter.throttled == 1
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await limiter.acquire()
+        return loop.time() - started
+
+    assert asyncio.run(main()) >= 0.15
+
+    for _ in range(10):
+        limiter.on_throttle(None)
+    assert limiter.rate == 1  # never below min_rate
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.rate == 10  # back up to the ceiling, not beyond
+
+
+def test_backoff_is_jittered_but_never_shorter_than_retry_after(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "LLM_BACKOFF_BASE_SECONDS", 0.5)
+    monkeypatch.setattr(rate_limiter, "LLM_BACKOFF_MAX_SECONDS", 30)
+    for attempt in range(4):
+        assert 0 <= backoff_delay(attempt) <= 0.5 * 2**attempt
+        assert backoff_delay(attempt, retry_after=7) >= 7
+    assert backoff_delay(0, retry_after=300) == 30
+
+
+def test_retry_after_is_read_from_the_header_or_retry_info():
+    class Response:
+        headers = {"retry-after": "12"}
+
+    class HTTPError(Exception):
+        response = Response()
+
+    assert parse_retry_after(HTTPError("429")) == 12.0
+    assert parse_retry_after(Exception("429 {'retryDelay': '31s'}")) == 31.0
+    assert parse_retry_after(Exception("500 internal")) is None
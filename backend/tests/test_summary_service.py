@@ -0,0 +1,50 @@
+import asyncio
+import threading
+from datetime import datetime
+from src.models.chat import ChatMessage, ChatSession
+from src.services import summary_service
+from src.services.summary_service import (
+    SUMMARY_KEEP_RECENT,
+    SUMMARY_MIN_NEW_MESSAGES,
+    ConversationSummarizer,
+)
+
+
+def test_summary_update_keeps_db_calls_off_the_event_loop(monkeypatch):
+    now = datetime.now()
+    messages = [
+        ChatMessage(sender="user", message=f"message {i}", timestamp=now)
+        for i in range(SUMMARY_KEEP_RECENT + SUMMARY_MIN_NEW_MESSAGES)
+    ]
+    session = ChatSession(
+        session_id="s1", messages=messages, created_at=now, updated_at=now
+    )
+    db_threads = []
+    saved = []
+
+    def get_session(session_id):
+        db_threads.append(threading.current_thread())
+        return session
+
+    def save_summary(session_id, summary, summarized_count):
+        db_threads.append(threading.current_thread())
+        saved.append((session_id, summary, summarized_count))
+
+    async def send_message_async(prompt, **kwargs):
+        return {"response": "The farmer grows maize."}
+
+    manager = summary_service.chat_session_manager
+    monkeypatch.setattr(manager, "get_session", get_session)
+    monkeypatch.setattr(manager, "save_summary", save_summary)
+    monkeypatch.setattr(
+        summary_service.llm_service, "send_message_async", send_message_async
+    )
+
+    async def main():
+        await ConversationSummarizer().update("s1")
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(main())
+    assert saved == [("s1", "The farmer grows maize.", SUMMARY_MIN_NEW_MESSAGES)]
+    assert len(db_threads) == 2
+    assert loop_thread not in db_threads
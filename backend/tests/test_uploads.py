@@ -0,0 +1,18 @@
+from fastapi.testclient import TestClient
+from src.main import app
+from src.routes.uploads import UPLOAD_MAX_REQUEST_BYTES
+
+
+def test_oversized_upload_413_carries_cors_headers():
+    # No context manager: the lifespan (LLM warm-up) is not needed here
+    client = TestClient(app)
+    response = client.post(
+        "/api/crop-health/diagnose",
+        content=b"x" * (UPLOAD_MAX_REQUEST_BYTES + 1),
+        headers={
+            "content-type": "multipart/form-data; boundary=x",
+            "origin": "https://app.example",
+        },
+    )
+    assert response.status_code == 413
+    assert response.headers["access-control-allow-origin"] == "*"
@@ -316,36 +316,36 @@ export default function ChatPage() {
             content: res.response,
             time: new Date().toLocaleTimeString([], { hour: "2-digit", minute: "2-digit" }),
           }
-          const gallery: Array<{ url: string; label?: string; citation?: string }> = []
-          if (res.similar_images) {
-            if (Array.isArray(res.similar_images.diseases)) {
-              res.similar_images.diseases.forEach((d: any) => {
-                (d.similar_images || []).forEach((img: any) => {
-                  if (img?.url) gallery.push({ url: img.url, label: `${d.name || 'Disease'}`, citation: img.citation })
+          setMessages(prev => [...prev, botMsg])
+
+          // Similar cases load after the reply, as thumbnails served by the backend
+          if (res.diagnosis_id) {
+            apiService
+              .getSimilarImages(res.diagnosis_id)
+              .then((similar) => {
+                const gallery: Array<{ url: string; label?: string; citation?: string }> = []
+                similar.diseases.slice(0, 3).forEach((d) => {
+                  d.similar_images.slice(0, 6).forEach((img) => {
+                    gallery.push({ url: img.url, label: `${d.name || 'Disease'}`, citation: img.citation })
+                  })
                 })
-              })
-            }
-            if (Array.isArray(res.similar_images.crops)) {
-              res.similar_images.crops.forEach((c: any) => {
-                (c.similar_images || []).forEach((img: any) => {
-                  if (img?.url) gallery.push({ url: img.url, label: `${c.name || 'Crop'}`, citation: img.citation })
+                similar.crops.slice(0, 3).forEach((c) => {
+                  c.similar_images.slice(0, 6).forEach((img) => {
+                    gallery.push({ url: img.url, label: `${c.name || 'Crop'}`, citation: img.citation })
+                  })
                 })
+                if (gallery.length === 0) return
+                const galleryMsg = {
+                  id: Date.now() + 2,
+                  type: "bot" as const,
+                  content: "", // gallery-only message
+                  time: new Date().toLocaleTimeString([], { hour: "2-digit", minute: "2-digit" }),
+                  images: gallery,
+                  sectionTitle: "Similar cases",
+                }
+                setMessages(prev => [...prev, galleryMsg])
               })
-            }
-          }
-
-          if (gallery.length > 0) {
-            const galleryMsg = {
-              id: Date.now() + 2,
-              type: "bot" as const,
-              content: "", // gallery-only message
-              time: new Date().toLocaleTimeString([], { hour: "2-digit", minute: "2-digit" }),
-              images: gallery,
-              sectionTitle: "Similar cases",
-            }
-            setMessages(prev => [...prev, botMsg, galleryMsg])
-          } else {
-            setMessages(prev => [...prev, botMsg])
+              .catch((err) => console.error('Failed to load similar images:', err))
           }
         })
         .catch((err) => {
@@ -49,6 +49,9 @@ export default function MonitorPage() {
       console.log('Diagnosis result:', result)
       setDiagnosisResult(result)
     setShowDiagnosisResult(true)
+      if (result.diagnosis_id) {
+        loadSimilarImages(result.diagnosis_id)
+      }
     } catch (error) {
       console.error('Failed to analyze crop health:', error)
     } finally {
@@ -56,6 +59,36 @@ export default function MonitorPage() {
     }
   }
 
+  // Similar images are not part of the diagnosis response; fetch the thumbnails
+  // afterwards and attach them to the matching diseases and crops
+  const loadSimilarImages = async (diagnosisId: string) => {
+    try {
+      const gallery = await apiService.getSimilarImages(diagnosisId)
+      const attach = (entries: any[] = [], groups: Array<{ name: string; similar_images: any[] }>) =>
+        entries.map((entry: any) => ({
+          ...entry,
+          similar_images: groups.find((group) => group.name === entry.name)?.similar_images || [],
+        }))
+      setDiagnosisResult((current: any) => {
+        if (!current || current.diagnosis_id !== diagnosisId || !current.raw_results?.kindwise) return current
+        const kindwise = current.raw_results.kindwise
+        return {
+          ...current,
+          raw_results: {
+            ...current.raw_results,
+            kindwise: {
+              ...kindwise,
+              diseases: attach(kindwise.diseases, gallery.diseases),
+              crops: attach(kindwise.crops, gallery.crops),
+            },
+          },
+        }
+      })
+    } catch (error) {
+      console.error('Failed to load similar images:', error)
+    }
+  }
+
   const handleFileSelect = (event: React.ChangeEvent<HTMLInputElement>) => {
     const file = event.target.files?.[0]
     if (file) {
@@ -556,7 +589,7 @@ export default function MonitorPage() {
                             <p className="text-xs text-red-700 italic">{disease.scientific_name}</p>
                             
                             {/* Similar Images */}
-                            {disease.similar_images.length > 0 && (
+                            {disease.similar_images?.length > 0 && (
                               <div className="space-y-2">
                                 <p className="text-xs font-medium text-red-800">Similar Cases:</p>
                                 <div className="grid grid-cols-2 gap-2">
@@ -611,7 +644,7 @@ export default function MonitorPage() {
                             <p className="text-xs text-green-700 italic">{crop.scientific_name}</p>
                             
                             {/* Similar Images */}
-                            {crop.similar_images.length > 0 && (
+                            {crop.similar_images?.length > 0 && (
                               <div className="space-y-2">
                                 <p className="text-xs font-medium text-green-800">Similar Images:</p>
                                 <div className="grid grid-cols-2 gap-2">
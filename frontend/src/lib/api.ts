@@ -117,6 +117,19 @@ export interface CropRecommendationResponse {
   weather_summary: WeatherSummary;
 }
 
+export interface SimilarImageGroup {
+  name: string;
+  similar_images: Array<{
+    url: string;
+    citation: string;
+  }>;
+}
+
+export interface SimilarImageGallery {
+  diseases: SimilarImageGroup[];
+  crops: SimilarImageGroup[];
+}
+
 export interface FertilizerRecommendationResponse {
   status: string;
   recommendation: string;
@@ -329,7 +342,8 @@ class ApiService {
     action?: string;
     response: string;
     structured_insight?: any;
-    similar_images?: any;
+    diagnosis_id?: string;
+    similar_images_url?: string;
   }> {
     const formData = new FormData();
     formData.append('image', imageFile);
@@ -527,6 +541,8 @@ class ApiService {
   // Crop health methods
   async analyzeCropHealth(imageFile: File): Promise<{
     insight: string;
+    diagnosis_id?: string;
+    similar_images_url?: string;
     raw_results: {
       kindwise: {
         is_plant: boolean;
@@ -534,7 +550,7 @@ class ApiService {
           name: string;
           probability: number;
           scientific_name: string;
-          similar_images: Array<{
+          similar_images?: Array<{
             url: string;
             citation: string;
           }>;
@@ -543,7 +559,7 @@ class ApiService {
           name: string;
           probability: number;
           scientific_name: string;
-          similar_images: Array<{
+          similar_images?: Array<{
             url: string;
             citation: string;
           }>;
@@ -583,6 +599,25 @@ class ApiService {
     return await response.json();
   }
 
+  // Similar images of a diagnosis are fetched on demand; urls point at thumbnails
+  async getSimilarImages(diagnosisId: string): Promise<SimilarImageGallery> {
+    const gallery = await this.request<SimilarImageGallery>(
+      `/api/crop-health/similar-images/${encodeURIComponent(diagnosisId)}`
+    );
+    const withAbsoluteUrls = (groups: SimilarImageGroup[]) =>
+      groups.map((group) => ({
+        ...group,
+        similar_images: group.similar_images.map((img) => ({
+          ...img,
+          url: `${this.baseUrl}${img.url}`,
+        })),
+      }));
+    return {
+      diseases: withAbsoluteUrls(gallery.diseases),
+      crops: withAbsoluteUrls(gallery.crops),
+    };
+  }
+
   // Fertilizer agent methods
   async getFertilizerRecommendation(
     cropType: string,